@@ -14,6 +14,7 @@ from .question_config import QuestionConfig
 from .solutions import remove_ignored_lines
 from .utils import get_source, str_to_doctest
 
+from ..test_files import assertions
 from ..test_files.abstract_test import OK_FORMAT_VARNAME, TestFile
 from ..utils import NOTEBOOK_METADATA_KEY
 
@@ -21,8 +22,13 @@ from ..utils import NOTEBOOK_METADATA_KEY
 BEGIN_TEST_CONFIG_REGEX = r'(?:.\s*=\s*)?""?"?\s*#\s*BEGIN\s*TEST\s*CONFIG'
 END_TEST_CONFIG_REGEX = r'""?"?\s*#\s*END\s*TEST\s*CONFIG'
 
+# calls to the helpers by name only, not methods or functions of other modules with the same names
+ASSERTION_HELPERS_REGEX = re.compile(r"(?<![\w.])(" + "|".join(assertions.__all__) + r")\s*\(")
+ASSERTION_HELPERS_MODULE = "otter.test_files.assertions"
+
 EXCEPTION_BASED_TEST_FILE_TEMPLATE = Template("""\
-from otter.test_files import test_case
+from otter.test_files import test_case{% if assertion_helpers %}
+from {{ ASSERTION_HELPERS_MODULE }} import {{ assertion_helpers | join(", ") }}{% endif %}
 
 {{ OK_FORMAT_VARNAME }} = False
 
@@ -240,7 +246,23 @@ class AssignmentTestsManager:
         }
 
     @staticmethod
-    def _create_ok_test_case(test_case: TestCase):
+    def _get_assertion_helpers(source):
+        """
+        Determine which of the assertion helpers in ``otter.test_files.assertions`` are called in
+        some test code that doesn't import them itself.
+
+        Args:
+            source (``str``): the test code
+
+        Returns:
+            ``list[str]``: the sorted names of the helpers to import
+        """
+        if ASSERTION_HELPERS_MODULE in source:
+            return []
+        return sorted(set(ASSERTION_HELPERS_REGEX.findall(source)))
+
+    @classmethod
+    def _create_ok_test_case(cls, test_case: TestCase):
         """
         Create an OK-formatted test case for a test case object.
 
@@ -253,6 +275,10 @@ class AssignmentTestsManager:
         code_lines = str_to_doctest(test_case.input.split('\n'), [])
         code_lines.append(test_case.output)
 
+        helpers = cls._get_assertion_helpers(test_case.input)
+        if helpers:
+            code_lines.insert(0, f">>> from {ASSERTION_HELPERS_MODULE} import {', '.join(helpers)}")
+
         ret = {
             'code': '\n'.join(code_lines),
             'hidden': test_case.hidden,
@@ -313,6 +339,9 @@ class AssignmentTestsManager:
                 "points": points, 
                 "test_cases": test_cases, 
                 "OK_FORMAT_VARNAME": OK_FORMAT_VARNAME,
+                "ASSERTION_HELPERS_MODULE": ASSERTION_HELPERS_MODULE,
+                "assertion_helpers": sorted(set().union(
+                    *(self._get_assertion_helpers(tc.input) for tc in test_cases))),
             }
             test = EXCEPTION_BASED_TEST_FILE_TEMPLATE.render(**template_kwargs)
 
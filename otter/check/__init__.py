@@ -1,5 +1,6 @@
 """Otter Check command-line utility"""
 
+import multiprocessing
 import os
 
 from glob import glob
@@ -8,6 +9,7 @@ from .logs import LogEntry, EventType
 from .notebook import _OTTER_LOG_FILENAME
 
 from ..execute import grade_notebook
+from ..test_files import create_test_file
 from ..utils import block_print, loggers
 
 
@@ -15,7 +17,8 @@ _ALLOWED_EXTENSIONS = {".py", ".ipynb"}
 LOGGER = loggers.get_logger(__name__)
 
 
-def _log_event(event_type, results=[], question=None, success=True, error=None):
+def _log_event(event_type, results=[], question=None, success=True, error=None,
+        filename=_OTTER_LOG_FILENAME):
     """
     Logs an event
 
@@ -26,6 +29,7 @@ def _log_event(event_type, results=[], question=None, success=True, error=None):
         question (``str``, optional): the question name for this check
         success (``bool``, optional): whether the operation was successful
         error (``Exception``, optional): the exception thrown by the operation, if applicable
+        filename (``str``, optional): the path to the log file
     """
     LOGGER.debug(f"Creating a LogEntry of type {event_type}")
 
@@ -35,62 +39,254 @@ def _log_event(event_type, results=[], question=None, success=True, error=None):
         question=question, 
         success=success, 
         error=error
-    ).flush_to_file(_OTTER_LOG_FILENAME)
+    ).flush_to_file(filename)
 
     LOGGER.debug(f"LogEntry created successfully")
 
 
-def main(file, *, tests_path="./tests", question=None, seed=None):
+def _get_test_paths(tests_path, question):
     """
-    Runs Otter Check
+    Get the paths to the test files to run.
 
     Args:
-        file (``str``): path to the file to check
         tests_path (``str``): path to tests directory
         question (``str``): test name to run; ``None`` if all tests should be run
+
+    Returns:
+        ``list`` of ``str``: the paths to the test files
+    """
+    if question:
+        LOGGER.debug(f"Determining question '{question}' test path in directory '{tests_path}'")
+
+        test_path = os.path.join(tests_path, question + ".py")
+        if not os.path.isfile(test_path):
+            raise FileNotFoundError(f"Test {question} does not exist")
+
+        LOGGER.info(f"Found test file {test_path}")
+        return [test_path]
+
+    LOGGER.info(f"Searching for test files in tests directory")
+
+    qs = glob(os.path.join(tests_path, "*.py"))
+
+    LOGGER.debug(f"Found test files: {', '.join(qs)}")
+
+    return qs
+
+
+def _grade_file(file, test_paths, seed):
+    """
+    Grade a submission file against some test files.
+
+    Args:
+        file (``str``): path to the file to check
+        test_paths (``list`` of ``str``): paths to the test files
         seed (``int``): a seed to set before execution
-        **kwargs: ignored kwargs (a remnant of how the argument parser is built)
+
+    Returns:
+        ``otter.test_files.GradingResults``: the results
+    """
+    LOGGER.debug(f"Checking for existence of submission file '{file}'")
+    if not os.path.isfile(file):
+        raise FileNotFoundError(f"{file} does not exist")
+
+    ext = os.path.splitext(file)[1]
+    LOGGER.debug(f"Found submission file extension: '{ext}'")
+
+    if ext not in _ALLOWED_EXTENSIONS:
+        raise ValueError(f"Invalid extension for file '{ext}'; must be one of {_ALLOWED_EXTENSIONS}")
+
+    script = ext == ".py"
+    LOGGER.debug(f"Determined if submission is a Python script: {script}")
+
+    LOGGER.debug(f"Seed value: {seed}")
+    LOGGER.info("Grading submission")
+    with block_print():
+        return grade_notebook(
+            file,
+            tests_glob=test_paths,
+            script=script,
+            seed=seed,
+        )
+
+
+def _load_test_files(test_paths):
+    """
+    Parse the test files so that they are cached for the grading of each submission in this process
+    (and in any process forked from it).
+
+    Args:
+        test_paths (``list`` of ``str``): paths to the test files
+    """
+    for test_path in test_paths:
+        create_test_file(test_path)
+
+
+def _check_file(file, test_paths, seed, log_path):
+    """
+    Grade a submission file and log the check in its own log file.
+
+    Args:
+        file (``str``): path to the file to check
+        test_paths (``list`` of ``str``): paths to the test files
+        seed (``int``): a seed to set before execution
+        log_path (``str``): path to the log file for this submission
+
+    Returns:
+        ``tuple[float, float] | str``: the score and the possible score, or the error message if the
+        submission couldn't be graded
     """
     try:
-        if question:
-            LOGGER.debug(f"Determining question '{question}' test path in directory '{tests_path}'")
+        results = _grade_file(file, test_paths, seed)
+
+    except Exception as e:
+        _log_event(EventType.CHECK, success=False, error=e, filename=log_path)
+        return f"{type(e).__name__}: {e}"
+
+    _log_event(EventType.CHECK, results=results, filename=log_path)
+    return results.total, results.possible
 
-            test_path = os.path.join(tests_path, question + ".py")
-            if not os.path.isfile(test_path):
-                raise FileNotFoundError(f"Test {question} does not exist")
 
-            LOGGER.info(f"Found test file {test_path}")
-            qs = [test_path]
+def _collect_files(paths, tests_path):
+    """
+    Collect the submission files to check, replacing each directory with the notebooks and Python
+    scripts directly inside it (excluding any in the tests directory). Files that are included more
+    than once (e.g. both directly and through their directory) are only checked once.
+
+    Args:
+        paths (``list`` of ``str``): paths to files and directories
+        tests_path (``str``): path to tests directory
+
+    Returns:
+        ``list`` of ``str``: the paths to the files
+    """
+    tests_dir = os.path.realpath(tests_path)
+
+    files, seen = [], set()
+
+    def add_file(file):
+        realpath = os.path.realpath(file)
+        if realpath not in seen:
+            seen.add(realpath)
+            files.append(file)
+
+    for path in paths:
+        if not os.path.isdir(path):
+            add_file(path)
+            continue
+
+        for file in sorted(os.listdir(path)):
+            file = os.path.join(path, file)
+            if os.path.isfile(file) and os.path.splitext(file)[1] in _ALLOWED_EXTENSIONS and \
+                    os.path.dirname(os.path.realpath(file)) != tests_dir:
+                add_file(file)
+
+    return files
+
+
+def _get_log_paths(files):
+    """
+    Determine the path of the log file for each submission file: ``{stem}.OTTER_LOG`` in the same
+    directory as the file, or ``{name}.OTTER_LOG`` if another file would have the same log.
+
+    Args:
+        files (``list`` of ``str``): paths to the files
+
+    Returns:
+        ``list`` of ``str``: the paths to the log files
+    """
+    stems = [os.path.splitext(f)[0] for f in files]
+    return [
+        (s if stems.count(s) == 1 else f) + _OTTER_LOG_FILENAME for f, s in zip(files, stems)]
+
+
+def _format_score_table(files, outcomes):
+    """
+    Format a table of the score of each submission file.
+
+    Args:
+        files (``list`` of ``str``): paths to the files
+        outcomes (``list``): the return value of ``_check_file`` for each file
+
+    Returns:
+        ``str``: the table
+    """
+    rows = [("File", "Score", "Percent")]
+    for file, outcome in zip(files, outcomes):
+        if isinstance(outcome, str):
+            rows.append((file, "error", outcome))
 
         else:
-            LOGGER.info(f"Searching for test files in tests directory")
+            total, possible = outcome
+            percent = f"{total / possible:.2%}" if possible else "-"
+            rows.append((file, f"{total:g}/{possible:g}", percent))
 
-            qs = glob(os.path.join(tests_path, "*.py"))
+    widths = [max(len(r[i]) for r in rows) for i in range(2)]
+    return "\n".join(
+        f"{r[0]:<{widths[0]}}  {r[1]:>{widths[1]}}  {r[2]}".rstrip() for r in rows)
 
-            LOGGER.debug(f"Found test files: {', '.join(qs)}")
 
-        LOGGER.debug(f"Checking for existence of submission file '{file}'")
-        if not os.path.isfile(file):
-            raise FileNotFoundError(f"{file} does not exist")
+def _check_files(files, test_paths, seed, jobs):
+    """
+    Check many submission files, writing the checks of each file to its own log file, and print a
+    table of their scores.
 
-        ext = os.path.splitext(file)[1]
-        LOGGER.debug(f"Found submission file extension: '{ext}'")
+    If ``jobs`` is greater than 1, the files are checked in a pool of up to ``jobs`` processes,
+    each of which checks a single file. The test files are parsed once by this process and by the
+    initializer of each process in the pool; where processes are forked, they inherit the parsed
+    test files from this process.
 
-        if ext not in _ALLOWED_EXTENSIONS:
-            raise ValueError(f"Invalid extension for file '{ext}'; must be one of {_ALLOWED_EXTENSIONS}")
+    Args:
+        files (``list`` of ``str``): paths to the files to check
+        test_paths (``list`` of ``str``): paths to the test files
+        seed (``int``): a seed to set before execution
+        jobs (``int``): the maximum number of files to check at once
+    """
+    _load_test_files(test_paths)
 
-        script = ext == ".py"
-        LOGGER.debug(f"Determined if submission is a Python script: {script}")
+    args = [(f, test_paths, seed, p) for f, p in zip(files, _get_log_paths(files))]
+    if jobs > 1 and len(files) > 1:
+        LOGGER.info(f"Checking {len(files)} files in {min(jobs, len(files))} processes")
+        with multiprocessing.Pool(
+            min(jobs, len(files)),
+            initializer=_load_test_files,
+            initargs=(test_paths,),
+            maxtasksperchild=1,
+        ) as pool:
+            outcomes = pool.starmap(_check_file, args, chunksize=1)
 
-        LOGGER.debug(f"Seed value: {seed}")
-        LOGGER.info("Grading submission")
-        with block_print():
-            results = grade_notebook(
-                file,
-                tests_glob=qs,
-                script=script,
-                seed=seed,
-            )
+    else:
+        outcomes = [_check_file(*a) for a in args]
+
+    print(_format_score_table(files, outcomes))
+
+
+def main(*files, tests_path="./tests", question=None, seed=None, jobs=1):
+    """
+    Runs Otter Check
+
+    If a single file is passed, its test results are printed and the check is logged in
+    ``.OTTER_LOG`` in the working directory. If more than one file or any directories are passed,
+    a table of the score of each file is printed instead, and the checks of each file are logged in
+    a separate log file next to it (see ``_get_log_paths``).
+
+    Args:
+        *files (``str``): paths to the files to check or to directories of files to check
+        tests_path (``str``): path to tests directory
+        question (``str``): test name to run; ``None`` if all tests should be run
+        seed (``int``): a seed to set before execution
+        jobs (``int``): the maximum number of files to check at once
+        **kwargs: ignored kwargs (a remnant of how the argument parser is built)
+    """
+    if len(files) != 1 or os.path.isdir(files[0]):
+        test_paths = _get_test_paths(tests_path, question)
+        _check_files(_collect_files(files, tests_path), test_paths, seed, jobs)
+        return
+
+    file = files[0]
+    try:
+        qs = _get_test_paths(tests_path, question)
+        results = _grade_file(file, qs, seed)
 
         percentage = results.total / results.possible
         LOGGER.debug(f"Determined score percentage: {percentage}")
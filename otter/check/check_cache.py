@@ -0,0 +1,212 @@
+"""Caching of the results of checks whose inputs haven't changed"""
+
+import copy
+import hashlib
+import os
+import types
+
+from .shelf import fingerprint, get_referenced_globals
+
+from ..execute.dependencies import get_test_file_names
+from ..test_files import create_test_file
+
+
+# the maximum number of objects visited when fingerprinting a container
+_MAX_FINGERPRINTED_OBJECTS = 10000
+
+# types whose values are fingerprinted by their repr
+_SCALAR_TYPES = (bool, bytes, complex, float, int, str, type(None), type(Ellipsis))
+
+
+class _Unfingerprintable(Exception):
+    """
+    Exception that indicates that an object has no cheap fingerprint
+    """
+
+
+def _fingerprint_code(code, h):
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode("utf-8"))
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _fingerprint_code(const, h)
+        else:
+            h.update(repr(const).encode("utf-8"))
+
+
+def _fingerprint_value(value, h, seen, budget):
+    if budget[0] <= 0:
+        raise _Unfingerprintable()
+    budget[0] -= 1
+
+    h.update(f"{type(value).__module__}.{type(value).__qualname__}:".encode("utf-8"))
+
+    if type(value) in _SCALAR_TYPES:
+        h.update(repr(value).encode("utf-8"))
+        return
+
+    fp = fingerprint(value)
+    if fp is not None:
+        h.update(fp.encode("utf-8"))
+        return
+
+    if id(value) in seen:
+        h.update(str(seen[id(value)]).encode("utf-8"))
+        return
+    seen[id(value)] = len(seen)
+
+    if type(value) in (list, tuple):
+        h.update(str(len(value)).encode("utf-8"))
+        for v in value:
+            _fingerprint_value(v, h, seen, budget)
+
+    elif type(value) is dict:
+        h.update(str(len(value)).encode("utf-8"))
+        for k, v in value.items():
+            _fingerprint_value(k, h, seen, budget)
+            _fingerprint_value(v, h, seen, budget)
+
+    elif type(value) in (set, frozenset):
+        if any(type(v) not in _SCALAR_TYPES for v in value):
+            raise _Unfingerprintable()
+        h.update(repr(sorted(map(repr, value))).encode("utf-8"))
+
+    elif isinstance(value, types.FunctionType):
+        _fingerprint_code(value.__code__, h)
+        _fingerprint_value(value.__defaults__, h, seen, budget)
+        _fingerprint_value(value.__kwdefaults__, h, seen, budget)
+        for cell in value.__closure__ or []:
+            _fingerprint_value(cell.cell_contents, h, seen, budget)
+
+        # the function's result depends on the globals it reads
+        for name in sorted(get_referenced_globals(value)):
+            if name in value.__globals__:
+                h.update(name.encode("utf-8"))
+                _fingerprint_value(value.__globals__[name], h, seen, budget)
+
+    # classes defined in the notebook may be redefined with different code under the same name
+    elif isinstance(value, (types.BuiltinFunctionType, types.ModuleType)) or \
+            (isinstance(value, type) and value.__module__ != "__main__"):
+        h.update(repr((getattr(value, "__module__", None), value.__name__)).encode("utf-8"))
+
+    else:
+        raise _Unfingerprintable()
+
+
+def fingerprint_globals(names, global_env):
+    """
+    Compute a cheap fingerprint of the values of some global variables.
+
+    Scalars, strings, and bytes are fingerprinted by their values, numpy arrays and pandas objects
+    by ``otter.check.shelf.fingerprint``, and lists, tuples, dictionaries, and sets by their
+    elements. Functions are fingerprinted by their code, defaults, and closures, and by the globals
+    that they read. Modules, builtins, and classes that weren't defined in ``__main__`` are
+    fingerprinted by their names. Variables that aren't defined are fingerprinted as such.
+
+    Args:
+        names (iterable of ``str``): the names of the variables
+        global_env (``dict``): the environment containing the variables
+
+    Returns:
+        ``str | None``: the fingerprint, or ``None`` if any of the variables (or the objects they
+        contain) can't be fingerprinted cheaply
+    """
+    h = hashlib.blake2b()
+    seen, budget = {}, [_MAX_FINGERPRINTED_OBJECTS]
+    try:
+        for name in sorted(names):
+            h.update(name.encode("utf-8"))
+            if name in global_env:
+                _fingerprint_value(global_env[name], h, seen, budget)
+            else:
+                h.update(b"<undefined>")
+
+    except _Unfingerprintable:
+        return None
+
+    return h.hexdigest()
+
+
+class CheckCache:
+    """
+    A cache of the results of passing checks, keyed by a fingerprint of the global variables read
+    by their tests.
+
+    A cached result is reused for a question as long as its test file is unchanged and the values of
+    the globals read by its test (as determined by ``otter.execute.dependencies``) have the same
+    fingerprint (as determined by ``fingerprint_globals``). Questions whose tests read globals that
+    can't be determined statically or whose values can't be fingerprinted are never cached.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    @staticmethod
+    def get_key(test_path, test_name, global_env):
+        """
+        Compute the cache key for a check. The key should be computed before the check is run, so
+        that changes made to the environment by the test don't affect it.
+
+        Args:
+            test_path (``str``): the path to the test file
+            test_name (``str | None``): the name of the test in the notebook metadata, if applicable
+            global_env (``dict``): the environment the test is run against
+
+        Returns:
+            ``tuple | None``: the key, or ``None`` if the check can't be cached
+        """
+        try:
+            stat = os.stat(test_path)
+            names = get_test_file_names(create_test_file(test_path, test_name))
+        except Exception:
+            return None
+
+        if names is None:
+            return None
+
+        fp = fingerprint_globals(names, global_env)
+        if fp is None:
+            return None
+
+        return (stat.st_mtime_ns, stat.st_size, fp)
+
+    def put(self, test_path, test_name, key, result):
+        """
+        Cache the result of a check if it passed.
+
+        Args:
+            test_path (``str``): the path to the test file
+            test_name (``str | None``): the name of the test in the notebook metadata, if applicable
+            key (``tuple | None``): the key returned by ``get_key`` before the check was run
+            result (``otter.test_files.abstract_test.TestFile``): the result of the check
+        """
+        if key is None or not result.passed_all:
+            self._entries.pop((test_path, test_name), None)
+            return
+
+        self._entries[(test_path, test_name)] = (key, result)
+
+    def get(self, test_path, test_name, global_env):
+        """
+        Get the cached result of a check if its inputs haven't changed.
+
+        Args:
+            test_path (``str``): the path to the test file
+            test_name (``str | None``): the name of the test in the notebook metadata, if applicable
+            global_env (``dict``): the environment the test would be run against
+
+        Returns:
+            ``otter.test_files.abstract_test.TestFile | None``: a copy of the cached result marked as
+            cached, or ``None`` if there is no cached result for the current inputs
+        """
+        entry = self._entries.get((test_path, test_name))
+        if entry is None:
+            return None
+
+        key, result = entry
+        if self.get_key(test_path, test_name, global_env) != key:
+            return None
+
+        result = copy.copy(result)
+        result.cached = True
+        return result
@@ -0,0 +1,199 @@
+"""The on-disk format of Otter's log files"""
+
+import datetime as dt
+import json
+import os
+import struct
+
+from collections import namedtuple
+from enum import IntEnum
+
+
+LOG_MAGIC = b"OTTERLOG"
+LOG_FORMAT_VERSION = 1
+
+# the header at the start of the file: the magic bytes and the format version
+_FILE_HEADER = struct.Struct(">8sH")
+
+# the header of each record: the record type, the length of the metadata, and the length of the
+# payload
+_RECORD_HEADER = struct.Struct(">BIQ")
+
+
+class RecordType(IntEnum):
+    """
+    Enum of the types of records in a log file. Readers skip records of types they don't know.
+
+    Attributes:
+        ENTRY: a pickled ``otter.check.logs.LogEntry``
+        BLOB: a pickled variable from a shelved environment, stored once per distinct content and
+            referenced by its hash (the ``hash`` key of the record's metadata)
+    """
+
+    ENTRY = 1
+    BLOB = 2
+
+
+LogRecord = namedtuple("LogRecord", [
+    "record_type", "offset", "length", "event_type", "question", "timestamp", "success", "shelved",
+    "supersedes_shelves", "metadata"])
+LogRecord.__doc__ = """\
+The metadata of a record in a log file, read without deserializing its payload.
+
+Attributes:
+    record_type (``int``): the type of the record; one of the values of ``RecordType``
+    offset (``int``): the position of the payload in the file
+    length (``int``): the length of the payload in bytes
+    event_type (``str | None``): the name of the ``otter.check.logs.EventType`` of the entry
+    question (``str | None``): the question of the entry
+    timestamp (``datetime.datetime | None``): the timestamp of the entry
+    success (``bool | None``): whether the operation logged by the entry was successful
+    shelved (``bool``): whether the entry has a shelved environment
+    supersedes_shelves (``bool``): whether the entry supersedes the shelved environments of earlier
+        entries for the same question
+    metadata (``dict``): the metadata of the record as it was written
+"""
+
+
+def is_framed_log(f):
+    """
+    Determine whether an open log file is in this format (as opposed to the legacy format, a
+    concatenation of pickled log entries). The position of ``f`` is restored before returning.
+
+    Args:
+        f (file-like object): the log file, opened in binary mode
+
+    Returns:
+        ``bool``: whether the file starts with the header of this format
+    """
+    pos = f.tell()
+    try:
+        f.seek(0)
+        return f.read(len(LOG_MAGIC)) == LOG_MAGIC
+
+    finally:
+        f.seek(pos)
+
+
+def write_log_header(f):
+    """
+    Write the header of a log file in this format to an empty file.
+
+    Args:
+        f (file-like object): the log file, opened in binary mode
+    """
+    f.write(_FILE_HEADER.pack(LOG_MAGIC, LOG_FORMAT_VERSION))
+
+
+def write_log_record(f, record_type, metadata, payload):
+    """
+    Append a record to a log file in this format. The record is written with a single call to
+    ``f.write``.
+
+    Args:
+        f (file-like object): the log file, opened in binary append mode
+        record_type (``int``): the type of the record
+        metadata (``dict``): the JSON-serializable metadata of the record
+        payload (``bytes``): the payload of the record
+    """
+    metadata = json.dumps(metadata).encode("utf-8")
+    f.write(_RECORD_HEADER.pack(record_type, len(metadata), len(payload)) + metadata + payload)
+
+
+def read_log_index(f):
+    """
+    Read the metadata of each record in a log file in this format, seeking past the payloads.
+
+    If the last record was only partially written (e.g. because the process writing it was killed),
+    it is ignored.
+
+    Args:
+        f (file-like object): the log file, opened in binary mode
+
+    Returns:
+        ``list`` of ``LogRecord``: the records in the order they were written
+
+    Raises:
+        ``ValueError``: if the file is not in this format or was written by a newer version of Otter
+    """
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+
+    f.seek(0)
+    header = f.read(_FILE_HEADER.size)
+    if len(header) < _FILE_HEADER.size:
+        raise ValueError("The log file is not in the framed format")
+
+    magic, version = _FILE_HEADER.unpack(header)
+    if magic != LOG_MAGIC:
+        raise ValueError("The log file is not in the framed format")
+    if version > LOG_FORMAT_VERSION:
+        raise ValueError(f"Unsupported log format version: {version}")
+
+    records, pos = [], _FILE_HEADER.size
+    while pos + _RECORD_HEADER.size <= size:
+        f.seek(pos)
+        record_type, metadata_length, length = _RECORD_HEADER.unpack(f.read(_RECORD_HEADER.size))
+        offset = pos + _RECORD_HEADER.size + metadata_length
+        if offset + length > size:
+            break
+
+        metadata = json.loads(f.read(metadata_length).decode("utf-8"))
+        timestamp = metadata.get("timestamp")
+        records.append(LogRecord(
+            record_type = record_type,
+            offset = offset,
+            length = length,
+            event_type = metadata.get("event_type"),
+            question = metadata.get("question"),
+            timestamp = dt.datetime.fromisoformat(timestamp) if timestamp is not None else None,
+            success = metadata.get("success"),
+            shelved = metadata.get("shelved", False),
+            supersedes_shelves = metadata.get("supersedes_shelves", False),
+            metadata = metadata,
+        ))
+
+        pos = offset + length
+
+    return records
+
+
+def find_superseded_shelves(entries):
+    """
+    Find the entries whose shelved environments are superseded by a later entry for the same
+    question. Instead of removing the environments of earlier entries when an environment is shelved,
+    the new entry is marked as superseding them, which acts as a tombstone for them; the superseded
+    environments are ignored when reading the log and removed when it is compacted.
+
+    Args:
+        entries (``list`` of ``tuple[str, bool, bool]``): the question of each entry, whether it has
+            a shelved environment, and whether it supersedes earlier environments, in the order the
+            entries were written
+
+    Returns:
+        ``set[int]``: the indices of the entries with superseded environments
+    """
+    superseded, superseding_questions = set(), set()
+    for i in reversed(range(len(entries))):
+        question, shelved, supersedes_shelves = entries[i]
+        if shelved and question in superseding_questions:
+            superseded.add(i)
+        if supersedes_shelves:
+            superseding_questions.add(question)
+
+    return superseded
+
+
+def read_log_payload(f, record):
+    """
+    Read the payload of a record in a log file.
+
+    Args:
+        f (file-like object): the log file, opened in binary mode
+        record (``LogRecord``): the record
+
+    Returns:
+        ``bytes``: the payload
+    """
+    f.seek(record.offset)
+    return f.read(record.length)
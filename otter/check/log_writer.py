@@ -0,0 +1,122 @@
+"""Writing Otter Check logs from a background thread"""
+
+import atexit
+import queue
+import threading
+
+from .logs import append_to_log
+
+from ..utils import loggers
+
+
+LOGGER = loggers.get_logger(__name__)
+
+
+class BackgroundLogWriter:
+    """
+    A writer that appends log entries to a log file from a background thread.
+
+    Entries are pickled (along with their shelved environments) when they are queued, since the
+    objects they reference may change afterwards, but the log file is only opened and written to by
+    the background thread. The thread appends all of the queued entries in a single write every
+    ``flush_interval`` seconds, when the queue is half full, and when ``flush`` is called. Queuing an
+    entry blocks while the queue is full.
+
+    Entries that haven't been written yet are lost if the process is killed; the writer is flushed
+    and closed when the interpreter exits normally.
+
+    Args:
+        filename (``str``): the path to the log file
+        flush_interval (``float``, optional): the maximum number of seconds between writes
+        max_queue_size (``int``, optional): the maximum number of queued entries
+    """
+
+    def __init__(self, filename, flush_interval=5, max_queue_size=64):
+        self.filename = filename
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._wake = threading.Event()
+        self._closed = False
+        self._stopped = False
+        self._error = None
+
+        self._thread = threading.Thread(
+            target=self._run, name="otter-log-writer", daemon=True)
+        self._thread.start()
+
+        atexit.register(self.close)
+
+    def write(self, entry):
+        """
+        Queue an entry to be appended to the log file.
+
+        Args:
+            entry (``otter.check.logs.LogEntry``): the entry
+
+        Raises:
+            ``ValueError``: if the writer is closed
+        """
+        if self._closed:
+            raise ValueError("The log writer is closed")
+
+        self._queue.put(entry._serialize(self.filename))
+        if self._queue.qsize() * 2 >= self._queue.maxsize:
+            self._wake.set()
+
+    def flush(self):
+        """
+        Wait until all of the queued entries have been appended to the log file.
+
+        Raises:
+            ``Exception``: the error raised while writing entries since the last flush, if any
+        """
+        self._wake.set()
+        self._queue.join()
+
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        """
+        Flush the queued entries and stop the background thread. Errors raised while writing are
+        logged instead of raised.
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        try:
+            self.flush()
+        except Exception as e:
+            LOGGER.warning(f"Could not write to the log: {e}")
+
+        self._stopped = True
+        self._wake.set()
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+
+            entries = []
+            while True:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if not entries:
+                continue
+
+            try:
+                append_to_log(self.filename, entries)
+            except Exception as e:
+                LOGGER.debug(f"Could not write to the log: {e}")
+                self._error = e
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
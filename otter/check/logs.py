@@ -1,13 +1,39 @@
 """Logging for Otter Check"""
 
 import datetime as dt
+import io
 import os
 import types
 import tempfile
 
+from collections import deque, namedtuple
+from collections.abc import Sequence
 from enum import Enum, auto
 
-from ..utils import import_or_raise
+from .log_format import (
+    find_superseded_shelves, is_framed_log, read_log_index, read_log_payload, RecordType,
+    write_log_header, write_log_record)
+from .shelf import (
+    add_fingerprinted_blob, decompress_blob, fingerprint, get_fingerprinted_blob, get_log_blobs,
+    get_referenced_globals, LogBlobReader, record_log_blobs, serialize_variable,
+    ShelfSizeExceededException)
+
+from ..utils import get_variable_type, import_or_raise
+
+
+SerializedLogEntry = namedtuple(
+    "SerializedLogEntry", ["metadata", "payload", "blob_hashes", "blobs"])
+SerializedLogEntry.__doc__ = """\
+A pickled log entry, ready to be appended to a log file with ``append_to_log``.
+
+Attributes:
+    metadata (``dict``): the metadata of the entry's record
+    payload (``bytes``): the pickled entry
+    blob_hashes (``list`` of ``str``): the hashes of the pickled variables of the entry's shelved
+        environment, which must be in the log file before the entry
+    blobs (``dict[str, tuple[bytes, str | None]]``): the compressed pickled variables that may not
+        be in the log file yet and their compression methods, keyed by hash
+"""
 
 
 class QuestionNotInLogException(Exception):
@@ -58,27 +84,56 @@ class LogEntry:
 
     Attributes:
         event_type (``EventType``): the entry type
-        shelf (``bytes``): a pickled environment stored as a bytes string
+        shelf (``dict[str, str]`` or ``bytes``): the hashes of the pickled variables of the shelved
+            environment, keyed by variable name; entries written by older versions of Otter store
+            the pickled environment as a bytes string
         unshelved (``list`` of ``str``): a list of variable names that were unable to be pickled during
             shelving
+        unshelved_reasons (``dict[str, str]``): the reason each variable in ``unshelved`` wasn't
+            shelved, keyed by variable name
+        shelf_types (``dict[str, str]``): the fully-qualified type strings of the variables in
+            ``shelf`` when they were shelved, keyed by variable name
         results (``list`` of ``otter.test_files.abstract_test.TestCollectionResults``): grading results 
             if this is an ``EventType.CHECK`` entry
         question (``str``): question name if this is a check entry
         success (``bool``): whether the operation tracked by this entry was successful
         error (``Exception``): an error thrown by the tracked process if applicable
         timestamp (``datetime.datetime``): timestamp of event in UTC
+        supersedes_shelves (``bool``): whether the environment shelved in this entry supersedes the
+            environments shelved in earlier entries for the same question
     """
 
+    # the defaults for entries pickled by older versions of Otter
+    supersedes_shelves = False
+    unshelved_reasons = {}
+    shelf_types = {}
+
+    # the compressed pickled variables that haven't been written to the log yet and their
+    # compression methods, keyed by hash, and the log file to read the other variables from and its
+    # reader, which aren't pickled with the entry
+    _pending_blobs = None
+    _blob_reader = None
+    _blob_filename = None
+
     def __init__(self, event_type, shelf=None, unshelved=[], results=[], question=None, success=True, error=None):
         assert event_type in EventType, "Invalid event type"
         self.event_type = event_type
         self.shelf = shelf
         self.unshelved = []
+        self.unshelved_reasons = {}
+        self.shelf_types = {}
         self.results = results
         self.question = question
         self.timestamp = dt.datetime.utcnow()
         self.success = success
         self.error = error
+        self.supersedes_shelves = False
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attr in ["_blob_reader", "_blob_filename"]:
+            state.pop(attr, None)
+        return state
 
     def __repr__(self):
         if self.question:
@@ -122,119 +177,297 @@ class LogEntry:
         if self.error is not None:
             raise self.error
 
+    def _get_record_metadata(self):
+        """
+        Get the metadata stored alongside this entry in a log file, which can be read without
+        deserializing the entry.
+
+        Returns:
+            ``dict``: the metadata
+        """
+        metadata = {
+            "event_type": self.event_type.name,
+            "question": self.question,
+            "timestamp": self.timestamp.isoformat(),
+            "success": self.success,
+            "shelved": self.shelf is not None,
+            "supersedes_shelves": self.supersedes_shelves,
+        }
+        if isinstance(self.shelf, dict):
+            metadata["shelf"] = self.shelf
+
+        return metadata
+
     def flush_to_file(self, filename):
         """
         Appends this log entry (pickled) to a file
 
+        New log files are written in the framed format of ``otter.check.log_format``; entries
+        appended to a log file in the legacy format (a concatenation of pickled entries) are
+        written in that format so that the file stays readable, unless this entry has a shelved
+        environment, in which case the log is first converted to the framed format with
+        ``compact_log``.
+
+        The pickled variables of a shelved environment that aren't in the log file yet are written
+        before the entry, each as a separate record.
+
         Args:
             filename (``str``): the path to the file to append this entry
         """
+        append_to_log(filename, [self._serialize(filename)])
+
+    def _serialize(self, filename):
+        """
+        Pickle this entry and collect the pickled variables of its shelved environment that may
+        need to be written with it, so that it can be appended to a log file with
+        ``append_to_log``. Afterwards, the shelved variables of this entry are read from that file.
+
+        Args:
+            filename (``str``): the path to the log file the entry will be appended to
+
+        Returns:
+            ``SerializedLogEntry``: the serialized entry
+        """
         dill = import_or_raise("dill")
 
-        try:
-            file = open(filename, "ab+")
-            dill.dump(self, file)
+        blob_hashes, blobs = [], {}
+        if isinstance(self.shelf, dict):
+            same_log = self._blob_filename is not None and \
+                os.path.abspath(self._blob_filename) == os.path.abspath(filename)
 
-        except OSError:
-            raise Exception(
-                "Could not create the log file as the file system is read-only. Please contact your "
-                "instructor before continuing on this assignment."
-            )
+            blob_hashes = list(dict.fromkeys(self.shelf.values()))
+            for blob_hash in blob_hashes:
+                if self._pending_blobs and blob_hash in self._pending_blobs:
+                    blobs[blob_hash] = self._pending_blobs[blob_hash]
+                elif not same_log:
+                    blobs[blob_hash] = self._get_stored_blob(blob_hash)
 
-        finally:
-            if "file" in locals():
-                file.close()
+            self._pending_blobs = None
+            self._blob_reader = None
+            self._blob_filename = filename
 
-    def shelve(self, env, delete=False, filename=None, ignore_modules=[], variables=None):
+        return SerializedLogEntry(
+            self._get_record_metadata(), dill.dumps(self), blob_hashes, blobs)
+
+    @staticmethod
+    def _read_entries(file, filename):
         """
-        Stores an environment ``env`` in this log entry using dill as a ``bytes`` object in this entry
-        as the ``shelf`` attribute. Writes names of any variables in ``env`` that are not stored to
-        the ``unshelved`` attribute.
+        Read the entries in an open log file in the order they were written. The shelved
+        environments of entries that are superseded by later entries are removed.
+
+        Args:
+            file (file-like object): the log file, opened in binary mode
+            filename (``str``): the path to the log file, from which shelved variables are read
+
+        Returns:
+            ``list`` of ``LogEntry``: the entries
+        """
+        dill = import_or_raise("dill")
+
+        if is_framed_log(file):
+            records = read_log_index(file)
+            blob_reader = LogBlobReader.from_records(filename, records)
+            entries = [
+                dill.loads(read_log_payload(file, record)) for record in records
+                    if record.record_type == RecordType.ENTRY]
+            for entry in entries:
+                entry._blob_reader = blob_reader
+
+        else:
+            entries = []
+            while True:
+                try:
+                    entries.append(dill.load(file))
+                except EOFError:
+                    break
 
-        If ``delete`` is ``True``, old environments in the log at ``filename`` for this question are
-        cleared before writing ``env``. Any module names in ``ignore_modules`` will have their functions
-        ignored during pickling. 
+        for i in find_superseded_shelves(
+                [(e.question, e.shelf is not None, e.supersedes_shelves) for e in entries]):
+            entries[i].shelf = None
+
+        return entries
+
+    def shelve(
+        self,
+        env,
+        delete=False,
+        filename=None,
+        ignore_modules=[],
+        variables=None,
+        compression="zlib",
+        max_variable_size=None,
+        max_shelf_size=None,
+    ):
+        """
+        Stores an environment ``env`` in this log entry using dill. Each variable is pickled
+        separately, compressed in memory, and stored under the hash of its pickled contents; the
+        ``shelf`` attribute maps variable names to these hashes, and the pickled variables are
+        written to the log when this entry is flushed, except those that are already in the log.
+        Writes names of any variables in ``env`` that are not stored to the ``unshelved`` attribute
+        and the reason each wasn't stored to the ``unshelved_reasons`` attribute.
+
+        Variables are shelved in the order they appear in ``env``. A variable whose compressed
+        pickle is larger than ``max_variable_size`` bytes, or that would make the total size of
+        the compressed variables in the shelf larger than ``max_shelf_size`` bytes, is not shelved.
+
+        Variables whose contents can be fingerprinted cheaply (numpy arrays, pandas objects, and
+        bytes) are only pickled if their contents have changed since they were last shelved in this
+        process and written to the log at ``filename``.
+
+        If ``delete`` is ``True``, this entry supersedes the environments shelved in older entries for
+        this question: they are ignored when the log is read and removed from the log file when it
+        is compacted with ``compact_log``, so the log file doesn't need to be rewritten. Any module
+        names in ``ignore_modules`` will have their functions ignored during pickling.
 
         Args:
             env (``dict``): the environment to pickle
-            delete (``bool``, optional): whether to delete old environments
-            filename (``str``, optional): path to log file; ignored if ``delete`` is ``False``
+            delete (``bool``, optional): whether to supersede old environments
+            filename (``str``, optional): path to the log file that this entry will be flushed to;
+                if passed, variables that are already stored in it aren't stored again
             ignore_modules (``list`` of ``str``, optional): module names to ignore during pickling
             variables (``dict``, optional): map of variable name to type string indicating **only** 
                 variables to include (all variables not in this dictionary will be ignored)
+            compression (``str | None``, optional): the compression method for the pickled
+                variables; one of ``"zlib"``, ``"lzma"``, or ``None`` for no compression
+            max_variable_size (``int``, optional): the maximum size of each compressed pickled
+                variable in bytes
+            max_shelf_size (``int``, optional): the maximum total size of the compressed pickled
+                variables in the shelf in bytes
 
         Returns:
             ``LogEntry``: this entry
         """
-        dill = import_or_raise("dill")
-
-        # delete old entry without reading entire log
-        if delete:
-            assert filename, "old env deletion indicated but no log filename provided"
-            try:                
-                # copy the existing log to a temporary file so that we can edit the original
-                with tempfile.TemporaryFile() as tf:
-                    with open(filename, "rb") as f:
-                        tf.write(f.read())
-                    tf.seek(0)
-                    os.system(f"rm -f {filename}")
-                    while True:
-                        try:
-                            entry = dill.load(tf)
-
-                            if entry.question == self.question and entry.shelf is not None:
-
-                                # only edit variables if it's not provided
-                                if variables is None:
-                                    variables = list(entry.unshelve().keys())
-                                    variables_stored = None
-                                else:
-                                    variables_stored = list(entry.unshelve().keys())
-
-                                entry.shelf = None
-
-                            entry.flush_to_file(filename)
-
-                            del locals()["entry"]
-
-                        except EOFError:
-                            break
-
-            except FileNotFoundError:
-                pass
-
-        try:
-            if isinstance(variables_stored, list):
-                variables = {k : v for k, v in variables.items() if k in variables_stored}
-        except UnboundLocalError:
-            pass
-
-        shelf_contents, unshelved = LogEntry.shelve_environment(env, variables=variables, ignore_modules=ignore_modules)
-        self.shelf = shelf_contents
-        self.unshelved = unshelved
+        self.supersedes_shelves = delete
+
+        logged_blobs = get_log_blobs(filename) if filename is not None else {}
+        pending_blobs, shelf_blobs = {}, set()
+        shelf_size = 0
+
+        def store_variable(value):
+            nonlocal shelf_size
+
+            blob_hash, blob = None, None
+            fp = fingerprint(value)
+            if fp is not None:
+                cached = get_fingerprinted_blob(fp)
+                if cached is not None and (cached[0] in logged_blobs or cached[0] in pending_blobs):
+                    blob_hash, size = cached
+
+            if blob_hash is None:
+                blob_hash, blob = serialize_variable(
+                    value, compression=compression, max_size=max_variable_size)
+                size = len(blob)
+                if fp is not None:
+                    add_fingerprinted_blob(fp, blob_hash, size)
+
+            elif max_variable_size is not None and size > max_variable_size:
+                raise ShelfSizeExceededException(
+                    f"the variable is larger than the maximum size of {max_variable_size} bytes")
+
+            if blob_hash not in shelf_blobs:
+                if max_shelf_size is not None and shelf_size + size > max_shelf_size:
+                    raise ShelfSizeExceededException(
+                        f"the shelf would be larger than the maximum size of {max_shelf_size} bytes")
+
+                shelf_size += size
+                shelf_blobs.add(blob_hash)
+
+            if blob is not None and blob_hash not in logged_blobs:
+                pending_blobs.setdefault(blob_hash, (blob, compression))
+
+            return blob_hash
+
+        self.shelf, self.unshelved, self.unshelved_reasons = LogEntry._filter_environment(
+            env, store_variable, variables=variables, ignore_modules=ignore_modules)
+        self.shelf_types = {k: get_variable_type(env[k]) for k in self.shelf}
+        self._pending_blobs = pending_blobs
+        self._blob_reader = None
+        self._blob_filename = filename
         return self
 
-    def unshelve(self, global_env={}):
+    def _get_stored_blob(self, blob_hash):
         """
-        Parses a ``bytes`` object stored in the ``shelf`` attribute and unpickles the object stored
-        there using dill. Updates the ``__globals__`` of any functions in ``shelf`` to include elements
-        in the shelf. Optionally includes the env passed in as ``global_env``.
+        Get a compressed pickled variable of this entry's shelved environment.
+
+        Args:
+            blob_hash (``str``): the hash of the pickled variable
+
+        Returns:
+            ``tuple[bytes, str | None]``: the compressed pickled variable and its compression method
+
+        Raises:
+            ``ValueError``: if the pickled variable can't be found
+        """
+        if self._pending_blobs and blob_hash in self._pending_blobs:
+            return self._pending_blobs[blob_hash]
+
+        if (self._blob_reader is None or blob_hash not in self._blob_reader) and \
+                self._blob_filename is not None:
+            with open(self._blob_filename, "rb") as f:
+                self._blob_reader = LogBlobReader.from_records(
+                    self._blob_filename, read_log_index(f))
+
+        if self._blob_reader is None or blob_hash not in self._blob_reader:
+            raise ValueError(f"Shelved variable {blob_hash} not found in the log")
+
+        return self._blob_reader.read_stored(blob_hash)
+
+    def unshelve(self, global_env={}, names=None, variables=None, cache=None):
+        """
+        Decompresses and unpickles the variables of the environment stored in the ``shelf``
+        attribute using dill. Updates the ``__globals__`` of any functions in ``shelf`` to include
+        elements in the shelf. Optionally includes the env passed in as ``global_env``.
+
+        If ``names`` is passed, only the variables with these names are unpickled, along with any
+        variables read by the code of the unpickled functions and classes (and of the variables
+        they read, and so on). If ``variables`` is passed, variables that aren't in it or whose type
+        when they were shelved doesn't match their type in it are not unpickled. Neither argument
+        has an effect on environments shelved by older versions of Otter, which are always
+        unpickled in full.
 
         Args:
             global_env (``dict``, optional): a global env to include in unpickled function globals
+            names (iterable of ``str``, optional): the names of the variables to unpickle
+            variables (``dict``, optional): a map of variable names to type strings restricting the
+                variables to unpickle
+            cache (``dict``, optional): a cache of unpickled variables keyed by the hashes of their
+                pickles, which is used and updated so that variables shared between entries are
+                only unpickled once
 
         Returns:
             ``dict``: the shelved environment
         """
         dill = import_or_raise("dill")
 
-        assert self.shelf, "no shelf in this entry"
+        assert self.shelf is not None, "no shelf in this entry"
 
-        # read bytes in self.shelf and load with dill
-        with tempfile.TemporaryFile() as tf:
-            tf.write(self.shelf)
-            tf.seek(0)
-            shelf = dill.load(tf)
+        if isinstance(self.shelf, dict):
+            shelf = {}
+            to_load = deque(self.shelf if names is None else names)
+            while to_load:
+                name = to_load.popleft()
+                if name in shelf or name not in self.shelf:
+                    continue
+
+                if variables is not None and (name not in variables or \
+                        self.shelf_types.get(name, variables[name]) != variables[name]):
+                    continue
+
+                blob_hash = self.shelf[name]
+                if cache is not None and blob_hash in cache:
+                    value = cache[blob_hash]
+
+                else:
+                    value = dill.loads(decompress_blob(*self._get_stored_blob(blob_hash)))
+                    if cache is not None:
+                        cache[blob_hash] = value
+
+                shelf[name] = value
+                if names is not None:
+                    to_load.extend(get_referenced_globals(value))
+
+        else:
+            shelf = dill.loads(self.shelf)
 
         # add the unpickeld env and global_env to all function __globals__
         for k, v in shelf.items():
@@ -274,24 +507,10 @@ class LogEntry:
         Returns:
             ``list`` of ``LogEntry``: the sorted log
         """
-        dill = import_or_raise("dill")
+        with open(filename, "rb") as file:
+            log = LogEntry._read_entries(file, filename)
 
-        try:
-            file = open(filename, "rb")
-
-            log = []
-            while True:
-                try:
-                    log.append(dill.load(file))
-                except EOFError:
-                    break
-
-            log = list(sorted(log, key = lambda l: l.timestamp, reverse = not ascending))
-
-            return log
-
-        finally:
-            file.close()
+        return LogEntry.sort_log(log, ascending=ascending)
 
     @staticmethod
     def shelve_environment(env, variables=None, ignore_modules=[]):
@@ -313,48 +532,273 @@ class LogEntry:
         """
         dill = import_or_raise("dill")
 
+        def check_variable(value):
+            dill.dumps(value)
+            return value
+
+        filtered_env, unshelved, _ = LogEntry._filter_environment(
+            env, check_variable, variables=variables, ignore_modules=ignore_modules)
+
+        return dill.dumps(filtered_env), unshelved
+
+    @staticmethod
+    def _filter_environment(env, store, variables=None, ignore_modules=[]):
+        """
+        Filter the variables of an environment that should be shelved, ignoring modules,
+        ``otter.Notebook`` instances, functions whose module is listed in ``ignore_modules``, and
+        variables not allowed by ``variables``.
+
+        Args:
+            env (``dict``): the environment to filter
+            store (callable): a function called with each variable to shelve that returns the value
+                to store for it, or raises an exception if the variable can't be shelved
+            variables (``dict`` *or* ``list``, optional): a map of variable name to type string
+                indicating **only** variables to include or a list of variable names to include
+                regardless of type
+            ignore_modules (``list`` of ``str``, optional): the module names to ignore
+
+        Returns:
+            ``tuple`` of (``dict``, ``list`` of ``str``, ``dict[str, str]``): the values returned by
+                ``store`` keyed by variable name, the names of the variables that weren't shelved,
+                and the reason each of them wasn't shelved
+        """
         from .notebook import Notebook
-        unshelved = []
+        unshelved = {}
         filtered_env = {}
         for k, v in env.items():
 
             # don't store modules or otter.Notebook instances
-            if type(v) == types.ModuleType or type(v) == Notebook:
-                unshelved.append(k)
+            if type(v) == types.ModuleType:
+                unshelved[k] = "modules are not shelved"
+
+            elif type(v) == Notebook:
+                unshelved[k] = "otter.Notebook instances are not shelved"
 
             # ignore any functions whose __module__ is in ignore_modules
             elif type(v) == types.FunctionType and v.__module__ in ignore_modules:
-                unshelved.append(k)
+                unshelved[k] = f"functions in the module {v.__module__} are ignored"
+
+            # only store variable names in variables that have the correct type
+            elif variables and k not in variables:
+                unshelved[k] = "the variable is not one of the variables to shelve"
 
-            # ensure object is pickleable by attempting dump and if so add to filtered_env
+            elif variables and isinstance(variables, dict) and \
+                    type(v).__module__ + "." + type(v).__name__ != variables[k]:
+                unshelved[k] = f"the variable is not of type {variables[k]}"
+
+            # ensure object is pickleable by storing it
             else:
                 try:
-                    dill.dumps(v)
+                    filtered_env[k] = store(v)
+                except ShelfSizeExceededException as e:
+                    unshelved[k] = str(e)
+                except:
+                    unshelved[k] = "the variable could not be pickled"
+
+        return filtered_env, list(unshelved), unshelved
+
+
+def append_to_log(filename, entries):
+    """
+    Append serialized entries to a log file in a single write, creating the file if necessary.
+
+    The pickled variables of the entries' shelved environments that aren't in the log file yet are
+    written before the entries that use them. If any of the entries have shelved environments and
+    the log file is in the legacy format, it is converted to the framed format first.
+
+    Args:
+        filename (``str``): the path to the log file
+        entries (``list`` of ``SerializedLogEntry``): the entries, in the order to append them
+    """
+    try:
+        has_shelves = any("shelf" in e.metadata for e in entries)
+        if has_shelves and os.path.exists(filename) and os.path.getsize(filename) > 0:
+            with open(filename, "rb") as file:
+                framed = is_framed_log(file)
+            if not framed:
+                compact_log(filename)
+
+        blobs = get_log_blobs(filename) if has_shelves else {}
+
+        buffer = io.BytesIO()
+        with open(filename, "ab+") as file:
+            file.seek(0, os.SEEK_END)
+            if file.tell() == 0:
+                write_log_header(buffer)
+                framed = True
+
+            else:
+                framed = is_framed_log(file)
+
+            for entry in entries:
+                if not framed:
+                    buffer.write(entry.payload)
+                    continue
 
-                    # only store variable names in variables that have the correct type
-                    if (variables and k in variables) or not variables:
-                        full_type = type(v).__module__ + "." + type(v).__name__
+                for blob_hash in entry.blob_hashes:
+                    if blob_hash not in blobs:
+                        if blob_hash not in entry.blobs:
+                            raise ValueError(f"Shelved variable {blob_hash} not found in the log")
 
-                        if (isinstance(variables, dict) and full_type == variables[k]) or \
-                            isinstance(variables, list) or not variables:
-                            filtered_env[k] = v
+                        blob, compression = entry.blobs[blob_hash]
+                        write_log_record(
+                            buffer, RecordType.BLOB, {"hash": blob_hash, "compression": compression},
+                            blob)
+                        blobs[blob_hash] = len(blob)
 
-                        else:
-                            unshelved.append(k)
+                write_log_record(buffer, RecordType.ENTRY, entry.metadata, entry.payload)
+
+            file.write(buffer.getvalue())
+
+        if has_shelves:
+            record_log_blobs(filename, blobs)
+
+    except OSError:
+        raise Exception(
+            "Could not create the log file as the file system is read-only. Please contact your "
+            "instructor before continuing on this assignment."
+        )
+
+
+def compact_log(filename):
+    """
+    Remove the superseded environments from a log file, rewriting it in the framed format. Shelved
+    variables that are no longer referenced by any entry are removed as well.
+
+    Only the entries whose environments are removed are deserialized; all other records are copied
+    as-is. The compacted log is written to a temporary file that replaces the log, so the log is
+    left unchanged if compaction fails. Logs in the legacy format are always rewritten.
+
+    Args:
+        filename (``str``): the path to the log file
+
+    Returns:
+        ``int``: the number of environments that were removed
+    """
+    dill = import_or_raise("dill")
+
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        with open(filename, "rb") as file, os.fdopen(fd, "wb") as f:
+            if is_framed_log(file):
+                records = read_log_index(file)
+                entry_records = [r for r in records if r.record_type == RecordType.ENTRY]
+                superseded = {entry_records[i].offset for i in find_superseded_shelves(
+                    [(r.question, r.shelved, r.supersedes_shelves) for r in entry_records])}
+
+                referenced = set()
+                for record in entry_records:
+                    if record.offset not in superseded:
+                        referenced.update(record.metadata.get("shelf", {}).values())
+
+                unreferenced = {
+                    r.offset for r in records
+                        if r.record_type == RecordType.BLOB and r.metadata["hash"] not in referenced}
+
+                if not superseded and not unreferenced:
+                    return 0
+
+                write_log_header(f)
+                for record in records:
+                    if record.offset in unreferenced:
+                        continue
+
+                    payload = read_log_payload(file, record)
+                    if record.offset in superseded:
+                        entry = dill.loads(payload)
+                        entry.shelf = None
+                        write_log_record(
+                            f, RecordType.ENTRY, entry._get_record_metadata(), dill.dumps(entry))
 
                     else:
-                        unshelved.append(k)
+                        write_log_record(f, record.record_type, record.metadata, payload)
 
-                except:
-                    unshelved.append(k)
+            else:
+                # read the entries without removing the superseded environments to count them
+                entries = []
+                while True:
+                    try:
+                        entries.append(dill.load(file))
+                    except EOFError:
+                        break
+
+                superseded = find_superseded_shelves(
+                    [(e.question, e.shelf is not None, e.supersedes_shelves) for e in entries])
+                for i in superseded:
+                    entries[i].shelf = None
+
+                write_log_header(f)
+                for entry in entries:
+                    write_log_record(
+                        f, RecordType.ENTRY, entry._get_record_metadata(), dill.dumps(entry))
+
+        os.replace(temp_path, filename)
+
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return len(superseded)
+
+
+class _LazyLogEntries(Sequence):
+    """
+    The entries of a log file in the framed format, each of which is deserialized the first time
+    it is accessed.
+
+    Args:
+        filename (``str``): the path to the log file
+        records (``list`` of ``otter.check.log_format.LogRecord``): the records of the entries, in
+            the order of the entries
+        superseded (``set[int]``, optional): the offsets of the records of entries whose shelved
+            environments are superseded and should be removed
+        loaded (``dict[int, LogEntry]``, optional): already-deserialized entries keyed by the
+            offsets of their records
+        blob_reader (``otter.check.shelf.LogBlobReader``, optional): the reader for the shelved
+            variables in the log file
+    """
+
+    def __init__(self, filename, records, superseded=None, loaded=None, blob_reader=None):
+        self.filename = filename
+        self.records = records
+        self._superseded = superseded if superseded is not None else set()
+        self._loaded = loaded if loaded is not None else {}
+        self._blob_reader = blob_reader
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
 
-        # dump filtered_env to a temporary file and then return the bytes and unshelved list
-        with tempfile.TemporaryFile() as tf:
-            dill.dump(filtered_env, tf)
-            tf.seek(0)
-            shelf_contents = tf.read()
+        record = self.records[idx]
+        if record.offset not in self._loaded:
+            dill = import_or_raise("dill")
+            with open(self.filename, "rb") as f:
+                entry = dill.loads(read_log_payload(f, record))
 
-        return shelf_contents, unshelved
+            if record.offset in self._superseded:
+                entry.shelf = None
+            entry._blob_reader = self._blob_reader
+
+            self._loaded[record.offset] = entry
+
+        return self._loaded[record.offset]
+
+    def sorted(self, ascending=True):
+        """
+        Sort the entries by timestamp without deserializing them.
+
+        Args:
+            ascending (``bool``, optional): whether to sort the entries chronologically
+
+        Returns:
+            ``_LazyLogEntries``: the sorted entries, which share deserialized entries with these
+        """
+        records = sorted(self.records, key = lambda r: r.timestamp, reverse = not ascending)
+        return type(self)(
+            self.filename, records, self._superseded, self._loaded, self._blob_reader)
 
 
 class Log:
@@ -362,13 +806,17 @@ class Log:
     A class for reading and interacting with a log. Allows you to iterate over the entries in the log 
     and supports integer indexing. *Does not support editing the log file.*
 
+    Logs read from files in the framed format of ``otter.check.log_format`` deserialize each entry
+    only when it is accessed, and the questions and the most recent entry for each question are
+    determined from the metadata of the entries.
+
     Args:
-        entries (``list`` of ``LogEntry``): the list of entries for this log
+        entries (sequence of ``LogEntry``): the list of entries for this log
         ascending (``bool``, optional): whether the log is sorted in ascending (chronological) order;
             default ``True``
 
     Attributes:
-        entries (``list`` of ``LogEntry``): the list of log entries in this log
+        entries (sequence of ``LogEntry``): the list of log entries in this log
         ascending (``bool``): whether ``entries`` is sorted chronologically; ``False`` indicates reverse-
             chronological order
     """
@@ -376,6 +824,7 @@ class Log:
     def __init__(self, entries, ascending=True):
         self.entries = entries
         self.ascending = ascending
+        self._latest_entries = None
 
     def __repr__(self):
         return "otter.logs.Log([\n  {}\n])".format(",\n  ".join([repr(e) for e in self.entries]))
@@ -402,9 +851,25 @@ class Log:
         Args:
             ascending (``bool``, optional): whether to sort the log chronologically; defaults to ``True``
         """
-        self.entries = LogEntry.sort_log(self.entries, ascending=ascending)
-        # self.entries = LogEntry.sort_log(self.entries)
+        if isinstance(self.entries, _LazyLogEntries):
+            self.entries = self.entries.sorted(ascending=ascending)
+        else:
+            self.entries = LogEntry.sort_log(self.entries, ascending=ascending)
         self.ascending = ascending
+        self._latest_entries = None
+
+    def _get_entry_metadata(self):
+        """
+        Get the event type, question, and timestamp of each entry without deserializing the entries
+        of framed log files.
+
+        Returns:
+            ``list`` of ``tuple[EventType, str, datetime.datetime]``: the metadata of each entry
+        """
+        if isinstance(self.entries, _LazyLogEntries):
+            return [
+                (EventType[r.event_type], r.question, r.timestamp) for r in self.entries.records]
+        return [(e.event_type, e.question, e.timestamp) for e in self.entries]
 
     def get_questions(self):
         """
@@ -413,7 +878,7 @@ class Log:
         Returns:
             ``list`` of ``str``: the questions in this log
         """
-        all_questions = [entry.question for entry in self.entries if entry.event_type == EventType.CHECK]
+        all_questions = [q for et, q, _ in self._get_entry_metadata() if et == EventType.CHECK]
         return list(sorted(set(all_questions)))
 
     @classmethod
@@ -429,7 +894,22 @@ class Log:
         Returns:
             ``Log``: the ``Log`` instance created from the file
         """
-        return cls(entries=LogEntry.log_from_file(filename, ascending=ascending), ascending=ascending)
+        with open(filename, "rb") as file:
+            if not is_framed_log(file):
+                return cls(
+                    entries=LogEntry.log_from_file(filename, ascending=ascending),
+                    ascending=ascending)
+
+            all_records = read_log_index(file)
+
+        records = [r for r in all_records if r.record_type == RecordType.ENTRY]
+        superseded = {records[i].offset for i in find_superseded_shelves(
+            [(r.question, r.shelved, r.supersedes_shelves) for r in records])}
+        log = cls(entries=_LazyLogEntries(
+            filename, records, superseded,
+            blob_reader=LogBlobReader.from_records(filename, all_records)))
+        log.sort(ascending=ascending)
+        return log
 
     def get_question_entry(self, question):
         """
@@ -444,13 +924,17 @@ class Log:
         Raises:
             ``QuestionNotInLogException``: if the question is not in the log
         """
-        if self.ascending:
-            self.entries = LogEntry.sort_log(self.entries, ascending=False)
-            self.ascending = False
-        for entry in self.entries:
-            if entry.question == question:
-                return entry
-        raise QuestionNotInLogException(f"question {question} is not in the log")
+        if self._latest_entries is None:
+            metadata = self._get_entry_metadata()
+            order = sorted(range(len(metadata)), key = lambda i: metadata[i][2], reverse = True)
+            self._latest_entries = {}
+            for i in order:
+                self._latest_entries.setdefault(metadata[i][1], i)
+
+        if question not in self._latest_entries:
+            raise QuestionNotInLogException(f"question {question} is not in the log")
+
+        return self.entries[self._latest_entries[question]]
 
     def get_results(self, question):
         """Gets the most recent grading result for a specified question from this log
@@ -469,8 +953,8 @@ class Log:
 
 class QuestionLogIterator:
     """
-    An iterator over the most recent entries for each question in the log. Sorts the log when initialized
-    and uses `Log.get_questions` to retrieve the list of questions.
+    An iterator over the most recent entries for each question in the log. Uses `Log.get_questions`
+    to retrieve the list of questions.
 
     Args:
         log (``Log``): the log over which to iterate
@@ -481,8 +965,6 @@ class QuestionLogIterator:
         curr_idx (``int``): the integer index of the next question in  ``questions``
     """
     def __init__(self, log):
-        log.sort(ascending=False)
-        log.sort()
         self.log = log
         self.questions = self.log.get_questions()
         self.curr_idx = 0
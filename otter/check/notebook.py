@@ -12,11 +12,15 @@ from glob import glob
 from IPython.display import display, HTML
 from textwrap import indent
 
-from .logs import LogEntry, EventType, Log
+from .check_cache import CheckCache
+from .log_writer import BackgroundLogWriter
+from .logs import compact_log, LogEntry, EventType, Log
+from .tests_cache import RemoteTestsCache
 from .utils import grade_zip_file, grading_mode_disabled, incompatible_with, IPythonInterpreter, \
-     list_available_tests, logs_event, resolve_test_info, save_notebook
+     list_available_tests, list_checked_questions, logs_event, resolve_test_info, save_notebook
 
 from ..execute import Checker
+from ..execute.context import GradingContext, get_grading_context, use_grading_context
 from ..export import export_notebook
 from ..plugins import PluginCollection
 from ..test_files import GradingResults
@@ -24,6 +28,7 @@ from ..utils import Loggable, loggers
 
 
 _OTTER_LOG_FILENAME = ".OTTER_LOG"
+_LOG_WRITER = None
 _SHELVE = False
 _ZIP_NAME_FILENAME = "__zip_filename__"
 
@@ -35,17 +40,14 @@ class Notebook(Loggable):
     Args:
         nb_path(``str``, optional): path to the notebook being run
         tests_dir (``str``, optional): path to tests directory
+        tests_url_prefix (``str``, optional): a URL prefix from which to download test files (on
+            JupyterLite); the downloaded tests are cached in ``tests_dir``
         colab (``bool``, optional): whether this notebook is being run on Google Colab; if ``None``,
             this information is automatically parsed from IPython on creation
         jupyterlite (``bool``, optional): whether this notebook is being run on JupyterLite; if
             ``None``, this information is automatically parsed from IPython on creation
     """
 
-    _grading_mode = False
-
-    # overrides tests_dir arg in __init__, used for changing tests dir during grading
-    _tests_dir_override = None
-
     @logs_event(EventType.INIT)
     def __init__(
         self,
@@ -55,7 +57,7 @@ class Notebook(Loggable):
         colab=None,
         jupyterlite=None,
     ):
-        global _SHELVE
+        global _LOG_WRITER, _SHELVE
 
         interpreter = None
         if colab or IPythonInterpreter.COLAB.value.running():
@@ -68,8 +70,10 @@ class Notebook(Loggable):
         if self._interpreter is IPythonInterpreter.COLAB and not os.path.isdir(tests_dir):
             raise ValueError(f"Tests directory {tests_dir} does not exist")
 
-        if type(self)._tests_dir_override is not None:
-            self._path = type(self)._tests_dir_override
+        # the grading context overrides the tests directory, used for changing it during grading
+        grading_context = get_grading_context()
+        if grading_context is not None and grading_context.tests_dir is not None:
+            self._path = grading_context.tests_dir
         else:
             self._path = tests_dir
 
@@ -77,6 +81,9 @@ class Notebook(Loggable):
         self._tests_url_prefix = tests_url_prefix
         self._addl_files = []
         self._plugin_collections = {}
+        self._check_cache = None
+        self._tests_url_cache = None
+        tests_revalidate_interval = 300
 
         # assume using otter service if there is a .otter file
         otter_configs = glob("*.otter")
@@ -91,9 +98,45 @@ class Notebook(Loggable):
             _SHELVE = self._config.get("save_environment", False)
             self._ignore_modules = self._config.get("ignore_modules", [])
             self._vars_to_store = self._config.get("variables", None)
+            self._shelf_compression = self._config.get("shelf_compression", "zlib")
+            self._max_variable_size = self._config.get("max_variable_size", None)
+            self._max_shelf_size = self._config.get("max_shelf_size", None)
+
+            if self._config.get("cache_checks", False):
+                self._check_cache = CheckCache()
+
+            if self._config.get("background_logging", False) and _LOG_WRITER is None:
+                _LOG_WRITER = BackgroundLogWriter(
+                    _OTTER_LOG_FILENAME, flush_interval=self._config.get("log_flush_interval", 5))
+
+            tests_revalidate_interval = self._config.get(
+                "tests_revalidate_interval", tests_revalidate_interval)
 
             self._notebook = self._config["notebook"]
 
+        if tests_url_prefix is not None:
+            self._tests_url_cache = RemoteTestsCache(
+                tests_url_prefix, self._path, revalidate_interval=tests_revalidate_interval)
+
+            if grading_context is None:
+                self._prefetch_tests()
+
+    def _prefetch_tests(self):
+        """
+        Start downloading the test files of the questions that are checked in the notebook and of
+        any questions whose test files are already cached. Errors are logged instead of raised.
+        """
+        try:
+            questions = set(self._tests_url_cache.list_cached())
+            nb_path = self._resolve_nb_path(None, fail_silently=True)
+            if nb_path is not None:
+                questions.update(list_checked_questions(nb_path))
+
+            self._tests_url_cache.prefetch(sorted(questions))
+
+        except Exception as e:
+            self._logger.debug(f"Could not prefetch test files: {e}")
+
     @classmethod
     @contextmanager
     def grading_mode(cls, tests_dir):
@@ -101,24 +144,20 @@ class Notebook(Loggable):
         A context manager for the ``Notebook`` grading mode. Yields a pointer to the list of results
         that will be populated during grading.
 
-        **It is the caller's responsibility to maintain the pointer.** The pointer in the ``Checker``
-        class will be overwritten when the context exits.
+        Grading mode is tracked with an ``otter.execute.context.GradingContext`` that is only active
+        in the current thread or task, so multiple submissions can be graded concurrently.
+
+        **It is the caller's responsibility to maintain the pointer.** The context is discarded when
+        it exits.
         """
         logger = cls._get_logger()
         logger.info("Entering Notebook grading mode")
         logger.debug(f"Overriding tests directory: {tests_dir}")
-        cls._grading_mode = True
-        cls._tests_dir_override = tests_dir
-        Checker.clear_results()
-        Checker.enable_tracking()
 
-        yield Checker.get_results()
+        with use_grading_context(GradingContext(tests_dir=tests_dir)) as context:
+            yield context.results
 
         logger.info("Exiting Notebook grading mode")
-        cls._grading_mode = False
-        cls._tests_dir_override = None
-        Checker.disable_tracking()
-        Checker.clear_results()
 
     @incompatible_with(IPythonInterpreter.PYOLITE, throw_error=False)
     def _log_event(self, event_type, results=[], question=None, success=True, error=None, shelve_env={}):
@@ -133,6 +172,10 @@ class Notebook(Loggable):
             success (``bool``, optional): whether the operation was successful
             error (``Exception``, optional): the exception thrown by the operation, if applicable
         """
+        grading_context = get_grading_context()
+        if grading_context is not None and not grading_context.log_events:
+            return
+
         entry = LogEntry(
             event_type,
             results=results,
@@ -147,10 +190,18 @@ class Notebook(Loggable):
                 delete=True,
                 filename=_OTTER_LOG_FILENAME,
                 ignore_modules=self._ignore_modules,
-                variables=self._vars_to_store
+                variables=self._vars_to_store,
+                compression=self._shelf_compression,
+                max_variable_size=self._max_variable_size,
+                max_shelf_size=self._max_shelf_size,
             )
+            for name, reason in entry.unshelved_reasons.items():
+                self._logger.debug(f"Variable {name} was not shelved: {reason}")
 
-        entry.flush_to_file(_OTTER_LOG_FILENAME)
+        if _LOG_WRITER is not None:
+            _LOG_WRITER.write(entry)
+        else:
+            entry.flush_to_file(_OTTER_LOG_FILENAME)
 
     def _resolve_nb_path(self, nb_path, fail_silently=False):
         """
@@ -203,6 +254,7 @@ class Notebook(Loggable):
             self._resolve_nb_path(None, fail_silently=True),
             self._tests_url_prefix,
             question,
+            tests_url_cache=self._tests_url_cache,
         )
 
         self._logger.debug(f"Resolved test path: {test_path}")
@@ -221,10 +273,18 @@ class Notebook(Loggable):
             self._logger.debug(f"Collecting calling global environment")
             global_env = inspect.currentframe().f_back.f_back.f_globals
 
+        # fingerprint the test's inputs before running it, in case the test changes them
+        cache_key = None
+        if self._check_cache is not None:
+            cache_key = self._check_cache.get_key(test_path, test_name, global_env)
+
         # run the check
         self._logger.debug(f"Calling checker")
         result = Checker.check(test_path, test_name, global_env)
 
+        if self._check_cache is not None:
+            self._check_cache.put(test_path, test_name, cache_key, result)
+
         return question, result, global_env
 
     @incompatible_with(IPythonInterpreter.COLAB)
@@ -342,6 +402,9 @@ class Notebook(Loggable):
             display_link (``bool``, optional): whether or not to display a download link
             force_save (``bool``, optional): whether or not to display JavaScript that force-saves the
                 notebook (only works in Jupyter Notebook classic, not JupyterLab)
+            run_tests (``bool``, optional): whether to grade the exported notebook against the local
+                tests; the notebook is graded by a worker process that is started by the first export
+                and reused by later exports
         """
         self._log_event(EventType.BEGIN_EXPORT)
 
@@ -384,7 +447,20 @@ class Notebook(Loggable):
             else:
                 warnings.warn("Could not locate a PDF to include")
 
+        if _LOG_WRITER is not None:
+            try:
+                _LOG_WRITER.flush()
+            except Exception as e:
+                self._logger.warning(f"Could not write to the log: {e}")
+
         if os.path.isfile(_OTTER_LOG_FILENAME):
+            # remove superseded environments so that they aren't included in the submission
+            try:
+                removed = compact_log(_OTTER_LOG_FILENAME)
+                self._logger.debug(f"Removed {removed} superseded environments from the log")
+            except Exception as e:
+                self._logger.debug(f"Could not compact the log: {e}")
+
             zf.write(_OTTER_LOG_FILENAME)
             self._logger.debug("Added Otter log to zip file")
 
@@ -428,10 +504,17 @@ class Notebook(Loggable):
 
     @grading_mode_disabled
     @logs_event(EventType.END_CHECK_ALL)
-    def check_all(self):
+    def check_all(self, force=False):
         """
         Runs all tests on this notebook. Tests are run against the current global environment, so any
         tests with variable name collisions will fail.
+
+        If the ``cache_checks`` key of the Otter configuration file is ``true``, the results of
+        questions that passed are reused (and marked as cached) as long as their tests and the
+        values of the variables their tests read haven't changed since they were last checked.
+
+        Args:
+            force (``bool``, optional): whether to run every test, even if its result is cached
         """
         self._log_event(EventType.BEGIN_CHECK_ALL)
 
@@ -443,10 +526,26 @@ class Notebook(Loggable):
 
         results = []
         if not _SHELVE:
+            use_cache = self._check_cache is not None and not force and \
+                self._tests_url_prefix is None
+            nb_path = self._resolve_nb_path(None, fail_silently=True)
             for test_name in tests:
-                results.append(self.check(test_name, global_env))
+                result = None
+                if use_cache:
+                    test_path, nb_test_name = resolve_test_info(self._path, nb_path, None, test_name)
+                    result = self._check_cache.get(test_path, nb_test_name, global_env)
+
+                if result is not None:
+                    self._logger.info(f"Using cached result for question: {test_name}")
+                else:
+                    result = self.check(test_name, global_env)
+
+                results.append(result)
 
         else:
+            if _LOG_WRITER is not None:
+                _LOG_WRITER.flush()
+
             log = Log.from_file(_OTTER_LOG_FILENAME, ascending=False)
             for file in sorted(tests):
                 if "__init__.py" not in file:
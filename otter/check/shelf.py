@@ -0,0 +1,369 @@
+"""Per-variable, content-addressed storage of shelved environments"""
+
+import hashlib
+import io
+import lzma
+import os
+import sys
+import threading
+import types
+import zlib
+
+from collections import OrderedDict
+
+from .log_format import is_framed_log, read_log_index, read_log_payload, RecordType
+
+from ..utils import import_or_raise
+
+
+# the maximum number of fingerprints to remember
+_FINGERPRINT_CACHE_SIZE = 4096
+
+# the compression methods for shelved variables, mapped to functions that create compressors and
+# functions that decompress
+_COMPRESSION_METHODS = {
+    "zlib": (zlib.compressobj, zlib.decompress),
+    "lzma": (lzma.LZMACompressor, lzma.decompress),
+}
+
+_fingerprints = OrderedDict()
+_log_blobs = {}
+_lock = threading.Lock()
+
+
+class ShelfSizeExceededException(Exception):
+    """
+    Exception that indicates that a variable can't be shelved because it is too large
+    """
+
+
+class _CompressingWriter:
+    """
+    A file-like object that hashes and compresses the data written to it into an in-memory buffer,
+    raising a ``ShelfSizeExceededException`` as soon as the compressed data is larger than
+    ``max_size``.
+
+    Args:
+        compression (``str | None``): the compression method; one of ``"zlib"``, ``"lzma"``, or
+            ``None`` for no compression
+        max_size (``int | None``): the maximum size of the compressed data in bytes
+    """
+
+    def __init__(self, compression, max_size):
+        if compression is not None and compression not in _COMPRESSION_METHODS:
+            raise ValueError(f"Unsupported shelf compression: {compression}")
+
+        self._compressor = _COMPRESSION_METHODS[compression][0]() if compression else None
+        self._hash = hashlib.sha256()
+        self._buffer = io.BytesIO()
+        self._max_size = max_size
+
+    def _check_size(self):
+        if self._max_size is not None and self._buffer.tell() > self._max_size:
+            raise ShelfSizeExceededException(
+                f"the variable is larger than the maximum size of {self._max_size} bytes")
+
+    def write(self, data):
+        self._hash.update(data)
+        self._buffer.write(self._compressor.compress(data) if self._compressor else data)
+        self._check_size()
+        return len(data)
+
+    def finish(self):
+        """
+        Finish compressing the data.
+
+        Returns:
+            ``tuple[str, bytes]``: the hex digest of the SHA-256 hash of the uncompressed data and
+            the compressed data
+        """
+        if self._compressor:
+            self._buffer.write(self._compressor.flush())
+            self._check_size()
+
+        return self._hash.hexdigest(), self._buffer.getvalue()
+
+
+def serialize_variable(value, compression="zlib", max_size=None):
+    """
+    Pickle a variable with dill, streaming the pickle through a compressor into memory.
+
+    The variable is keyed by the hash of its uncompressed pickle, so the same contents have the same
+    hash regardless of how they are compressed.
+
+    Args:
+        value (``object``): the variable
+        compression (``str | None``, optional): the compression method; one of ``"zlib"``,
+            ``"lzma"``, or ``None`` for no compression
+        max_size (``int | None``, optional): the maximum size of the compressed pickle in bytes
+
+    Returns:
+        ``tuple[str, bytes]``: the hash of the pickle and the compressed pickle
+
+    Raises:
+        ``ShelfSizeExceededException``: if the compressed pickle is larger than ``max_size``; the
+            variable stops being pickled as soon as this happens
+    """
+    dill = import_or_raise("dill")
+
+    writer = _CompressingWriter(compression, max_size)
+    dill.dump(value, writer)
+    return writer.finish()
+
+
+def decompress_blob(data, compression):
+    """
+    Decompress a pickled variable.
+
+    Args:
+        data (``bytes``): the compressed pickle
+        compression (``str | None``): the compression method used to compress the pickle
+
+    Returns:
+        ``bytes``: the pickle
+    """
+    if compression is None:
+        return data
+
+    if compression not in _COMPRESSION_METHODS:
+        raise ValueError(f"Unsupported shelf compression: {compression}")
+
+    return _COMPRESSION_METHODS[compression][1](data)
+
+
+def fingerprint(obj):
+    """
+    Compute a cheap fingerprint of the contents of an object, if possible, which is used to skip
+    serializing objects whose contents have already been shelved.
+
+    Fingerprints are computed by hashing the memory buffers of bytes-like objects and numpy arrays
+    and with ``pandas.util.hash_pandas_object`` for pandas objects; other objects don't have
+    fingerprints. numpy and pandas are not imported if they haven't been imported already.
+
+    Args:
+        obj (``object``): the object
+
+    Returns:
+        ``str | None``: the fingerprint, or ``None`` if the object doesn't have one
+    """
+    h = hashlib.blake2b(f"{type(obj).__module__}.{type(obj).__qualname__}".encode("utf-8"))
+    try:
+        if type(obj) in (bytes, bytearray):
+            h.update(obj)
+            return h.hexdigest()
+
+        np = sys.modules.get("numpy")
+        if np is not None and type(obj) is np.ndarray and not obj.dtype.hasobject:
+            h.update(repr((obj.shape, obj.dtype.str, obj.flags.f_contiguous)).encode("utf-8"))
+            h.update(memoryview(np.ascontiguousarray(obj)).cast("B"))
+            return h.hexdigest()
+
+        pd = sys.modules.get("pandas")
+        if pd is not None and type(obj) in (pd.DataFrame, pd.Series):
+            if isinstance(obj, pd.DataFrame):
+                h.update(repr((obj.columns.tolist(), obj.dtypes.tolist())).encode("utf-8"))
+            else:
+                h.update(repr((obj.name, obj.dtype)).encode("utf-8"))
+            h.update(repr((type(obj.index), obj.index.names)).encode("utf-8"))
+            h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+            return h.hexdigest()
+
+    except Exception:
+        pass
+
+    return None
+
+
+def get_referenced_globals(obj):
+    """
+    Determine the global names that the code of an object may read: the names used by a function,
+    by the methods of a class, or by the methods of the class of an object whose class was defined in
+    ``__main__``.
+
+    Args:
+        obj (``object``): the object
+
+    Returns:
+        ``set[str]``: the names
+    """
+    if not isinstance(obj, (types.FunctionType, type)):
+        if type(obj).__module__ != "__main__":
+            return set()
+        obj = type(obj)
+
+    functions = []
+    if isinstance(obj, types.FunctionType):
+        functions.append(obj)
+
+    else:
+        for value in vars(obj).values():
+            if isinstance(value, (staticmethod, classmethod)):
+                value = value.__func__
+            elif isinstance(value, property):
+                functions.extend(f for f in [value.fget, value.fset, value.fdel] if f is not None)
+            if isinstance(value, types.FunctionType):
+                functions.append(value)
+
+    names, codes = set(), [f.__code__ for f in functions if hasattr(f, "__code__")]
+    while codes:
+        code = codes.pop()
+        names.update(code.co_names)
+        codes.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+
+    return names
+
+
+def get_fingerprinted_blob(fp):
+    """
+    Get the hash and size of the blob of a fingerprinted object that was already serialized.
+
+    Args:
+        fp (``str``): the fingerprint
+
+    Returns:
+        ``tuple[str, int] | None``: the hash and size of the blob, if the fingerprint is known
+    """
+    with _lock:
+        blob = _fingerprints.get(fp)
+        if blob is not None:
+            _fingerprints.move_to_end(fp)
+        return blob
+
+
+def add_fingerprinted_blob(fp, blob_hash, size):
+    """
+    Record the hash and size of the blob of a fingerprinted object.
+
+    Args:
+        fp (``str``): the fingerprint
+        blob_hash (``str``): the hash of the blob
+        size (``int``): the size of the blob in bytes
+    """
+    with _lock:
+        _fingerprints[fp] = (blob_hash, size)
+        _fingerprints.move_to_end(fp)
+        while len(_fingerprints) > _FINGERPRINT_CACHE_SIZE:
+            _fingerprints.popitem(last=False)
+
+
+def _get_stat_key(filename):
+    stat = os.stat(filename)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def get_log_blobs(filename):
+    """
+    Get the hashes and sizes of the blobs stored in a log file.
+
+    The blobs are cached until the log file is changed by something other than
+    ``record_log_blobs``, so the log only needs to be indexed again if it was changed elsewhere
+    (e.g. by compaction).
+
+    Args:
+        filename (``str``): the path to the log file
+
+    Returns:
+        ``dict[str, int]``: the sizes of the blobs in bytes keyed by their hashes; empty if the file
+        doesn't exist or is in the legacy format
+    """
+    abspath = os.path.abspath(filename)
+    try:
+        key = _get_stat_key(abspath)
+    except OSError:
+        return {}
+
+    with _lock:
+        cached = _log_blobs.get(abspath)
+        if cached is not None and cached[0] == key:
+            return dict(cached[1])
+
+    with open(abspath, "rb") as f:
+        if not is_framed_log(f):
+            return {}
+
+        blobs = {
+            r.metadata["hash"]: r.length for r in read_log_index(f)
+                if r.record_type == RecordType.BLOB}
+
+    with _lock:
+        _log_blobs[abspath] = (key, blobs)
+
+    return dict(blobs)
+
+
+def record_log_blobs(filename, blobs):
+    """
+    Update the cached blobs of a log file after this process has appended blobs to it.
+
+    Args:
+        filename (``str``): the path to the log file
+        blobs (``dict[str, int]``): the sizes of all of the blobs in the file keyed by their hashes
+    """
+    abspath = os.path.abspath(filename)
+    with _lock:
+        _log_blobs[abspath] = (_get_stat_key(abspath), dict(blobs))
+
+
+class LogBlobReader:
+    """
+    A reader for the blobs stored in a log file.
+
+    Args:
+        filename (``str``): the path to the log file
+        records (``dict[str, otter.check.log_format.LogRecord]``): the records of the blobs, keyed
+            by their hashes
+    """
+
+    def __init__(self, filename, records):
+        self.filename = filename
+        self.records = records
+
+    def __contains__(self, blob_hash):
+        return blob_hash in self.records
+
+    def read(self, blob_hash):
+        """
+        Read a blob from the log file.
+
+        Args:
+            blob_hash (``str``): the hash of the blob
+
+        Returns:
+            ``bytes``: the decompressed blob
+
+        Raises:
+            ``KeyError``: if the log file doesn't contain the blob
+        """
+        return decompress_blob(*self.read_stored(blob_hash))
+
+    def read_stored(self, blob_hash):
+        """
+        Read a blob from the log file as it is stored.
+
+        Args:
+            blob_hash (``str``): the hash of the blob
+
+        Returns:
+            ``tuple[bytes, str | None]``: the compressed blob and its compression method
+
+        Raises:
+            ``KeyError``: if the log file doesn't contain the blob
+        """
+        record = self.records[blob_hash]
+        with open(self.filename, "rb") as f:
+            return read_log_payload(f, record), record.metadata.get("compression")
+
+    @classmethod
+    def from_records(cls, filename, records):
+        """
+        Create a reader for the blob records in a list of records from a log file.
+
+        Args:
+            filename (``str``): the path to the log file
+            records (``list`` of ``otter.check.log_format.LogRecord``): the records in the file
+
+        Returns:
+            ``LogBlobReader``: the reader
+        """
+        return cls(filename, {
+            r.metadata["hash"]: r for r in records if r.record_type == RecordType.BLOB})
@@ -0,0 +1,362 @@
+"""Local caching of test files downloaded from URLs"""
+
+import json
+import os
+import threading
+import time
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from ..utils import loggers
+
+
+LOGGER = loggers.get_logger(__name__)
+
+# the name of the file in the tests directory that stores the validators of the downloaded tests
+_INDEX_FILENAME = ".otter_tests_cache.json"
+
+# the response headers used to revalidate cached test files
+_VALIDATOR_HEADERS = ["ETag", "Last-Modified"]
+
+
+def _get_validators(headers):
+    """
+    Get the ``ETag`` and ``Last-Modified`` headers from a set of response headers. Header names are
+    matched case-insensitively, since some clients (e.g. ``pyodide.http.pyfetch``) lowercase them.
+
+    Args:
+        headers (``dict[str, str]``): the response headers
+
+    Returns:
+        ``dict[str, str]``: the ``ETag`` and ``Last-Modified`` headers that are present
+    """
+    headers = {k.lower(): v for k, v in headers.items()}
+    return {h: headers[h.lower()] for h in _VALIDATOR_HEADERS if headers.get(h.lower())}
+
+
+URLResponse = namedtuple("URLResponse", ["status", "text", "headers"])
+URLResponse.__doc__ = """\
+The response to a request made by a ``URLFetcher``.
+
+Attributes:
+    status (``int``): the HTTP status code
+    text (``str``): the body of the response
+    headers (``dict[str, str]``): the ``ETag`` and ``Last-Modified`` headers of the response, if
+        present; their names are matched case-insensitively
+"""
+
+
+class URLFetcher:
+    """
+    An interface for making HTTP ``GET`` requests, used by ``RemoteTestsCache`` to download test
+    files.
+
+    Subclasses must implement ``fetch``; the default implementation of ``fetch_all`` makes the
+    requests in parallel in a thread pool.
+    """
+
+    def fetch(self, url, headers):
+        """
+        Make a request.
+
+        Args:
+            url (``str``): the URL
+            headers (``dict[str, str]``): the request headers
+
+        Returns:
+            ``URLResponse``: the response
+
+        Raises:
+            ``Exception``: if the request couldn't be made (e.g. because the network is down)
+        """
+        raise NotImplementedError()
+
+    def fetch_all(self, requests, callback):
+        """
+        Make many requests at once, calling ``callback`` with the URL and either the response or the
+        error raised as each request completes. Implementations may return before the requests are
+        complete.
+
+        Args:
+            requests (``list[tuple[str, dict[str, str]]]``): the URL and headers of each request
+            callback (callable): a function called with the arguments ``url``, ``response``, and
+                ``error`` for each request
+        """
+        def fetch_one(request):
+            url, headers = request
+            try:
+                response = self.fetch(url, headers)
+            except Exception as e:
+                callback(url, None, e)
+            else:
+                callback(url, response, None)
+
+        if requests:
+            with ThreadPoolExecutor(min(len(requests), 8)) as pool:
+                list(pool.map(fetch_one, requests))
+
+
+class PyodideFetcher(URLFetcher):
+    """
+    A ``URLFetcher`` for Pyodide (e.g. JupyterLite) that makes requests with the browser.
+
+    Single requests are made with a synchronous ``XMLHttpRequest``. ``fetch_all`` starts all of the
+    requests with ``pyodide.http.pyfetch`` and returns immediately; they are completed while the
+    kernel is idle.
+
+    Raises:
+        ``ValueError``: if the kernel isn't running on JupyterLite
+    """
+
+    def __init__(self):
+        from .utils import IPythonInterpreter
+        if not IPythonInterpreter.PYOLITE.value.running():
+            raise ValueError("Downloading test files from URLs is only supported on JupyterLite")
+
+    def fetch(self, url, headers):
+        from js import XMLHttpRequest
+
+        request = XMLHttpRequest.new()
+        request.open("GET", url, False)
+        for name, value in headers.items():
+            request.setRequestHeader(name, value)
+        request.send(None)
+
+        return URLResponse(request.status, request.responseText, {
+            h: request.getResponseHeader(h) for h in _VALIDATOR_HEADERS
+                if request.getResponseHeader(h)})
+
+    def fetch_all(self, requests, callback):
+        import asyncio
+        from pyodide.http import pyfetch
+
+        async def fetch_one(url, headers):
+            try:
+                response = await pyfetch(url, headers=headers)
+                text = await (response.text() if hasattr(response, "text") else response.string())
+                response_headers = getattr(response, "headers", {})
+
+            except Exception as e:
+                callback(url, None, e)
+
+            else:
+                callback(
+                    url, URLResponse(response.status, text, _get_validators(response_headers)),
+                    None)
+
+        if requests:
+            asyncio.ensure_future(asyncio.gather(*(fetch_one(u, h) for u, h in requests)))
+
+
+class RemoteTestsCache:
+    """
+    A local cache of the test files downloaded from ``{tests_url_prefix}/{question}.py``.
+
+    Downloaded test files are saved to ``{tests_dir}/{question}.py``, and the ``ETag`` and
+    ``Last-Modified`` headers they were served with are saved to an index in the same directory so
+    that the cache persists across kernel restarts. A cached test file is used without making any
+    requests if it was last downloaded or revalidated less than ``revalidate_interval`` seconds ago;
+    otherwise, a conditional request is made to revalidate it. If the request fails (e.g. because
+    the network is down), the cached copy is used.
+
+    Args:
+        tests_url_prefix (``str``): the prefix of the URLs of the test files
+        tests_dir (``str``): the directory in which to save the test files
+        fetcher (``URLFetcher``, optional): the fetcher used to make requests; defaults to a
+            ``PyodideFetcher``, which is created when the first request is made
+        revalidate_interval (``float``, optional): the number of seconds for which a downloaded test
+            file is used without revalidating it
+    """
+
+    def __init__(self, tests_url_prefix, tests_dir, fetcher=None, revalidate_interval=300):
+        self.tests_url_prefix = tests_url_prefix
+        self.tests_dir = tests_dir
+        self.revalidate_interval = revalidate_interval
+        self._fetcher = fetcher
+        self._lock = threading.Lock()
+        self._index = None
+
+    @property
+    def fetcher(self):
+        """
+        ``URLFetcher``: the fetcher used to make requests
+        """
+        if self._fetcher is None:
+            self._fetcher = PyodideFetcher()
+        return self._fetcher
+
+    def get_url(self, question):
+        """
+        Get the URL of the test file for a question.
+
+        Args:
+            question (``str``): the question name
+
+        Returns:
+            ``str``: the URL
+        """
+        prefix = self.tests_url_prefix
+        return f"{prefix}{'/' if not prefix.endswith('/') else ''}{question}.py"
+
+    def get_path(self, question):
+        """
+        Get the path at which the test file for a question is saved.
+
+        Args:
+            question (``str``): the question name
+
+        Returns:
+            ``str``: the path
+        """
+        return os.path.join(self.tests_dir, f"{question}.py")
+
+    def _get_index(self):
+        if self._index is None:
+            try:
+                with open(os.path.join(self.tests_dir, _INDEX_FILENAME)) as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+
+        return self._index
+
+    def _write_index(self):
+        os.makedirs(self.tests_dir, exist_ok=True)
+        with open(os.path.join(self.tests_dir, _INDEX_FILENAME), "w") as f:
+            json.dump(self._index, f)
+
+    def _get_entry(self, question):
+        """
+        Get the index entry of a cached test file, if the file is still in the tests directory.
+        """
+        entry = self._get_index().get(question)
+        if entry is None or entry["url"] != self.get_url(question) or \
+                not os.path.isfile(self.get_path(question)):
+            return None
+
+        return entry
+
+    def _is_fresh(self, question):
+        entry = self._get_entry(question)
+        return entry is not None and time.time() - entry["checked"] < self.revalidate_interval
+
+    def _get_request_headers(self, question):
+        entry = self._get_entry(question)
+        if entry is None:
+            return {}
+
+        headers = {}
+        if entry.get("ETag"):
+            headers["If-None-Match"] = entry["ETag"]
+        if entry.get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["Last-Modified"]
+
+        return headers
+
+    def _store(self, question, response):
+        """
+        Update the cached test file for a question from the response to a request for it.
+
+        Returns:
+            ``bool``: whether the response was successful (i.e. the cached file is up-to-date)
+        """
+        with self._lock:
+            if response.status == 304 and self._get_entry(question) is not None:
+                self._get_index()[question]["checked"] = time.time()
+
+            elif response.status == 200:
+                os.makedirs(self.tests_dir, exist_ok=True)
+                with open(self.get_path(question), "w+") as f:
+                    f.write(response.text)
+
+                self._get_index()[question] = {
+                    "url": self.get_url(question),
+                    "checked": time.time(),
+                    **_get_validators(response.headers),
+                }
+
+            else:
+                return False
+
+            self._write_index()
+            return True
+
+    def get(self, question):
+        """
+        Get the path to the test file for a question, downloading or revalidating it if needed.
+
+        Args:
+            question (``str``): the question name
+
+        Returns:
+            ``str``: the path to the test file
+
+        Raises:
+            ``Exception``: if the test file couldn't be downloaded and there is no cached copy
+        """
+        with self._lock:
+            if self._is_fresh(question):
+                LOGGER.debug(f"Using cached test file for question: {question}")
+                return self.get_path(question)
+
+            headers = self._get_request_headers(question)
+
+        url = self.get_url(question)
+        LOGGER.debug(f"Requesting test file for question {question} from {url}")
+
+        error = None
+        try:
+            response = self.fetcher.fetch(url, headers)
+            if not self._store(question, response):
+                error = RuntimeError(f"Request for {url} failed with status {response.status}")
+
+        except Exception as e:
+            error = e
+
+        if error is not None:
+            with self._lock:
+                if self._get_entry(question) is None:
+                    raise error
+
+            LOGGER.warning(
+                f"Could not download the test file for question {question}, so the cached copy "
+                f"will be used: {error}")
+
+        return self.get_path(question)
+
+    def list_cached(self):
+        """
+        List the questions whose test files are in the cache.
+
+        Returns:
+            ``list[str]``: the question names
+        """
+        with self._lock:
+            return sorted(q for q in self._get_index() if self._get_entry(q) is not None)
+
+    def prefetch(self, questions):
+        """
+        Download or revalidate the test files for many questions at once (see
+        ``URLFetcher.fetch_all``). Test files that were revalidated recently are skipped, and
+        failed requests are ignored.
+
+        Args:
+            questions (``list[str]``): the question names
+        """
+        with self._lock:
+            requests = {
+                self.get_url(q): (q, self._get_request_headers(q)) for q in questions
+                    if not self._is_fresh(q)}
+
+        def callback(url, response, error):
+            question = requests[url][0]
+            if error is None and self._store(question, response):
+                LOGGER.debug(f"Prefetched test file for question: {question}")
+            else:
+                LOGGER.debug(f"Could not prefetch test file for question {question}: {error}")
+
+        if requests:
+            LOGGER.debug(
+                f"Prefetching test files for questions: {', '.join(q for q, _ in requests.values())}")
+            self.fetcher.fetch_all([(url, h) for url, (_, h) in requests.items()], callback)
@@ -2,9 +2,8 @@
 
 import nbformat as nbf
 import os
+import re
 import requests
-import sys
-import tempfile
 import time
 import wrapt
 
@@ -12,11 +11,18 @@ from enum import Enum
 from glob import glob
 from IPython import get_ipython
 from IPython.display import display, Javascript
-from subprocess import run, PIPE
 
 from .logs import EventType
+from .tests_cache import RemoteTestsCache
+from .validate_export.worker import ValidationWorker
 
-from ..utils import import_or_raise, NBFORMAT_VERSION, NOTEBOOK_METADATA_KEY
+from ..utils import NBFORMAT_VERSION, NOTEBOOK_METADATA_KEY
+
+
+_VALIDATION_WORKER = None
+
+# matches calls to Notebook.check with a string literal, capturing the question name
+_CHECK_CALL_REGEX = re.compile(r"""\.check\(\s*["']([^"']+)["']""")
 
 
 def save_notebook(filename, timeout=10):
@@ -54,41 +60,35 @@ def save_notebook(filename, timeout=10):
     return True
 
 
-def grade_zip_file(zip_path, nb_arcname, tests_dir):
+def get_validation_worker():
     """
-    Grade a submission zip file in a separate process and return the ``GradingResults`` object.
-    """
-    dill = import_or_raise("dill")
-
-    results_handle, results_path = tempfile.mkstemp(suffix=".pkl")
-
-    try:
-        command = [
-            sys.executable, "-m", "otter.check.validate_export",
-            "--zip-path", zip_path,
-            "--nb-arcname", nb_arcname,
-            "--tests-dir", tests_dir,
-            "--results-path", results_path,
-        ]
+    Get the worker process used to validate exported submissions in this process, creating it if
+    needed. The worker process itself is only started when the first submission is validated.
 
-        # run the command
-        results = run(command, stdout=PIPE, stderr=PIPE)
+    Returns:
+        ``otter.check.validate_export.worker.ValidationWorker``: the worker
+    """
+    global _VALIDATION_WORKER
+    if _VALIDATION_WORKER is None:
+        _VALIDATION_WORKER = ValidationWorker()
+    return _VALIDATION_WORKER
 
-        # TODO: remove
-        print(results.stdout.decode("utf-8"))
-        print(results.stderr.decode("utf-8"))
 
-        if results.stderr:
-            raise RuntimeError(results.stderr)
+def grade_zip_file(zip_path, nb_arcname, tests_dir):
+    """
+    Grade a submission zip file in a separate process and return the ``GradingResults`` object.
 
-        with open(results_path, "rb") as f:
-            results = dill.load(f)
+    The submission is graded by a worker process that is reused for each submission validated by
+    this process (see ``get_validation_worker``).
+    """
+    for kind, payload in get_validation_worker().validate(zip_path, nb_arcname, tests_dir):
+        if kind == "results":
+            return payload
 
-        return results
+        elif kind == "error":
+            raise RuntimeError(payload)
 
-    finally:
-        os.close(results_handle)
-        os.remove(results_path)
+    raise RuntimeError("The validation worker did not send any results")
 
 
 class IPythonInterpreter(Enum):
@@ -151,7 +151,8 @@ def grading_mode_disabled(wrapped, self, args, kwargs):
     A decorator that returns without calling the wrapped function if the ``Notebook`` grading mode
     is enabled.
     """
-    if type(self)._grading_mode:
+    from ..execute.context import get_grading_context
+    if get_grading_context() is not None:
         return
     return wrapped(*args, **kwargs)
 
@@ -228,40 +229,56 @@ def list_available_tests(tests_dir, nb_path):
     return sorted(tests)
 
 
-def resolve_test_info(tests_dir, nb_path, tests_url_prefix, question):
+def list_checked_questions(nb_path):
+    """
+    Get a list of the questions checked in a notebook by finding calls like ``grader.check("q1")``
+    in its code cells.
+
+    Args:
+        nb_path (``str``): the path to the notebook
+
+    Returns:
+        ``list[str]``: the sorted list of question names
+    """
+    nb = nbf.read(nb_path, as_version=NBFORMAT_VERSION)
+
+    questions = set()
+    for cell in nb.cells:
+        if cell.cell_type == "code":
+            questions.update(_CHECK_CALL_REGEX.findall(cell.source))
+
+    return sorted(questions)
+
+
+def resolve_test_info(tests_dir, nb_path, tests_url_prefix, question, tests_url_cache=None):
     """
     Determine the test path and test name.
 
     If ``tests_url_prefix`` is specified, the test file is downloaded from the URL
-    ``{tests_url_prefix}/{question}.py`` and saved to the file ``{tests_dir}/{question}.py``. If
-    ``tests_dir`` does not already exist, it is created.
+    ``{tests_url_prefix}/{question}.py`` and saved to the file ``{tests_dir}/{question}.py``,
+    unless a copy that was downloaded recently is cached there (see
+    ``otter.check.tests_cache.RemoteTestsCache``). If ``tests_dir`` does not already exist, it is
+    created.
 
     Args:
         tests_dir (``str``): the path to the directory of tests
         nb_path (``str``): the path to the notebook
         tests_url_prefix (``str | None``): the prefix of a URL to the test file
         question (``str``): the question name
+        tests_url_cache (``otter.check.tests_cache.RemoteTestsCache``, optional): the cache of test
+            files downloaded from ``tests_url_prefix`` to use; if unspecified, a new cache in
+            ``tests_dir`` is used
 
     Returns:
         ``tuple[str, str]``: the test path and test name
     """
     if tests_url_prefix is not None:
-        if not IPythonInterpreter.PYOLITE.value.running():
-            raise ValueError("Downloading test files from URLs is only supported on JupyterLite")
-
-        pyodide = import_or_raise("pyodide")
+        if tests_url_cache is None:
+            tests_url_cache = RemoteTestsCache(tests_url_prefix, tests_dir)
 
-        test_url = f"{tests_url_prefix}{'/' if not tests_url_prefix.endswith('/') else ''}{question}.py"
-        text = pyodide.open_url(test_url).getvalue()
-
-        os.makedirs(tests_dir, exist_ok=True)
-
-        test_path = os.path.join(tests_dir, f"{question}.py")
+        test_path = tests_url_cache.get(question)
         test_name = None
 
-        with open(test_path, "w+") as f:
-            f.write(text)
-
     elif tests_dir and os.path.isdir(tests_dir):
         if not os.path.isfile(os.path.join(tests_dir, question + ".py")):
             raise FileNotFoundError(f"Test {question} does not exist")
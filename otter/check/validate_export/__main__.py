@@ -7,20 +7,34 @@ import zipfile
 
 from glob import glob
 
+from .worker import run_worker
+
 from ...execute import grade_notebook
 
 
 def get_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--zip-path", required=True)
-    parser.add_argument("--nb-arcname", required=True)
-    parser.add_argument("--tests-dir", required=True)
-    parser.add_argument("--results-path", required=True)
+    parser.add_argument("--zip-path")
+    parser.add_argument("--nb-arcname")
+    parser.add_argument("--tests-dir")
+    parser.add_argument("--results-path")
+    parser.add_argument("--worker", action="store_true", help="serve validation requests from stdin")
     return parser
 
 
 def main():
-    args = get_parser().parse_args()
+    parser = get_parser()
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker()
+        return
+
+    missing = [a for a in ["zip_path", "nb_arcname", "tests_dir", "results_path"] \
+        if getattr(args, a) is None]
+    if missing:
+        parser.error("the following arguments are required: " + ", ".join(
+            "--" + a.replace("_", "-") for a in missing))
 
     nb_dir = tempfile.mkdtemp()
 
@@ -0,0 +1,272 @@
+"""A long-lived process for validating exported zip submissions"""
+
+import atexit
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+import zipfile
+
+from glob import glob
+
+from ...utils import import_or_raise
+
+
+# the format of the length prefixed to each message
+_LENGTH_FORMAT = ">Q"
+_LENGTH_SIZE = struct.calcsize(_LENGTH_FORMAT)
+
+
+def write_message(f, message):
+    """
+    Pickle a message with dill and write it to a binary stream, prefixed with its length.
+
+    Args:
+        f (file-like object): the stream
+        message (``object``): the message
+    """
+    dill = import_or_raise("dill")
+
+    data = dill.dumps(message)
+    f.write(struct.pack(_LENGTH_FORMAT, len(data)) + data)
+    f.flush()
+
+
+def read_message(f):
+    """
+    Read a message written by ``write_message`` from a binary stream.
+
+    Args:
+        f (file-like object): the stream
+
+    Returns:
+        ``object``: the message
+
+    Raises:
+        ``EOFError``: if the stream ends before a complete message is read
+    """
+    dill = import_or_raise("dill")
+
+    def read_exactly(n):
+        data = b""
+        while len(data) < n:
+            chunk = f.read(n - len(data))
+            if not chunk:
+                raise EOFError("The stream ended before the message was read")
+            data += chunk
+        return data
+
+    length, = struct.unpack(_LENGTH_FORMAT, read_exactly(_LENGTH_SIZE))
+    return dill.loads(read_exactly(length))
+
+
+def _validate(request, send):
+    """
+    Grade the notebook in a submission zip file, sending the results or the error raised.
+
+    Args:
+        request (``dict``): the request, with the keys ``zip_path``, ``nb_arcname``,
+            ``tests_dir``, and ``cwd``
+        send (callable): a function that sends a message to the client
+    """
+    from ...execute import grade_notebook
+
+    nb_dir = tempfile.mkdtemp()
+
+    try:
+        os.chdir(request["cwd"])
+
+        with zipfile.ZipFile(request["zip_path"], "r") as zf:
+            nb_path = zf.extract(request["nb_arcname"], path=nb_dir)
+
+        send(("started", None))
+
+        results = grade_notebook(
+            nb_path,
+            tests_glob=glob(os.path.join(request["tests_dir"], "*.py")),
+            cwd=request["cwd"],
+        )
+
+        send(("results", results))
+
+    except Exception:
+        send(("error", traceback.format_exc()))
+
+    finally:
+        shutil.rmtree(nb_dir)
+
+
+def _validate_in_child(request, send):
+    """
+    Run ``_validate`` in a forked child process so that the submission can't change the state of
+    the worker, relaying the child's messages to the client.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            os.close(read_fd)
+            with os.fdopen(write_fd, "wb") as f:
+                _validate(request, lambda m: write_message(f, m))
+
+        except BaseException:
+            status = 1
+
+        finally:
+            os._exit(status)
+
+    os.close(write_fd)
+    finished = False
+    with os.fdopen(read_fd, "rb") as f:
+        while True:
+            try:
+                kind, payload = read_message(f)
+            except EOFError:
+                break
+
+            finished = finished or kind in ("results", "error")
+            send((kind, payload))
+
+    os.waitpid(pid, 0)
+    if not finished:
+        send(("error", "The process validating the submission exited unexpectedly"))
+
+
+def run_worker():
+    """
+    Serve validation requests read from stdin, writing messages for each to stdout, until stdin is
+    closed.
+
+    Anything else written to stdout by this process (e.g. by the submission) is sent to stderr
+    instead so that it can't corrupt the messages.
+
+    Where ``os.fork`` is available, each submission is graded in a child process forked from the
+    worker. Otherwise, submissions are graded in the worker itself, so they share its
+    ``sys.modules``: modules imported (or modified) by one submission are seen by the submissions
+    validated after it. Only the working directory is restored between submissions.
+    """
+    from ...execute.parallel import can_fork
+
+    out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    send = lambda m: write_message(out, m)
+    while True:
+        try:
+            request = read_message(sys.stdin.buffer)
+        except EOFError:
+            break
+
+        if can_fork():
+            _validate_in_child(request, send)
+        else:
+            # submissions share this process's imported modules on this path
+            original_cwd = os.getcwd()
+            try:
+                _validate(request, send)
+            finally:
+                os.chdir(original_cwd)
+
+
+class ValidationWorker:
+    """
+    A client for a worker process that validates exported zip submissions.
+
+    The worker (``python -m otter.check.validate_export --worker``) is started when the first
+    submission is validated and is kept alive until ``close`` is called or the interpreter exits,
+    so later validations don't need to start a new interpreter and import Otter. Each submission is
+    graded in a process forked from the worker where ``os.fork`` is available, so that submissions
+    can't affect each other; elsewhere, they are graded in the worker and share its imported
+    modules.
+    """
+
+    def __init__(self):
+        self._process = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _start(self):
+        if self._process is not None and self._process.poll() is None:
+            return
+
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "otter.check.validate_export", "--worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    def validate(self, zip_path, nb_arcname, tests_dir):
+        """
+        Grade the notebook in a submission zip file against the tests in a directory, yielding the
+        messages sent by the worker as they are received.
+
+        The messages are ``(kind, payload)`` tuples: a ``("started", None)`` message once the
+        notebook has been extracted, followed by either a ``("results", results)`` message with
+        the ``otter.test_files.GradingResults`` or an ``("error", message)`` message with the
+        traceback of the error raised.
+
+        Args:
+            zip_path (``str``): the path to the zip file
+            nb_arcname (``str``): the name of the notebook in the zip file
+            tests_dir (``str``): the path to the directory of tests
+
+        Yields:
+            ``tuple[str, object]``: the messages
+        """
+        with self._lock:
+            self._start()
+
+            request = {
+                "zip_path": os.path.abspath(zip_path),
+                "nb_arcname": nb_arcname,
+                "tests_dir": os.path.abspath(tests_dir),
+                "cwd": os.getcwd(),
+            }
+
+            finished = False
+            try:
+                write_message(self._process.stdin, request)
+                while not finished:
+                    kind, payload = read_message(self._process.stdout)
+                    finished = kind in ("results", "error")
+                    yield kind, payload
+
+            except (EOFError, OSError) as e:
+                self._kill()
+                raise RuntimeError(f"The validation worker exited unexpectedly: {e}")
+
+            except BaseException:
+                # if the caller stopped before the last message, the rest of this request's
+                # messages can't be skipped reliably, so a new worker is started for the next one
+                if not finished:
+                    self._kill()
+                raise
+
+    def _kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+
+    def close(self):
+        """
+        Stop the worker process, if it is running.
+        """
+        if self._process is None:
+            return
+
+        try:
+            self._process.stdin.close()
+            self._process.wait(timeout=5)
+
+        except Exception:
+            self._process.kill()
+            self._process.wait()
+
+        self._process = None
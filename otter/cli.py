@@ -68,15 +68,20 @@ def assign_cli(*args, **kwargs):
 defaults = check.__kwdefaults__
 @cli.command("check")
 @_verbosity
-@click.argument("file", type=click.Path(exists=True, dir_okay=False))
+@click.argument("files", nargs=-1, required=True, type=click.Path(exists=True))
 @click.option("-q", "--question", help="A specific quetsion to grade")
 @click.option("-t", "--tests-path", default=defaults["tests_path"], type=click.Path(exists=True, file_okay=False), help="Path to the direcotry of test files")
 @click.option("--seed", type=click.INT, help="A random seed to be executed before each cell")
-def check_cli(*args, **kwargs):
+@click.option("-j", "--jobs", default=defaults["jobs"], type=click.IntRange(min=1), help="Number of files to check in parallel")
+def check_cli(files, **kwargs):
     """
-    Check the Python script or Jupyter Notebook FILE against tests.
+    Check the Python scripts or Jupyter Notebooks FILES against tests.
+
+    Each of FILES can also be a directory, in which case the scripts and notebooks in it are
+    checked. If more than one file is checked, a table of their scores is printed and the checks of
+    each file are logged in a separate log file next to it.
     """
-    return check(*args, **kwargs)
+    return check(*files, **kwargs)
 
 
 defaults = export.__kwdefaults__
@@ -166,6 +171,9 @@ defaults = run.__kwdefaults__
 @click.option("-o", "--output-dir", default=defaults["output_dir"], type=click.Path(exists=True, file_okay=False), help="Directory to which to write output")
 @click.option("--no-logo", is_flag=True, help="Suppress Otter logo in stdout")
 @click.option("--debug", is_flag=True, help="Do not ignore errors when running submission")
+@click.option("--checkpoint-dir", type=click.Path(file_okay=False), help="Directory in which to store a snapshot of the executed submission's environment")
+@click.option("--tests-only", is_flag=True, help="Restore the environment from the submission's checkpoint and only rerun new or changed tests")
+@click.option("--timings-csv", type=click.Path(dir_okay=False), help="Path at which to write a CSV file of the time and memory used by each cell and test case")
 def run_cli(*args, **kwargs):
     """
     Run non-containerized Otter on a single submission.
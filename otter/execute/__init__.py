@@ -1,19 +1,35 @@
 """Execution and grading internals for Otter-Grader"""
 
 import nbformat
+import os
+
+from contextlib import ExitStack, nullcontext
 
 from .checker import Checker
+from .checkpoints import Checkpoint, hash_file
+from .context import GradingContext
+from .dependencies import filter_unused_cells
 from .execute_log import execute_log
 from .execute_notebook import execute_notebook
-from .transforms import filter_ignored_cells, script_to_notebook
+from .headless import headless_mode
+from .parallel import run_test_files
+from .prerequisites import run_test_files_in_order
+from .profiling import get_test_case_timings, trace_memory
+from .stubs import install_stubs
+from .transforms import filter_ignored_cells, load_notebook_code, number_cells, script_to_notebook
 
 from ..test_files import create_test_file, GradingResults
-from ..utils import id_generator, NBFORMAT_VERSION
+from ..utils import id_generator, loggers, NBFORMAT_VERSION
+
+
+LOGGER = loggers.get_logger(__name__)
 
 
 def grade_notebook(submission_path, *, tests_glob=None, name=None, ignore_errors=True, script=False, 
     cwd=None, test_dir=None, seed=None, seed_variable=None, log=None, variables=None, 
-    plugin_collection=None):
+    plugin_collection=None, skip_unused_cells=False, checkpoint_dir=None, tests_only=False,
+    test_workers=1, profile=False, headless=False, savefig_allowlist=None,
+    stubs=None, output_capture=None, skip_failed_prerequisites=False):
     """
     Grade an assignment file and return grade information
 
@@ -33,12 +49,43 @@ def grade_notebook(submission_path, *, tests_glob=None, name=None, ignore_errors
             object to prevent arbitrary code from being put into the environment; ignored if log is ``None``
         plugin_collection (``otter.plugins.PluginCollection``, optional): a set of plugins to run on
             this assignment during execution and grading
+        skip_unused_cells (``bool``, optional): whether to skip executing code cells that none of
+            the tests depend on; ignored for scripts and when grading from a log
+        checkpoint_dir (``str``, optional): a directory in which to store a snapshot of the
+            environment resulting from executing the submission, keyed by the hash of the
+            submission; ignored when grading from a log
+        tests_only (``bool``, optional): whether to restore the environment from the submission's
+            checkpoint in ``checkpoint_dir`` and only run the test files that were added or changed
+            since it was created instead of executing the submission; if there is no usable
+            checkpoint, the submission is executed and a new checkpoint is created
+        test_workers (``int``, optional): the maximum number of test files in ``tests_glob`` to run
+            at once; if greater than 1, each test file is run in a forked process so that tests
+            can't modify the environment seen by other tests
+        profile (``bool``, optional): whether to record the wall time, CPU time, and peak memory
+            usage of each code cell and the run time of each test case in the results' timings
+        headless (``bool``, optional): whether to stub out rendering plots, displays, and widgets
+            while executing the submission and running tests
+        savefig_allowlist (``list`` of ``str``, optional): glob patterns of paths to which figures
+            can still be saved in headless mode
+        stubs (``dict[str, str]``, optional): a map of dotted paths of functions (e.g.
+            ``time.sleep``) to actions to take in place of calling them while executing the
+            submission and running tests; see ``otter.execute.stubs.STUB_ACTIONS``
+        output_capture (``otter.execute.capture.OutputCapture``, optional): an object in which to
+            capture the output and errors of each code cell; the captured output is stored in the
+            results' ``cell_outputs``
+        skip_failed_prerequisites (``bool``, optional): whether to skip running tests that declare
+            a prerequisite (with ``depends_on``) that has failed, scoring them as zero; the test
+            files in ``tests_glob`` are run after their prerequisites
 
     Returns:
         ``otter.test_files.GradingResults``: the results of grading
     """
     if not script:
-        nb = nbformat.read(submission_path, as_version=NBFORMAT_VERSION)
+        # plugins may need the entire notebook, including outputs and markdown cells
+        if plugin_collection is not None:
+            nb = nbformat.read(submission_path, as_version=NBFORMAT_VERSION)
+        else:
+            nb = load_notebook_code(submission_path)
 
     else:
         with open(submission_path) as f:
@@ -46,9 +93,29 @@ def grade_notebook(submission_path, *, tests_glob=None, name=None, ignore_errors
 
         nb = script_to_notebook(nb)
 
+    checkpoint, submission_hash = None, None
+    if checkpoint_dir is not None and log is None:
+        submission_hash = hash_file(submission_path)
+        if tests_only:
+            checkpoint = _load_checkpoint(
+                checkpoint_dir, submission_hash, seed, tests_glob, skip_unused_cells)
+
     if plugin_collection is not None:
         nb = plugin_collection.before_execution(nb)
 
+    # label the cells' timings and captured outputs with their indices in this notebook, which
+    # are also the indices used for skipped_cells
+    number_cells(nb)
+
+    # remove any cells that no test depends on from the notebook
+    skipped_cells = []
+    if checkpoint is not None:
+        skipped_cells = checkpoint.skipped_cells
+
+    elif skip_unused_cells and not script and log is None:
+        nb, skipped_cells = filter_unused_cells(
+            nb, tests_glob or [], test_dir if test_dir is not None else "./tests")
+
     # remove any ignored cells from the notebook
     if not script:
         nb = filter_ignored_cells(nb)
@@ -62,42 +129,140 @@ def grade_notebook(submission_path, *, tests_glob=None, name=None, ignore_errors
     if name:
         initial_env["__name__"] = name
 
-    if log is not None:
-        global_env = execute_log(
-            nb, log, results_array, initial_env, ignore_errors=ignore_errors, cwd=cwd, test_dir=test_dir, 
-            variables=variables)
+    timings = [] if profile else None
 
-    else:
-        global_env = execute_notebook(
-            nb, results_array, initial_env, ignore_errors=ignore_errors, cwd=cwd, test_dir=test_dir, 
-            seed=seed, seed_variable=seed_variable)
+    # stub out rendering and any configured calls for the execution of the submission and the tests
+    with ExitStack() as stack:
+        if headless:
+            initial_env.update(stack.enter_context(headless_mode(savefig_allowlist or [])))
 
-    if plugin_collection is not None:
-        plugin_collection.run("after_execution", global_env)
+        stub_calls = stack.enter_context(install_stubs(stubs or {}))
 
-    tests_run = global_env[results_array]
+        if checkpoint is not None:
+            global_env = checkpoint.restore(initial_env)
+            global_env[results_array] = checkpoint.get_unchanged_test_files(
+                tests_glob if tests_glob is not None else [tf.path for tf in checkpoint.test_files])
 
-    # Check for tests which were not included in the notebook and specified by tests_globs
-    # Allows instructors to run notebooks with additional tests not accessible to user
-    if tests_glob:
-        # unpack list of paths into a single list
-        tested_set = [test.path for test in tests_run]
-        extra_tests = []
-        for t in sorted(tests_glob):
-            include = True
-            for tested in tested_set:
-                if tested in t or t in tested:     # e.g. if 'tests/q1.py' is in /srv/repo/lab01/tests/q1.py
-                    include = False
+        elif log is not None:
+            global_env = execute_log(
+                nb, log, results_array, initial_env, ignore_errors=ignore_errors, cwd=cwd, 
+                test_dir=test_dir, variables=variables, tests_glob=tests_glob,
+                context=GradingContext(
+                    tests_dir=test_dir, log_events=False,
+                    skip_failed_prerequisites=skip_failed_prerequisites))
 
-            if include:
-                extra_tests.append(create_test_file(t))
-                extra_tests[-1].run(global_env)
+        else:
+            with trace_memory() if profile else nullcontext():
+                global_env = execute_notebook(
+                    nb, results_array, initial_env, ignore_errors=ignore_errors, cwd=cwd, 
+                    test_dir=test_dir, seed=seed, seed_variable=seed_variable, timings=timings,
+                    output_capture=output_capture, context=GradingContext(
+                        tests_dir=test_dir, skip_failed_prerequisites=skip_failed_prerequisites))
 
-        tests_run += extra_tests
+        if plugin_collection is not None:
+            plugin_collection.run("after_execution", global_env)
+
+        tests_run = global_env[results_array]
+
+        # Check for tests which were not included in the notebook and specified by tests_globs
+        # Allows instructors to run notebooks with additional tests not accessible to user
+        if tests_glob:
+            # unpack list of paths into a single list
+            tested_set = [test.path for test in tests_run]
+            extra_tests = []
+            for t in sorted(tests_glob):
+                include = True
+                for tested in tested_set:
+                    if tested in t or t in tested:     # e.g. if 'tests/q1.py' is in /srv/repo/lab01/tests/q1.py
+                        include = False
+
+                if include:
+                    extra_tests.append(create_test_file(t))
+
+            if skip_failed_prerequisites:
+                run_test_files_in_order(extra_tests, global_env, tests_run, workers=test_workers)
+            else:
+                run_test_files(extra_tests, global_env, workers=test_workers)
+            tests_run += extra_tests
 
     results = GradingResults(tests_run)
+    results.skipped_cells = skipped_cells
+    results.skipped_tests = [n for n, tf in results.results.items() if tf.skipped]
+    results.from_checkpoint = checkpoint is not None
+    results.stub_calls = dict(stub_calls)
+
+    if output_capture is not None:
+        results.cell_outputs = dict(output_capture.outputs)
+
+    if profile:
+        results.timings = timings + get_test_case_timings(tests_run)
+
+    if checkpoint is None and submission_hash is not None:
+        env = {k: v for k, v in global_env.items() if k != results_array}
+        checkpoint = Checkpoint(
+            submission_hash, env, tests_run, seed=seed, skipped_cells=skipped_cells)
+        checkpoint.dump(checkpoint_dir)
+
+        if not checkpoint.complete:
+            LOGGER.warning(
+                "The following variables could not be stored in the checkpoint and the submission "
+                f"will be re-executed when regrading: {', '.join(checkpoint.unshelved)}")
+
+    elif checkpoint is not None:
+        # store the results of the rerun tests so that they aren't rerun again
+        checkpoint.set_test_files(tests_run)
+        checkpoint.dump(checkpoint_dir)
+
+    if checkpoint is not None:
+        results.unshelved_variables = checkpoint.unshelved
 
     if plugin_collection is not None:
         plugin_collection.run("after_grading", results)
 
     return results
+
+
+def _load_checkpoint(checkpoint_dir, submission_hash, seed, tests_glob, skip_unused_cells):
+    """
+    Load the checkpoint for a submission if it can be used to grade the submission without
+    executing it.
+
+    A checkpoint can't be used if it doesn't exist, if it was created with a different seed, if
+    some variables in the environment could not be pickled, or if cells were skipped when it was
+    created and some tests need to be rerun (since the new tests may depend on the skipped cells).
+
+    Args:
+        checkpoint_dir (``str``): the directory of checkpoints
+        submission_hash (``str``): the SHA256 hash of the submission file
+        seed (``int``): the random seed for intercell seeding
+        tests_glob (``list`` of ``str``): paths to test files to run
+        skip_unused_cells (``bool``): whether cells that no test depends on are being skipped
+
+    Returns:
+        ``otter.execute.checkpoints.Checkpoint | None``: the checkpoint, or ``None`` if the
+        submission should be executed
+    """
+    checkpoint = Checkpoint.load(checkpoint_dir, submission_hash)
+
+    if checkpoint is None:
+        LOGGER.info("No checkpoint found for submission; executing it")
+        return None
+
+    if checkpoint.seed != seed:
+        LOGGER.info("Checkpoint was created with a different seed; executing submission")
+        return None
+
+    if not checkpoint.complete:
+        LOGGER.warning(
+            "Checkpoint is missing variables that could not be pickled; executing submission: " + \
+            ", ".join(checkpoint.unshelved))
+        return None
+
+    unchanged = {
+        os.path.basename(tf.path) for tf in checkpoint.get_unchanged_test_files(tests_glob or [])}
+    if checkpoint.skipped_cells and (not skip_unused_cells or \
+            any(os.path.basename(p) not in unchanged for p in tests_glob or [])):
+        LOGGER.info("Checkpoint was created with skipped cells and tests changed; executing submission")
+        return None
+
+    return checkpoint
@@ -0,0 +1,152 @@
+"""Bounded capture of the output of executed cells"""
+
+import io
+import traceback
+
+from collections import deque
+from contextlib import contextmanager
+from textwrap import indent
+
+from .context import redirect_output
+
+
+class BoundedBuffer(io.TextIOBase):
+    """
+    A writable text stream that keeps only the last ``limit`` characters written to it.
+
+    Args:
+        limit (``int``): the maximum number of characters to keep
+
+    Attributes:
+        limit (``int``): the maximum number of characters to keep
+        dropped (``int``): the number of characters that were written and then discarded
+    """
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.dropped = 0
+        self._chunks = deque()
+        self._size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        n = len(s)
+        if n >= self.limit:
+            self.dropped += self._size + n - self.limit
+            self._chunks = deque([s[n - self.limit:]])
+            self._size = self.limit
+            return n
+
+        self._chunks.append(s)
+        self._size += n
+
+        # discard the oldest characters until the buffer is within its limit
+        while self._size > self.limit:
+            excess = self._size - self.limit
+            chunk = self._chunks[0]
+            if len(chunk) <= excess:
+                self._chunks.popleft()
+                self._size -= len(chunk)
+                self.dropped += len(chunk)
+
+            else:
+                self._chunks[0] = chunk[excess:]
+                self._size -= excess
+                self.dropped += excess
+
+        return n
+
+    def getvalue(self):
+        """
+        Get the contents of the buffer, prefixed with a note if any characters were discarded.
+
+        Returns:
+            ``str``: the contents
+        """
+        value = "".join(self._chunks)
+        if self.dropped:
+            value = f"[{self.dropped} characters truncated]\n" + value
+        return value
+
+
+class OutputCapture:
+    """
+    Captures the stdout, stderr, and errors of executed cells, keeping at most ``cell_limit``
+    characters per cell and ``total_limit`` characters in total. When a cell's output exceeds its
+    limit, the oldest output is discarded; when the total limit is exceeded, the output of the
+    earliest cells is discarded.
+
+    Args:
+        cell_limit (``int``, optional): the maximum number of characters to keep per cell
+        total_limit (``int``, optional): the maximum number of characters to keep across all cells
+
+    Attributes:
+        outputs (``dict[str, str]``): a map of cell names to their captured output, in the order
+            they were executed
+        dropped_cells (``int``): the number of cells whose output was discarded to stay within
+            ``total_limit``
+    """
+
+    def __init__(self, cell_limit=64 * 1024, total_limit=1024 * 1024):
+        self.cell_limit = cell_limit
+        self.total_limit = total_limit
+        self.outputs = {}
+        self.dropped_cells = 0
+        self._size = 0
+
+    @contextmanager
+    def capture_cell(self, name):
+        """
+        A context manager that captures the stdout and stderr of the code run in its body as the
+        output of the cell ``name``. If the body raises an error, its traceback is captured as well
+        before it is re-raised.
+
+        Args:
+            name (``str``): the name of the cell
+        """
+        buffer = BoundedBuffer(self.cell_limit)
+        try:
+            with redirect_output(buffer):
+                yield
+
+        except:
+            buffer.write(traceback.format_exc())
+            raise
+
+        finally:
+            self._add(name, buffer.getvalue())
+
+    def _add(self, name, output):
+        if not output:
+            return
+
+        if len(output) > self.total_limit:
+            output = output[len(output) - self.total_limit:]
+
+        self._size += len(output) - len(self.outputs.pop(name, ""))
+        self.outputs[name] = output
+
+        while self._size > self.total_limit:
+            oldest = next(iter(self.outputs))
+            self._size -= len(self.outputs.pop(oldest))
+            self.dropped_cells += 1
+
+    def summary(self):
+        """
+        Format the captured output for display.
+
+        Returns:
+            ``str``: the formatted output
+        """
+        lines = []
+        if self.dropped_cells:
+            lines.append(f"[output of {self.dropped_cells} earlier cells truncated]")
+
+        for name, output in self.outputs.items():
+            lines.append(f"Cell {name} output:")
+            lines.append(indent(output.rstrip("\n"), "    "))
+
+        return "\n".join(lines)
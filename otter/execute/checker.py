@@ -2,55 +2,75 @@
 
 import inspect
 
+from .context import get_grading_context, GradingContext
+from .prerequisites import skip_if_prerequisites_failed
+
 from ..test_files import create_test_file
 
 
+# the context used by the Checker methods when no grading context is active, which doesn't track
+# results until tracking is enabled
+_fallback_context = GradingContext()
+_fallback_context.track_results = False
+
+
+def _get_context():
+    """
+    Get the active grading context, or the fallback context if none is active.
+    """
+    context = get_grading_context()
+    return context if context is not None else _fallback_context
+
+
 class Checker:
     """
     A class for running and optionally tracking checks against test files.
 
+    Results are tracked in the active ``otter.execute.context.GradingContext``, so checks run in
+    different threads or tasks are tracked separately. When no context is active, results are
+    tracked in a fallback context shared by the whole process, in which tracking is disabled until
+    ``enable_tracking`` is called.
+
     This class is not meant to be instantiated and is composed solely of class methods.
     """
 
-    _track_results = False
-    _test_files = []
-
     def __new__(cls, *args, **kwargs):
         raise NotImplementedError("The Checker class cannot be instantiated")
 
     @classmethod
     def enable_tracking(cls):
         """
-        Enable the tracking of test results from calls to ``check``.
+        Enable the tracking of test results from calls to ``check`` in the active grading context.
         """
-        cls._track_results = True
+        _get_context().track_results = True
 
     @classmethod
     def disable_tracking(cls):
         """
-        Disable the tracking of test results from calls to ``check``.
+        Disable the tracking of test results from calls to ``check`` in the active grading context.
         """
-        cls._track_results = False
+        _get_context().track_results = False
 
     @classmethod
     def get_results(cls):
         """
-        Get a pointer to the list into which check results are being collected.
+        Get a pointer to the list into which check results are being collected in the active
+        grading context.
         """
-        return cls._test_files
+        return _get_context().results
 
     @classmethod
     def clear_results(cls):
         """
-        Overwrite the pointer to the check result collection list.
+        Overwrite the pointer to the check result collection list of the active grading context.
 
-        Does not affect the original list, only overwrites the field in the ``Checker`` class that
-        points to it.
+        Does not affect the original list, only overwrites the field in the context that points to
+        it.
         """
-        cls._test_files = []
+        _get_context().results = []
 
     @classmethod
-    def check(cls, nb_or_test_path, test_name=None, global_env=None):
+    def check(cls, nb_or_test_path, test_name=None, global_env=None, context=None):
         """
         Checks a global environment against given test file. If ``global_env`` is ``None``, the global 
         environment of the calling frame is used; i.e., the following two calls are equivalent:
@@ -65,6 +85,8 @@ class Checker:
             test_name (``str``, optional): the name of the test if a notebook metadata test
             global_env (``dict``, optional): a global environment resulting from the execution 
                 of a python script or notebook
+            context (``otter.execute.context.GradingContext``, optional): the grading context in
+                which to track the result; defaults to the active context
 
         Returns:
             ``otter.test_files.abstract_test.TestFile``: result of running the tests in the 
@@ -75,9 +97,15 @@ class Checker:
         if global_env is None:
             global_env = inspect.currentframe().f_back.f_globals
 
-        test.run(global_env)
+        if context is None:
+            context = _get_context()
+
+        # skip the test if the context enforces prerequisites and one of them has already failed
+        if not context.skip_failed_prerequisites or \
+                not skip_if_prerequisites_failed(test, context.results):
+            test.run(global_env)
 
-        if cls._track_results:
-            cls._test_files.append(test)
+        if context.track_results:
+            context.results.append(test)
 
         return test
@@ -0,0 +1,206 @@
+"""Checkpoints of the environments resulting from executing submissions"""
+
+import hashlib
+import importlib
+import os
+import types
+
+from ..utils import import_or_raise, loggers
+
+
+LOGGER = loggers.get_logger(__name__)
+
+
+def hash_file(path):
+    """
+    Compute the SHA256 hash of the contents of a file.
+
+    Args:
+        path (``str``): the path to the file
+
+    Returns:
+        ``str``: the hex digest of the hash
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class Checkpoint:
+    """
+    A snapshot of the global environment resulting from executing a submission, along with the
+    results of the tests that were run against it.
+
+    The environment is serialized with ``otter.check.logs.LogEntry.shelve_environment``. Modules
+    are not serialized; instead, their names are stored so that they can be re-imported when the
+    checkpoint is restored.
+
+    Args:
+        submission_hash (``str``): the SHA256 hash of the submission file
+        env (``dict``): the environment to snapshot
+        test_files (``list`` of ``otter.test_files.abstract_test.TestFile``): the tests that were
+            run against the submission
+        seed (``int``, optional): the random seed used when executing the submission
+        skipped_cells (``list`` of ``int``, optional): the indices of the cells that were not
+            executed
+
+    Attributes:
+        submission_hash (``str``): the SHA256 hash of the submission file
+        shelf (``bytes``): the pickled environment
+        modules (``dict``): a map of variable names to the names of the modules bound to them
+        unshelved (``list`` of ``str``): the names of variables that could not be pickled
+        test_files (``list`` of ``otter.test_files.abstract_test.TestFile``): the tests that were
+            run against the submission
+        test_hashes (``dict``): a map of test file basenames to the hashes of their contents when
+            the checkpoint was created
+        seed (``int``): the random seed used when executing the submission
+        skipped_cells (``list`` of ``int``): the indices of the cells that were not executed
+    """
+
+    def __init__(self, submission_hash, env, test_files, seed=None, skipped_cells=None):
+        from ..check.logs import LogEntry
+        from ..check.notebook import Notebook
+
+        self.submission_hash = submission_hash
+        self.modules = {}
+        self.seed = seed
+        self.skipped_cells = list(skipped_cells) if skipped_cells is not None else []
+
+        to_shelve = {}
+        for k, v in env.items():
+            if k == "__builtins__":
+                continue
+
+            elif isinstance(v, types.ModuleType):
+                self.modules[k] = v.__name__
+
+            elif not isinstance(v, Notebook):
+                to_shelve[k] = v
+
+        self.shelf, self.unshelved = LogEntry.shelve_environment(to_shelve)
+
+        self.set_test_files(test_files)
+
+    @property
+    def complete(self):
+        """
+        ``bool``: whether every variable in the environment was stored in this checkpoint
+        """
+        return len(self.unshelved) == 0
+
+    def set_test_files(self, test_files):
+        """
+        Set the tests run against the checkpointed environment, recording the hashes of their
+        current contents.
+
+        Args:
+            test_files (``list`` of ``otter.test_files.abstract_test.TestFile``): the tests
+        """
+        self.test_files = test_files
+        self.test_hashes = {}
+        for tf in test_files:
+            if os.path.isfile(tf.path):
+                self.test_hashes[os.path.basename(tf.path)] = hash_file(tf.path)
+
+    def restore(self, initial_env=None):
+        """
+        Load the environment stored in this checkpoint.
+
+        Modules are re-imported and the ``__globals__`` of any functions in the environment are
+        updated to include the restored environment.
+
+        Args:
+            initial_env (``dict``, optional): an environment to update with the restored variables
+
+        Returns:
+            ``dict``: the restored environment
+        """
+        dill = import_or_raise("dill")
+
+        env = dict(initial_env) if initial_env is not None else {}
+        env.update(dill.loads(self.shelf))
+        for k, module_name in self.modules.items():
+            env[k] = importlib.import_module(module_name)
+
+        for v in env.values():
+            if type(v) == types.FunctionType:
+                v.__globals__.update(env)
+
+        return env
+
+    def get_unchanged_test_files(self, tests_glob):
+        """
+        Get the test files run against the checkpointed environment whose contents have not changed
+        since the checkpoint was created.
+
+        Args:
+            tests_glob (``list`` of ``str``): the paths to the current test files
+
+        Returns:
+            ``list`` of ``otter.test_files.abstract_test.TestFile``: the unchanged test files
+        """
+        current_hashes = {os.path.basename(p): hash_file(p) for p in tests_glob}
+        return [
+            tf for tf in self.test_files if
+                current_hashes.get(os.path.basename(tf.path)) is not None and
+                current_hashes[os.path.basename(tf.path)] == \
+                    self.test_hashes.get(os.path.basename(tf.path))
+        ]
+
+    @staticmethod
+    def get_path(checkpoint_dir, submission_hash):
+        """
+        Get the path at which the checkpoint for a submission is stored.
+
+        Args:
+            checkpoint_dir (``str``): the directory of checkpoints
+            submission_hash (``str``): the SHA256 hash of the submission file
+
+        Returns:
+            ``str``: the path to the checkpoint
+        """
+        return os.path.join(checkpoint_dir, f"{submission_hash}.pkl")
+
+    def dump(self, checkpoint_dir):
+        """
+        Write this checkpoint to a directory of checkpoints, creating the directory if needed.
+
+        Args:
+            checkpoint_dir (``str``): the directory of checkpoints
+        """
+        dill = import_or_raise("dill")
+
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        with open(self.get_path(checkpoint_dir, self.submission_hash), "wb+") as f:
+            dill.dump(self, f)
+
+    @classmethod
+    def load(cls, checkpoint_dir, submission_hash):
+        """
+        Load the checkpoint for a submission from a directory of checkpoints.
+
+        Args:
+            checkpoint_dir (``str``): the directory of checkpoints
+            submission_hash (``str``): the SHA256 hash of the submission file
+
+        Returns:
+            ``Checkpoint | None``: the checkpoint, or ``None`` if there is no checkpoint for the
+            submission or it could not be loaded
+        """
+        dill = import_or_raise("dill")
+
+        path = cls.get_path(checkpoint_dir, submission_hash)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                checkpoint = dill.load(f)
+
+        except Exception as e:
+            LOGGER.warning(f"Could not load checkpoint {path}: {e}")
+            return None
+
+        if not isinstance(checkpoint, cls) or checkpoint.submission_hash != submission_hash:
+            return None
+
+        return checkpoint
@@ -0,0 +1,138 @@
+"""Per-submission grading state, isolated between threads and asynchronous tasks"""
+
+import contextvars
+import sys
+import threading
+
+from contextlib import contextmanager
+
+
+class GradingContext:
+    """
+    The state of the grading of a single submission.
+
+    The active context is stored in a ``contextvars.ContextVar``, so submissions can be graded
+    concurrently in different threads (or asynchronous tasks) of the same process without sharing
+    any state.
+
+    Args:
+        tests_dir (``str``, optional): a path to the tests directory that overrides the one passed
+            to ``otter.Notebook``
+        log_events (``bool``, optional): whether ``otter.Notebook`` should write events to its log
+        skip_failed_prerequisites (``bool``, optional): whether checks of tests with a prerequisite
+            that has failed should be skipped
+
+    Attributes:
+        tests_dir (``str | None``): a path to the tests directory that overrides the one passed to
+            ``otter.Notebook``
+        log_events (``bool``): whether ``otter.Notebook`` should write events to its log
+        skip_failed_prerequisites (``bool``): whether checks of tests with a prerequisite that has
+            failed should be skipped
+        track_results (``bool``): whether the results of calls to ``Checker.check`` are collected
+        results (``list`` of ``otter.test_files.abstract_test.TestFile``): the collected results
+    """
+
+    def __init__(self, tests_dir=None, log_events=True, skip_failed_prerequisites=False):
+        self.tests_dir = tests_dir
+        self.log_events = log_events
+        self.skip_failed_prerequisites = skip_failed_prerequisites
+        self.track_results = True
+        self.results = []
+
+
+_current_context = contextvars.ContextVar("otter_grading_context", default=None)
+
+
+def get_grading_context():
+    """
+    Get the grading context that is active in the current thread or task.
+
+    Returns:
+        ``GradingContext | None``: the active context, or ``None`` if nothing is being graded
+    """
+    return _current_context.get()
+
+
+@contextmanager
+def use_grading_context(context):
+    """
+    A context manager that activates a grading context in the current thread or task, restoring
+    the previously active context (if any) when it exits.
+
+    Args:
+        context (``GradingContext``): the context to activate
+
+    Yields:
+        ``GradingContext``: the context
+    """
+    token = _current_context.set(context)
+    try:
+        yield context
+
+    finally:
+        _current_context.reset(token)
+
+
+_output_target = contextvars.ContextVar("otter_output_target", default=None)
+_router_lock = threading.Lock()
+_router_users = 0
+
+
+class _ContextualStream:
+    """
+    A proxy for ``sys.stdout`` or ``sys.stderr`` that writes to the stream set by
+    ``redirect_output`` in the current thread or task, or to the stream it replaced otherwise.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def _target(self):
+        target = _output_target.get()
+        return self.stream if target is None else target
+
+    def write(self, s):
+        return self._target().write(s)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, attr):
+        return getattr(self._target(), attr)
+
+
+@contextmanager
+def redirect_output(stream):
+    """
+    A context manager that redirects stdout and stderr to ``stream`` in the current thread or task
+    only.
+
+    Unlike ``contextlib.redirect_stdout``, which swaps ``sys.stdout`` for the whole process, this
+    installs proxies in ``sys.stdout`` and ``sys.stderr`` while any redirection is active and routes
+    writes based on the active ``contextvars`` context, so concurrent gradings don't capture each
+    other's output or restore the wrong stream.
+
+    Args:
+        stream (file-like object): the stream to write to
+    """
+    global _router_users
+    with _router_lock:
+        if _router_users == 0:
+            sys.stdout = _ContextualStream(sys.stdout)
+            sys.stderr = _ContextualStream(sys.stderr)
+        _router_users += 1
+
+    token = _output_target.set(stream)
+    try:
+        yield
+
+    finally:
+        _output_target.reset(token)
+        with _router_lock:
+            _router_users -= 1
+            if _router_users == 0:
+                # leave any stream installed by other code in the meantime in place
+                if isinstance(sys.stdout, _ContextualStream):
+                    sys.stdout = sys.stdout.stream
+                if isinstance(sys.stderr, _ContextualStream):
+                    sys.stderr = sys.stderr.stream
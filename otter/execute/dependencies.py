@@ -0,0 +1,600 @@
+"""Static analysis of the dependencies between notebook cells and test files"""
+
+import ast
+import copy
+import os
+
+try:
+    from IPython.core.inputtransformer2 import TransformerManager
+    _IPYTHON_7 = True
+except ImportError:
+    from IPython.core.inputsplitter import IPythonInputSplitter
+    _IPYTHON_7 = False
+
+from .transforms import is_ignored_cell
+
+from ..test_files import create_test_file, ExceptionTestFile, OKTestFile
+
+
+# names of functions that are known not to mutate their arguments; calls to these functions do not
+# mark the names passed to them as modified
+_NON_MUTATING_FUNCTIONS = {
+    "abs", "all", "any", "bool", "dict", "display", "enumerate", "float", "format", "frozenset",
+    "hash", "id", "int", "isinstance", "len", "list", "max", "min", "print", "range", "repr",
+    "reversed", "round", "set", "sorted", "str", "sum", "tuple", "type", "zip",
+}
+
+# names of methods that are known not to mutate the object they are called on (as long as they are
+# not passed ``inplace=True``); calls to these methods do not mark the object as modified
+_NON_MUTATING_METHODS = {
+    "agg", "aggregate", "all", "any", "apply", "astype", "bar", "barh", "boxplot", "copy", "corr",
+    "count", "describe", "drop", "dropna", "fillna", "format", "get", "groupby", "head", "hist",
+    "info", "isna", "isnull", "items", "join", "keys", "max", "mean", "median", "merge", "min",
+    "nunique", "plot", "quantile", "query", "rename", "replace", "reset_index", "sample", "scatter",
+    "set_index", "show", "sort_values", "std", "sum", "tail", "to_numpy", "transform", "unique",
+    "value_counts", "values", "var",
+}
+
+# names that, when used in a cell, allow it to modify the global environment in ways that can't be
+# determined statically
+_OPAQUE_NAMES = {"eval", "exec", "globals", "locals", "vars", "__import__", "get_ipython"}
+
+_NO_CONSTANT = object()
+
+
+class CellNames:
+    """
+    The names defined and used by a single cell (or by a single scope within a cell).
+
+    Attributes:
+        assigned (``set[str]``): names that are bound by the cell
+        defined (``set[str]``): names that are (or may be) bound or modified by the cell; a superset
+            of ``assigned``
+        mutated (``set[str]``): names whose values may be modified in place by the cell (e.g. by
+            item assignment or method calls); a subset of ``defined``
+        aliases (``list[tuple[str, str]]``): pairs of names that may refer to the same object
+            because the cell binds one to (a part of) the other, e.g. ``a = b`` or ``a = b.c``
+        used (``set[str]``): names that are read by the cell
+        opaque (``bool``): whether the cell can modify the environment in ways that can't be
+            determined statically
+        checks (``list[str]``): the names of questions checked by calls to ``Notebook.check`` in
+            the cell
+        calls (``set[str]``): the names of functions called by the cell
+        functions (``dict[str, tuple[set[str], set[str]]]``): a map from the names of functions
+            defined in the cell to the global names they may modify and the functions they call
+    """
+
+    def __init__(self):
+        self.assigned = set()
+        self.defined = set()
+        self.mutated = set()
+        self.aliases = []
+        self.used = set()
+        self.opaque = False
+        self.checks = []
+        self.calls = set()
+        self.functions = {}
+
+
+def _get_constant(node):
+    """
+    Get the value of a constant AST node.
+
+    Args:
+        node (``ast.AST``): the node
+
+    Returns:
+        ``object``: the value of the constant, or ``_NO_CONSTANT`` if the node is not a constant
+    """
+    if isinstance(node, ast.Constant):
+        return node.value
+    # Python < 3.8 parses constants into these (now deprecated) node types
+    elif type(node).__name__ == "Str":
+        return node.s
+    elif type(node).__name__ == "NameConstant":
+        return node.value
+    return _NO_CONSTANT
+
+
+def _get_alias_groups(aliases):
+    """
+    Group names that may refer to the same object, following chains of aliases (e.g. ``b = a``
+    followed by ``c = b``).
+
+    Args:
+        aliases (``iterable[tuple[str, str]]``): pairs of names that may refer to the same object
+
+    Returns:
+        ``dict[str, set[str]]``: a map from each name in ``aliases`` to the names in its group
+    """
+    groups = {}
+    for a, b in aliases:
+        group = groups.get(a, {a}) | groups.get(b, {b})
+        for name in group:
+            groups[name] = group
+
+    return groups
+
+
+def _expand_aliases(names, groups):
+    """
+    Add the aliases of each name in a set of names.
+
+    Args:
+        names (``set[str]``): the names
+        groups (``dict[str, set[str]]``): the alias groups returned by ``_get_alias_groups``
+
+    Returns:
+        ``set[str]``: the names and their aliases
+    """
+    return set().union(names, *(groups.get(n, ()) for n in names))
+
+
+def _get_root_name(node):
+    """
+    Get the name at the root of a chain of attribute accesses, subscripts, and calls (e.g. ``df``
+    for ``df.loc[0].x``).
+
+    Args:
+        node (``ast.AST``): the node
+
+    Returns:
+        ``str | None``: the root name, if the root of the chain is an ``ast.Name``
+    """
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call, ast.Starred)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    if isinstance(node, ast.Name):
+        return node.id
+    return None
+
+
+class _NameCollector(ast.NodeVisitor):
+    """
+    An AST visitor that collects the names defined and used in a piece of code into a ``CellNames``
+    object.
+
+    Names that are modified (e.g. by item assignment, by calling methods on them, or by passing
+    them to functions) are treated as defined, so that the analysis errs on the side of executing
+    a cell. Names bound to other names (or to their attributes or items) are recorded as aliases,
+    since modifying one may modify the other. Function, lambda, class, and comprehension bodies are
+    collected as separate scopes so that their local variables are not treated as globals.
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self.declared_global = set()
+
+    def _define(self, name):
+        if name is not None:
+            self.names.defined.add(name)
+
+    def _assign(self, name):
+        self.names.assigned.add(name)
+        self._define(name)
+
+    def _mutate(self, name):
+        if name is not None:
+            self.names.mutated.add(name)
+            self._define(name)
+
+    def _add_aliases(self, target, value):
+        """
+        Record the names in an assignment target as aliases of the names that they are bound to.
+        Tuple targets are paired with the elements of tuple values of the same length and are
+        otherwise all aliases of the value.
+        """
+        if isinstance(target, (ast.Tuple, ast.List)):
+            if isinstance(value, (ast.Tuple, ast.List)) and len(value.elts) == len(target.elts):
+                for t, v in zip(target.elts, value.elts):
+                    self._add_aliases(t, v)
+            else:
+                for t in target.elts:
+                    self._add_aliases(t, value)
+            return
+
+        if isinstance(target, ast.Starred):
+            target = target.value
+
+        # calls aren't followed, since they usually return new objects
+        while isinstance(value, (ast.Attribute, ast.Subscript, ast.Starred)):
+            value = value.value
+
+        if isinstance(target, ast.Name) and isinstance(value, ast.Name):
+            self.names.aliases.append((target.id, value.id))
+
+    def _visit_scope(self, body, params=()):
+        """
+        Collect the names of a nested scope and merge the names that refer to the enclosing scope
+        into this collector's names.
+
+        Args:
+            body (``list[ast.AST]``): the nodes in the scope's body
+            params (``iterable[str]``): names that are local to the scope because they are
+                parameters or comprehension targets
+
+        Returns:
+            ``tuple[set[str], set[str]]``: the non-local names that the scope may modify and the
+            functions called in the scope
+        """
+        names = CellNames()
+        collector = _NameCollector(names)
+        for node in body:
+            collector.visit(node)
+
+        local = (set(params) | names.assigned) - collector.declared_global
+        mutated = _expand_aliases(names.mutated, _get_alias_groups(names.aliases))
+        modified = ((names.defined | mutated) - local) | collector.declared_global
+
+        self.names.used |= names.used - local
+        self.names.aliases.extend(p for p in names.aliases if not local & set(p))
+        self.names.opaque = self.names.opaque or names.opaque
+        self.names.checks.extend(names.checks)
+        self.names.functions.update(names.functions)
+
+        return modified, names.calls
+
+    def _visit_function(self, node):
+        for expr in [*node.args.defaults, *node.args.kw_defaults, *getattr(node, "decorator_list", [])]:
+            if expr is not None:
+                self.visit(expr)
+
+        args = node.args
+        params = [
+            a.arg for a in [
+                *getattr(args, "posonlyargs", []), *args.args, args.vararg, *args.kwonlyargs,
+                args.kwarg,
+            ] if a is not None
+        ]
+
+        body = node.body if isinstance(node.body, list) else [node.body]
+        modified, calls = self._visit_scope(body, params)
+
+        if not isinstance(node, ast.Lambda):
+            self._assign(node.name)
+            self.names.functions[node.name] = (modified, calls)
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+    visit_Lambda = _visit_function
+
+    def visit_ClassDef(self, node):
+        for expr in [*node.decorator_list, *node.bases, *(kw.value for kw in node.keywords)]:
+            self.visit(expr)
+
+        # the class body is executed when the class is defined, so its effects are the cell's
+        modified, calls = self._visit_scope(node.body)
+        self.names.defined |= modified
+        self.names.mutated |= modified
+        self.names.calls |= calls
+
+        self._assign(node.name)
+
+    def _visit_comprehension(self, node):
+        targets = set()
+        for generator in node.generators:
+            self.visit(generator.iter)
+            target_names = CellNames()
+            _NameCollector(target_names).visit(generator.target)
+            targets |= target_names.assigned
+
+        elements = [node.key, node.value] if isinstance(node, ast.DictComp) else [node.elt]
+        conditions = [c for g in node.generators for c in g.ifs]
+        modified, calls = self._visit_scope(
+            [ast.Expr(value=e) for e in [*elements, *conditions]], targets)
+        self.names.defined |= modified
+        self.names.mutated |= modified
+        self.names.calls |= calls
+
+    visit_ListComp = _visit_comprehension
+    visit_SetComp = _visit_comprehension
+    visit_DictComp = _visit_comprehension
+    visit_GeneratorExp = _visit_comprehension
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.names.used.add(node.id)
+            if node.id in _OPAQUE_NAMES:
+                self.names.opaque = True
+        else:
+            self._assign(node.id)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._assign(alias.asname or alias.name.split(".")[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == "*":
+                self.names.opaque = True
+            else:
+                self._assign(alias.asname or alias.name)
+
+    def visit_Global(self, node):
+        self.declared_global.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def visit_Assign(self, node):
+        for target in node.targets:
+            self._add_aliases(target, node.value)
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self._add_aliases(node.target, node.value)
+        self.generic_visit(node)
+
+    def visit_NamedExpr(self, node):
+        self._add_aliases(node.target, node.value)
+        self.generic_visit(node)
+
+    def _visit_for(self, node):
+        # the loop variable refers to the elements of the iterable
+        self._add_aliases(node.target, node.iter)
+        self.generic_visit(node)
+
+    visit_For = _visit_for
+    visit_AsyncFor = _visit_for
+
+    def visit_AugAssign(self, node):
+        root = _get_root_name(node.target)
+        self._mutate(root)
+        if root is not None:
+            self.names.used.add(root)
+        self.generic_visit(node)
+
+    def _visit_subscript_or_attribute(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            self._mutate(_get_root_name(node))
+        self.generic_visit(node)
+
+    visit_Attribute = _visit_subscript_or_attribute
+    visit_Subscript = _visit_subscript_or_attribute
+
+    def visit_Call(self, node):
+        inplace = any(
+            kw.arg == "inplace" and _get_constant(kw.value) is not False for kw in node.keywords)
+
+        if isinstance(node.func, ast.Attribute):
+            if inplace or node.func.attr not in _NON_MUTATING_METHODS:
+                self._mutate(_get_root_name(node.func.value))
+
+            if node.func.attr in ("check", "check_all"):
+                question = _get_constant(node.args[0]) if node.args else _NO_CONSTANT
+                if isinstance(question, str):
+                    self.names.checks.append(question)
+                elif node.func.attr == "check_all" or node.args:
+                    # a check whose question can't be determined statically could depend on any name
+                    self.names.opaque = True
+
+        func_name = node.func.id if isinstance(node.func, ast.Name) else None
+        if func_name is not None:
+            self.names.calls.add(func_name)
+
+        if func_name not in _NON_MUTATING_FUNCTIONS:
+            for arg in [*node.args, *(kw.value for kw in node.keywords)]:
+                self._mutate(_get_root_name(arg))
+
+        self.generic_visit(node)
+
+
+def _transform_cell_source(source):
+    """
+    Convert the source of a code cell into executable Python, removing magic commands in the same
+    manner as ``otter.execute.execute_notebook``.
+
+    Args:
+        source (``str | list[str]``): the cell source
+
+    Returns:
+        ``str``: the transformed source
+    """
+    if isinstance(source, str):
+        lines = [l + "\n" for l in source.split("\n")]
+    else:
+        lines = source
+
+    code = "".join(l for l in lines if not l.startswith("%") and "interact(" not in l)
+
+    if _IPYTHON_7:
+        return TransformerManager().transform_cell(code)
+
+    return IPythonInputSplitter(line_input_checker=False).transform_cell(code)
+
+
+def get_code_names(source):
+    """
+    Determine the names defined and used by a piece of code.
+
+    If the code cannot be parsed, the returned ``CellNames`` is marked as opaque.
+
+    Args:
+        source (``str``): the code
+
+    Returns:
+        ``CellNames``: the names in the code
+    """
+    names = CellNames()
+
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        names.opaque = True
+        return names
+
+    collector = _NameCollector(names)
+    collector.visit(tree)
+    names.defined |= collector.declared_global
+
+    return names
+
+
+def get_cell_names(cell):
+    """
+    Determine the names defined and used by a notebook code cell.
+
+    Args:
+        cell (``nbformat.NotebookNode``): the code cell
+
+    Returns:
+        ``CellNames``: the names in the cell
+    """
+    try:
+        source = _transform_cell_source(cell["source"])
+    except Exception:
+        names = CellNames()
+        names.opaque = True
+        return names
+
+    names = get_code_names(source)
+    names.checks.extend(cell.get("metadata", {}).get("otter", {}).get("tests", []))
+    return names
+
+
+def get_test_file_names(test_file):
+    """
+    Determine the global names that a test file reads from the environment it is run against.
+
+    For OK-formatted tests, these are all of the names read by the doctest examples. For
+    exception-based tests, these are the parameters of the test case functions. If the test file
+    requests the entire environment (by using a test case function parameter named ``env``) or is
+    of a type that can't be analyzed, ``None`` is returned.
+
+    Args:
+        test_file (``otter.test_files.abstract_test.TestFile``): the test file
+
+    Returns:
+        ``set[str] | None``: the names read by the test file
+    """
+    names = set()
+
+    if isinstance(test_file, OKTestFile):
+        for examples in test_file.get_examples():
+            assigned = set()
+            for example in examples:
+                code_names = get_code_names(example.source)
+                if code_names.opaque:
+                    return None
+
+                # names bound by earlier examples in the same test case are not read from the
+                # environment
+                names |= code_names.used - assigned
+                assigned |= code_names.assigned
+
+    elif isinstance(test_file, ExceptionTestFile):
+        for tc in test_file.test_cases:
+            params = tc.body._get_func_params()
+            if "env" in params:
+                return None
+            names.update(params)
+
+    else:
+        return None
+
+    return names
+
+
+def _get_function_effects(functions):
+    """
+    Determine the global names that each function may modify when called, including through calls
+    to other functions in ``functions``.
+
+    Args:
+        functions (``dict[str, tuple[set[str], set[str]]]``): a map from function names to the names
+            they modify and the functions they call
+
+    Returns:
+        ``dict[str, set[str]]``: a map from function names to the names they may modify
+    """
+    effects = {f: set(modified) for f, (modified, _) in functions.items()}
+
+    changed = True
+    while changed:
+        changed = False
+        for f, (_, calls) in functions.items():
+            for called in calls & effects.keys():
+                if not effects[called] <= effects[f]:
+                    effects[f] |= effects[called]
+                    changed = True
+
+    return effects
+
+
+def filter_unused_cells(nb, tests_glob, test_dir):
+    """
+    Remove code cells from a notebook that no test depends on.
+
+    The cells are traversed in reverse order, starting with the set of names read by the tests in
+    ``tests_glob``. A cell is kept if it defines or may modify any of the names needed by the tests
+    or by the cells after it, if it runs any checks, or if its effects can't be determined
+    statically. A cell that calls a function defined in the notebook is treated as modifying any
+    global the function may modify. A cell that modifies a name in place is also treated as
+    modifying every name that may be an alias of it anywhere in the notebook (e.g. ``df`` if any
+    cell runs ``tmp = df``). The names read by kept cells and by the tests they check are
+    added to the set of needed names. Cells ignored with ``otter_ignore`` are left as-is so that
+    they can be removed by ``filter_ignored_cells``.
+
+    If the names read by any test can't be determined, no cells are removed.
+
+    Args:
+        nb (``nbformat.NotebookNode``): the notebook
+        tests_glob (``list[str]``): paths to the test files that will be run after execution
+        test_dir (``str``): the path to the directory of tests referenced by checks in the notebook
+
+    Returns:
+        ``tuple[nbformat.NotebookNode, list[int]]``: the notebook with unused cells removed and the
+        indices of the removed cells in the original notebook
+    """
+    test_names = {}
+
+    def get_names_for_test(path):
+        if path not in test_names:
+            try:
+                test_names[path] = get_test_file_names(create_test_file(path))
+            except Exception:
+                test_names[path] = None
+        return test_names[path]
+
+    needed = set()
+    for path in tests_glob:
+        names = get_names_for_test(path)
+        if names is None:
+            return nb, []
+        needed |= names
+
+    cell_names, functions, aliases = {}, {}, []
+    for i, cell in enumerate(nb["cells"]):
+        if cell["cell_type"] == "code" and not is_ignored_cell(cell):
+            cell_names[i] = get_cell_names(cell)
+            functions.update(cell_names[i].functions)
+            aliases.extend(cell_names[i].aliases)
+
+    function_effects = _get_function_effects(functions)
+    alias_groups = _get_alias_groups(aliases)
+
+    skipped = []
+    for i in sorted(cell_names, reverse=True):
+        names = cell_names[i]
+        for called in names.calls & function_effects.keys():
+            names.mutated |= function_effects[called]
+
+        names.defined |= _expand_aliases(names.mutated, alias_groups)
+
+        if not (names.opaque or names.checks or names.defined & needed):
+            skipped.append(i)
+            continue
+
+        needed |= names.used
+        for question in names.checks:
+            check_names = get_names_for_test(os.path.join(test_dir, question + ".py"))
+            if check_names is None:
+                return nb, []
+            needed |= check_names
+
+    skipped.reverse()
+    to_skip = set(skipped)
+
+    nb = copy.copy(nb)
+    nb["cells"] = [c for i, c in enumerate(nb["cells"]) if i not in to_skip]
+
+    return nb, skipped
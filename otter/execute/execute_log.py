@@ -1,20 +1,58 @@
 """Execution of a submission through log deserialization"""
 
+import os
 import re
 
+from glob import glob
 from IPython.core.inputsplitter import IPythonInputSplitter
-from unittest import mock
 
+from .context import GradingContext, use_grading_context
+from .dependencies import get_test_file_names
+
+from ..test_files import create_test_file
 from ..utils import get_variable_type
 
 
+def get_tested_names(test_paths):
+    """
+    Determine the global names read by a collection of test files.
+
+    Args:
+        test_paths (iterable of ``str``): the paths to the test files
+
+    Returns:
+        ``set[str] | None``: the names, or ``None`` if the names read by any test file can't be
+        determined
+    """
+    names = set()
+    for path in test_paths:
+        try:
+            test_names = get_test_file_names(create_test_file(path))
+        except Exception:
+            return None
+
+        if test_names is None:
+            return None
+
+        names |= test_names
+
+    return names
+
+
 def execute_log(nb, log, check_results_list_name="check_results_secret", initial_env=None, 
-                ignore_errors=False, cwd=None, test_dir=None, variables=None):
+                ignore_errors=False, cwd=None, test_dir=None, variables=None, context=None,
+                tests_glob=None):
     """
     Execute a notebook from logged environments and return the global environment that results.
 
     If ``ignore_errors`` is true, exceptions are swallowed.
 
+    Only the variables read by the tests in ``test_dir`` and ``tests_glob`` (and the variables that
+    the code of those variables reads) are unpickled from each logged environment, and variables
+    shared between environments are only unpickled once. If the names read by any test can't be
+    determined, all variables are unpickled. If ``variables`` is specified, variables that aren't in
+    it or that were logged with a different type are not unpickled.
+
     Args:
         nb (``nbformat.NotebookNode``): the notebook to execute
         log (``otter.check.logs.Log``): log from notebook execution
@@ -26,6 +64,11 @@ def execute_log(nb, log, check_results_list_name="check_results_secret", initial
         test_dir (``str``, optional): path to directory of tests in grading environment
         variables (``dict``, optional): map of variable names -> type string to check type of deserialized
             object to prevent arbitrary code from being put into the environment
+        context (``otter.execute.context.GradingContext``, optional): the grading context in which
+            to run the checks; a new context that doesn't write events to the log is created if
+            unspecified
+        tests_glob (``list`` of ``str``, optional): paths to test files that will be run against the
+            resulting environment in addition to those in ``test_dir``
 
     Results:
         ``dict``: global environment resulting from executing all code of the input notebook
@@ -36,16 +79,18 @@ def execute_log(nb, log, check_results_list_name="check_results_secret", initial
         global_env = {}
 
     if test_dir:
-        source = f"import otter\ngrader = otter.Notebook(\"{test_dir}\")\n"
+        source = f"import otter\ngrader = otter.Notebook(tests_dir=\"{test_dir}\")\n"
     else:
         source = f"import otter\ngrader = otter.Notebook()\n"
 
     if cwd:
         source +=  f"import sys\nsys.path.append(\"{cwd}\")\n"
 
+    if context is None:
+        context = GradingContext(tests_dir=test_dir, log_events=False)
+
     logged_questions = []
-    m = mock.mock_open()
-    with mock.patch("otter.Notebook._log_event", m):
+    with use_grading_context(context):
         exec(source, global_env)
 
         for cell in nb['cells']:
@@ -72,11 +117,19 @@ def execute_log(nb, log, check_results_list_name="check_results_secret", initial
                         if not ignore_errors:
                             raise
 
+        test_paths = set(tests_glob or [])
+        if test_dir and os.path.isdir(test_dir):
+            test_paths.update(
+                p for p in glob(os.path.join(test_dir, "*.py")) if os.path.basename(p) != "__init__.py")
+
+        tested_names = get_tested_names(sorted(test_paths)) if test_paths else None
+
+        cache = {}
         for entry in log.question_iterator():
-            shelf = entry.unshelve(global_env)
+            shelf = entry.unshelve(global_env, names=tested_names, variables=variables, cache=cache)
 
             if variables is not None:
-                for k, v in shelf.items():
+                for k, v in list(shelf.items()):
                     full_type = get_variable_type(v)
                     if not (k in variables and variables[k] == full_type):
                         del shelf[k]
@@ -4,7 +4,7 @@ import copy
 import os
 import tempfile
 
-from contextlib import redirect_stdout, redirect_stderr
+from contextlib import nullcontext
 from IPython.display import display
 
 try:
@@ -14,18 +14,25 @@ except ImportError:
     from IPython.core.inputsplitter import IPythonInputSplitter
     _IPYTHON_7 = False
 
-from .transforms import create_collected_check_cell
+from .context import GradingContext, redirect_output, use_grading_context
+from .profiling import record_timing
+from .transforms import create_collected_check_cell, get_cell_index
 
 from ..utils import id_generator
 
 
 def execute_notebook(nb, check_results_list_name="check_results_secret", initial_env=None, 
-                     ignore_errors=False, cwd=None, test_dir=None, seed=None, seed_variable=None):
+                     ignore_errors=False, cwd=None, test_dir=None, seed=None, seed_variable=None,
+                     timings=None, output_capture=None, context=None):
     """
     Execute a notebook and return the global environment that results from execution.
 
     If ``ignore_errors`` is true, exceptions are swallowed.
 
+    Code cells are named in ``timings`` and ``output_capture`` by the index stored in their
+    metadata by ``otter.execute.transforms.number_cells`` (i.e. their index in the notebook before
+    any cells were removed) or, if they weren't numbered, by their index in ``nb``.
+
     Args:
         nb (``nbformat.NotebookNode``): the notebook to execute
         check_results_list_name (``str``, optional): the name of the list to collect check results in
@@ -36,6 +43,12 @@ def execute_notebook(nb, check_results_list_name="check_results_secret", initial
         test_dir (``str``, optional): path to directory of tests in grading environment
         seed (``int``, optional): random seed for intercell seeding
         seed_variable (``str``, optional): a variable name to override with the seed
+        timings (``list``, optional): a list to which an ``otter.execute.profiling.ExecutionTiming``
+            for each code cell is appended
+        output_capture (``otter.execute.capture.OutputCapture``, optional): an object in which to
+            capture the output and errors of each code cell instead of discarding them
+        context (``otter.execute.context.GradingContext``, optional): the grading context in which
+            to collect check results; a new context is created if unspecified
 
     Results:
         ``dict``: global environment resulting from executing all code of the input notebook
@@ -46,13 +59,16 @@ def execute_notebook(nb, check_results_list_name="check_results_secret", initial
     else:
         global_env = {}
 
-    # add display from IPython
-    global_env["display"] = display
+    # add display from IPython, unless a stub was provided
+    global_env.setdefault("display", display)
 
     test_dir = test_dir if test_dir is not None else './tests'
 
+    if context is None:
+        context = GradingContext(tests_dir=test_dir)
+
     from ..check.notebook import Notebook
-    with Notebook.grading_mode(tests_dir = test_dir if test_dir is not None else './tests') as check_results:
+    with use_grading_context(context):
         # add dummy Notebook class so that we can collect results
         secret = id_generator()
         notebook_class_name = f"Notebook_{secret}"
@@ -70,7 +86,17 @@ def execute_notebook(nb, check_results_list_name="check_results_secret", initial
             global_env["np"] = np
             global_env["random"] = random
 
-        for cell in nb['cells']:
+        def record(kind, name):
+            if timings is None:
+                return nullcontext()
+            return record_timing(timings, kind, name)
+
+        def capture(name):
+            if output_capture is None:
+                return nullcontext()
+            return output_capture.capture_cell(name)
+
+        for i, cell in enumerate(nb['cells']):
             if cell['cell_type'] == 'code':
                 if _IPYTHON_7:
                     isp = TransformerManager()
@@ -106,7 +132,10 @@ def execute_notebook(nb, check_results_list_name="check_results_secret", initial
                     else:
                         cell_source = isp.transform_cell(''.join(code_lines))
 
-                    with open(os.devnull, 'w') as f, redirect_stdout(f), redirect_stderr(f):
+                    # name the cell by its index in the notebook before any cells were removed
+                    name = str(get_cell_index(cell, i))
+                    with open(os.devnull, 'w') as f, redirect_output(f), \
+                            capture(name), record("cell", name):
                         exec(cell_source, global_env)
 
                     source += cell_source
@@ -124,7 +153,8 @@ def execute_notebook(nb, check_results_list_name="check_results_secret", initial
 
             try:
                 cleaned_source = compile(source, filename=ntf.name, mode="exec")
-                with open(os.devnull, 'w') as f, redirect_stdout(f), redirect_stderr(f):
+                with open(os.devnull, 'w') as f, redirect_output(f), \
+                        record("checks", "all"):
                     exec(cleaned_source, global_env)
 
             except:
@@ -132,6 +162,6 @@ def execute_notebook(nb, check_results_list_name="check_results_secret", initial
                     raise
 
         # add the collected results to the global env
-        global_env[check_results_list_name] = check_results
+        global_env[check_results_list_name] = context.results
 
     return global_env
@@ -0,0 +1,232 @@
+"""Headless rendering of plots, displays, and widgets during grading"""
+
+import contextvars
+import functools
+import importlib.abc
+import os
+import sys
+import threading
+
+from contextlib import contextmanager, ExitStack
+from fnmatch import fnmatch
+from unittest import mock
+
+
+# the savefig allowlist of the headless_mode context active in the current thread or task, or None if
+# headless mode isn't active in it
+_active_allowlist = contextvars.ContextVar("otter_headless_allowlist", default=None)
+
+# the patches are shared by every active headless_mode context and removed when the last one exits
+_lock = threading.RLock()
+_users = 0
+_stack = None
+
+
+def _noop(*args, **kwargs):
+    """
+    A stub that accepts any arguments and does nothing.
+    """
+
+
+def _noop_interact(*args, **kwargs):
+    """
+    A stub for ``ipywidgets.interact`` that does not create any widgets or call the function. Like
+    ``interact``, it can be used as a decorator with or without arguments.
+    """
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+    return lambda f: f
+
+
+def _if_headless(original, stub):
+    """
+    Create a function that calls ``stub`` in threads and tasks where headless mode is active and
+    ``original`` everywhere else.
+    """
+    @functools.wraps(original)
+    def dispatch(*args, **kwargs):
+        if _active_allowlist.get() is None:
+            return original(*args, **kwargs)
+        return stub(*args, **kwargs)
+
+    return dispatch
+
+
+def _patch_ipython_display(module, stack):
+    # check the module's namespace directly, since IPython.core.display warns on access to display
+    # in versions where it moved to IPython.core.display_functions
+    if "display" in vars(module):
+        stack.enter_context(
+            mock.patch.object(module, "display", _if_headless(module.display, _noop)))
+
+
+def _patch_pyplot(module, stack):
+    # the MPLBACKEND environment variable only has an effect if matplotlib wasn't already imported
+    original_backend = module.get_backend()
+    if original_backend.lower() != "agg":
+        module.switch_backend("Agg")
+        stack.callback(module.switch_backend, original_backend)
+
+    stack.enter_context(mock.patch.object(module, "show", _if_headless(module.show, _noop)))
+
+    from matplotlib.figure import Figure
+    savefig = Figure.savefig
+
+    @functools.wraps(savefig)
+    def savefig_if_allowed(self, fname, *args, **kwargs):
+        # figures saved to file-like objects are always rendered, since tests may grade them
+        allowlist = _active_allowlist.get()
+        if allowlist is not None and isinstance(fname, (str, os.PathLike)) and \
+                not any(fnmatch(os.fspath(fname), p) for p in allowlist):
+            return None
+        return savefig(self, fname, *args, **kwargs)
+
+    stack.enter_context(mock.patch.object(Figure, "savefig", savefig_if_allowed))
+
+
+def _patch_plotly_io(module, stack):
+    # plotly.basedatatypes.BaseFigure.show delegates to plotly.io.show
+    stack.enter_context(mock.patch.object(module, "show", _if_headless(module.show, _noop)))
+
+
+def _patch_ipywidgets(module, stack):
+    for name in ["interact", "interact_manual"]:
+        if hasattr(module, name):
+            stack.enter_context(mock.patch.object(
+                module, name, _if_headless(getattr(module, name), _noop_interact)))
+
+    # widgets open a comm to the frontend when they are constructed
+    widget_cls = getattr(getattr(module, "widgets", None), "Widget", None)
+    if widget_cls is not None and hasattr(widget_cls, "open"):
+        stack.enter_context(
+            mock.patch.object(widget_cls, "open", _if_headless(widget_cls.open, _noop)))
+
+
+_PATCHERS = {
+    "IPython.display": _patch_ipython_display,
+    "IPython.core.display": _patch_ipython_display,
+    "IPython.core.display_functions": _patch_ipython_display,
+    "matplotlib.pyplot": _patch_pyplot,
+    "plotly.io": _patch_plotly_io,
+    "ipywidgets": _patch_ipywidgets,
+}
+
+
+class _PatchingLoader(importlib.abc.Loader):
+    """
+    A loader that wraps another loader and patches the module after it is executed.
+    """
+
+    def __init__(self, loader, patch):
+        self.loader = loader
+        self.patch = patch
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.loader.exec_module(module)
+        self.patch(module)
+
+
+class _PatchingFinder(importlib.abc.MetaPathFinder):
+    """
+    A meta path finder that patches the modules in ``_PATCHERS`` when they are first imported, so
+    that libraries the submission doesn't use are never imported.
+    """
+
+    def __init__(self, patch):
+        self.patch = patch
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname not in _PATCHERS:
+            return None
+
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+
+        else:
+            return None
+
+        if spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return spec
+
+        spec.loader = _PatchingLoader(spec.loader, self.patch)
+        return spec
+
+
+def _install_patches():
+    """
+    Patch the libraries in ``_PATCHERS`` that are already imported and install a finder that
+    patches the rest when they are imported. The patches are removed when ``_stack`` is closed.
+    """
+    global _stack
+    stack = _stack = ExitStack()
+    stack.enter_context(mock.patch.dict(os.environ, {"MPLBACKEND": "Agg"}))
+
+    def patch(module):
+        with _lock:
+            # don't patch modules imported while the patches were being removed
+            if _stack is stack:
+                _PATCHERS[module.__name__](module, stack)
+
+    finder = _PatchingFinder(patch)
+    sys.meta_path.insert(0, finder)
+    stack.callback(sys.meta_path.remove, finder)
+
+    for name in _PATCHERS:
+        if name in sys.modules:
+            patch(sys.modules[name])
+
+
+@contextmanager
+def headless_mode(savefig_allowlist=None):
+    """
+    A context manager that makes rendering output during grading cheap.
+
+    While the context is active, matplotlib uses the non-rendering Agg backend; ``plt.show``,
+    IPython's ``display``, and plotly's ``show`` do nothing; figures are only saved to paths
+    matching a pattern in ``savefig_allowlist``; and ``ipywidgets.interact`` and widget comms do
+    nothing. Libraries that are already imported are patched immediately, and the rest are patched
+    when they are imported.
+
+    The patched functions only behave this way in the thread or task that entered the context, so
+    that submissions graded concurrently with different settings don't affect each other. The
+    matplotlib backend and the ``MPLBACKEND`` environment variable are process-wide, however, so
+    they are set while any context is active. All patches are removed when the last active context
+    exits.
+
+    Args:
+        savefig_allowlist (``list`` of ``str``, optional): glob patterns of paths to which figures
+            can still be saved
+
+    Yields:
+        ``dict``: stubs to add to the environment that the submission is executed in
+    """
+    global _stack, _users
+    with _lock:
+        if _users == 0:
+            try:
+                _install_patches()
+            except:
+                _stack.close()
+                _stack = None
+                raise
+        _users += 1
+
+    token = _active_allowlist.set(list(savefig_allowlist or []))
+    try:
+        yield {"display": _noop}
+
+    finally:
+        _active_allowlist.reset(token)
+        with _lock:
+            _users -= 1
+            if _users == 0:
+                stack, _stack = _stack, None
+                stack.close()
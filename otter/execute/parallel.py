@@ -0,0 +1,133 @@
+"""Parallel execution of test files in forked processes"""
+
+import os
+import pickle
+import select
+import signal
+import traceback
+
+from ..test_files.abstract_test import TestCaseResult
+
+
+def can_fork():
+    """
+    Determine whether test files can be run in forked processes on this platform.
+
+    Returns:
+        ``bool``: whether ``os.fork`` is available
+    """
+    return hasattr(os, "fork")
+
+
+def _run_in_child(test_file, global_env, write_fd):
+    """
+    Run a test file in a forked child process and write the pickled results of its test cases to
+    a pipe. This function never returns.
+
+    Args:
+        test_file (``otter.test_files.abstract_test.TestFile``): the test file to run
+        global_env (``dict``): the environment to run the test file against
+        write_fd (``int``): the file descriptor of the write end of the pipe
+    """
+    status = 0
+    try:
+        try:
+            test_file.run(global_env)
+            payload = [
+                (tcr.message, tcr.passed, tcr.run_time) for tcr in test_file.test_case_results]
+
+        except Exception:
+            payload = traceback.format_exc()
+
+        with os.fdopen(write_fd, "wb") as f:
+            f.write(pickle.dumps(payload))
+
+    except BaseException:
+        status = 1
+
+    finally:
+        # skip any cleanup inherited from the parent (atexit handlers, buffered output, etc.)
+        os._exit(status)
+
+
+def _set_results(test_file, data):
+    """
+    Set the test case results of a test file from the data sent by the child process that ran it.
+
+    If the child process did not send any results (e.g. because it was killed or crashed), or if
+    the test file raised an error, all of its test cases are marked as failed.
+
+    Args:
+        test_file (``otter.test_files.abstract_test.TestFile``): the test file
+        data (``bytes``): the pickled results written by the child process
+    """
+    try:
+        payload = pickle.loads(data)
+    except Exception:
+        payload = "The process running this test exited unexpectedly"
+
+    if isinstance(payload, str):
+        payload = [("❌ Test case failed\n" + payload, False, None)] * len(test_file.test_cases)
+
+    test_file.test_case_results = [
+        TestCaseResult(test_case=tc, message=message, passed=passed, run_time=run_time)
+            for tc, (message, passed, run_time) in zip(test_file.test_cases, payload)
+    ]
+
+
+def run_test_files(test_files, global_env, workers=1):
+    """
+    Run test files against an environment.
+
+    If ``workers`` is greater than 1 and ``os.fork`` is available, each test file is run in a
+    forked child process that inherits ``global_env`` copy-on-write, so that tests can't modify the
+    environment seen by other tests. Up to ``workers`` test files are run at once, and the results
+    of their test cases are pickled back to this process. Otherwise, the test files are run one
+    after another in this process.
+
+    Args:
+        test_files (``list`` of ``otter.test_files.abstract_test.TestFile``): the test files to run
+        global_env (``dict``): the environment to run the test files against
+        workers (``int``, optional): the maximum number of test files to run at once
+    """
+    if workers <= 1 or len(test_files) == 0 or not can_fork():
+        for tf in test_files:
+            tf.run(global_env)
+        return
+
+    pending = list(test_files)
+    running = {}  # maps read file descriptors to (pid, test file, list of bytes read)
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                tf = pending.pop(0)
+                read_fd, write_fd = os.pipe()
+                pid = os.fork()
+                if pid == 0:
+                    os.close(read_fd)
+                    _run_in_child(tf, global_env, write_fd)
+
+                os.close(write_fd)
+                running[read_fd] = (pid, tf, [])
+
+            ready, _, _ = select.select(list(running), [], [])
+            for fd in ready:
+                pid, tf, chunks = running[fd]
+                chunk = os.read(fd, 65536)
+                if chunk:
+                    chunks.append(chunk)
+                    continue
+
+                os.close(fd)
+                os.waitpid(pid, 0)
+                del running[fd]
+                _set_results(tf, b"".join(chunks))
+
+    finally:
+        for fd, (pid, _, _) in running.items():
+            os.close(fd)
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
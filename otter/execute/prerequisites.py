@@ -0,0 +1,104 @@
+"""Scheduling of test files that depend on other tests"""
+
+from .parallel import run_test_files
+
+from ..utils import loggers
+
+
+LOGGER = loggers.get_logger(__name__)
+
+
+def get_failed_prerequisites(test_file, graded):
+    """
+    Determine which of the prerequisites of a test file have been graded and did not pass.
+
+    Prerequisites that haven't been graded are not considered failed. A prerequisite that was
+    itself skipped is considered failed, so failures propagate to all of the tests that depend on a
+    test, directly or indirectly.
+
+    Args:
+        test_file (``otter.test_files.abstract_test.TestFile``): the test file
+        graded (``list`` of ``otter.test_files.abstract_test.TestFile``): the test files that have
+            been graded, in the order they were graded; if a test was graded more than once, its
+            last result is used
+
+    Returns:
+        ``list`` of ``str``: the names of the failed prerequisites
+    """
+    results = {tf.name: tf for tf in graded}
+    return [n for n in test_file.depends_on if n in results and not results[n].passed_all]
+
+
+def skip_if_prerequisites_failed(test_file, graded):
+    """
+    Skip a test file if any of its prerequisites have been graded and did not pass.
+
+    Args:
+        test_file (``otter.test_files.abstract_test.TestFile``): the test file
+        graded (``list`` of ``otter.test_files.abstract_test.TestFile``): the test files that have
+            been graded, in the order they were graded
+
+    Returns:
+        ``bool``: whether the test file was skipped
+    """
+    failed = get_failed_prerequisites(test_file, graded)
+    if failed:
+        test_file.skip(
+            f"❌ Test case skipped because the prerequisite test(s) {', '.join(failed)} did not pass")
+        return True
+
+    return False
+
+
+def order_test_files(test_files):
+    """
+    Group test files into waves so that each test file is in a later wave than any of the test
+    files in ``test_files`` that it depends on.
+
+    Prerequisites that aren't in ``test_files`` are ignored. If the prerequisites contain a cycle,
+    the test files in the cycle (and those that depend on them) are put in a final wave in their
+    original order.
+
+    Args:
+        test_files (``list`` of ``otter.test_files.abstract_test.TestFile``): the test files
+
+    Returns:
+        ``list`` of ``list`` of ``otter.test_files.abstract_test.TestFile``: the waves
+    """
+    names = {tf.name for tf in test_files}
+    remaining, done, waves = list(test_files), set(), []
+    while remaining:
+        wave = [tf for tf in remaining if all(n in done or n not in names for n in tf.depends_on)]
+        if not wave:
+            LOGGER.warning(
+                "Found a cycle in the prerequisites of the tests: " + \
+                ", ".join(tf.name for tf in remaining))
+            wave = remaining
+
+        waves.append(wave)
+        done.update(tf.name for tf in wave)
+        remaining = [tf for tf in remaining if tf.name not in done]
+
+    return waves
+
+
+def run_test_files_in_order(test_files, global_env, graded, workers=1):
+    """
+    Run test files against an environment after their prerequisites, skipping any test file with a
+    prerequisite that did not pass.
+
+    The test files are run in the waves determined by ``order_test_files``; the test files in each
+    wave are run with ``otter.execute.parallel.run_test_files``.
+
+    Args:
+        test_files (``list`` of ``otter.test_files.abstract_test.TestFile``): the test files to run
+        global_env (``dict``): the environment to run the test files against
+        graded (``list`` of ``otter.test_files.abstract_test.TestFile``): the test files that have
+            already been graded
+        workers (``int``, optional): the maximum number of test files to run at once
+    """
+    graded = list(graded)
+    for wave in order_test_files(test_files):
+        to_run = [tf for tf in wave if not skip_if_prerequisites_failed(tf, graded)]
+        run_test_files(to_run, global_env, workers=workers)
+        graded.extend(wave)
@@ -0,0 +1,90 @@
+"""Profiling of submission execution and test runs"""
+
+import time
+import tracemalloc
+
+from collections import namedtuple
+from contextlib import contextmanager
+
+
+ExecutionTiming = namedtuple(
+    "ExecutionTiming", ["kind", "name", "wall_time", "cpu_time", "peak_memory"])
+ExecutionTiming.__doc__ = """\
+The resources used to execute a single code cell or run a single test case.
+
+Attributes:
+    kind (``str``): ``"cell"`` for code cells, ``"checks"`` for the execution of the collected
+        source of the notebook with its checks, or ``"test_case"`` for test cases
+    name (``str``): the index of the cell in the notebook or the name of the test case
+    wall_time (``float``): the wall time in seconds
+    cpu_time (``float | None``): the CPU time of this process in seconds, if recorded
+    peak_memory (``int | None``): the peak size in bytes of memory blocks allocated by Python, if
+        recorded
+"""
+
+
+@contextmanager
+def trace_memory():
+    """
+    A context manager that traces Python memory allocations with ``tracemalloc`` if they are not
+    already being traced.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+
+    try:
+        yield
+
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+@contextmanager
+def record_timing(timings, kind, name):
+    """
+    A context manager that appends an ``ExecutionTiming`` for the code run in its body to
+    ``timings``. Peak memory is only recorded if ``tracemalloc`` is tracing.
+
+    Args:
+        timings (``list`` of ``ExecutionTiming``): the list to append to
+        kind (``str``): the kind of code being run
+        name (``str``): the name of the code being run
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # tracemalloc.reset_peak was added in Python 3.9
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.clear_traces()
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+
+    finally:
+        timings.append(ExecutionTiming(
+            kind = kind,
+            name = name,
+            wall_time = time.perf_counter() - wall,
+            cpu_time = time.process_time() - cpu,
+            peak_memory = tracemalloc.get_traced_memory()[1] if tracing else None,
+        ))
+
+
+def get_test_case_timings(test_files):
+    """
+    Collect the run times of the test cases in a list of test files.
+
+    Args:
+        test_files (``list`` of ``otter.test_files.abstract_test.TestFile``): the test files
+
+    Returns:
+        ``list`` of ``ExecutionTiming``: the timings of test cases with a recorded run time
+    """
+    return [
+        ExecutionTiming("test_case", tcr.test_case.name, tcr.run_time, None, None)
+            for tf in test_files for tcr in tf.test_case_results if tcr.run_time is not None
+    ]
@@ -0,0 +1,210 @@
+"""Stubs for expensive or blocking calls made during grading"""
+
+import builtins
+import contextvars
+import functools
+import importlib
+import threading
+
+from collections import Counter
+from contextlib import contextmanager
+from unittest import mock
+
+
+class StubbedCallError(RuntimeError):
+    """
+    Exception raised by calls stubbed with the ``"raise"`` action
+    """
+
+
+# the stubs of the install_stubs contexts active in the current thread or task, keyed by the id of the
+# object holding each stubbed function and the function's name
+_active_stubs = contextvars.ContextVar("otter_active_stubs", default={})
+
+# the dispatchers installed in place of stubbed functions, with the number of active contexts that use
+# each one; a function is restored when the last context that stubs it exits
+_lock = threading.Lock()
+_installed = {}
+
+
+STUB_ACTIONS = {
+    "noop": "return ``None`` without calling the function",
+    "identity": "return the first argument without calling the function (e.g. for ``tqdm``)",
+    "raise": "raise an ``otter.execute.stubs.StubbedCallError``",
+    "offline": "raise a ``ConnectionError`` indicating that network access is disabled",
+    "passthrough": "call the function as usual, only counting its invocations",
+}
+
+
+def _resolve_target(target):
+    """
+    Find the object that holds the attribute named by a dotted path. Names without a dot refer to
+    builtins. The longest importable prefix of the path is imported and the rest of the path is
+    followed with ``getattr``.
+
+    Args:
+        target (``str``): the dotted path (e.g. ``time.sleep`` or ``socket.socket.connect``)
+
+    Returns:
+        ``tuple[object, str] | None``: the object holding the attribute and the attribute name, or
+        ``None`` if the path can't be resolved
+    """
+    parts = target.split(".")
+    if len(parts) == 1:
+        return builtins, target
+
+    for i in range(len(parts) - 1, 0, -1):
+        try:
+            obj = importlib.import_module(".".join(parts[:i]))
+        except ImportError:
+            continue
+
+        try:
+            for part in parts[i:-1]:
+                obj = getattr(obj, part)
+        except AttributeError:
+            return None
+
+        if not hasattr(obj, parts[-1]):
+            return None
+
+        return obj, parts[-1]
+
+    return None
+
+
+def _make_stub(target, action, original, counts):
+    """
+    Create a stub for a function that counts its invocations in ``counts`` and performs ``action``.
+
+    Args:
+        target (``str``): the dotted path of the function
+        action (``str``): the action to perform; a key of ``STUB_ACTIONS``
+        original (``callable``): the function being stubbed
+        counts (``collections.Counter``): the invocation counts
+
+    Returns:
+        ``callable``: the stub
+    """
+    def stub(*args, **kwargs):
+        counts[target] += 1
+
+        if action == "identity":
+            return args[0] if args else None
+
+        elif action == "raise":
+            raise StubbedCallError(f"{target} cannot be called during grading")
+
+        elif action == "offline":
+            raise ConnectionError(f"Network access is disabled during grading ({target})")
+
+        elif action == "passthrough":
+            return original(*args, **kwargs)
+
+    return stub
+
+
+def validate_stubs(stubs):
+    """
+    Validate a stub configuration.
+
+    Args:
+        stubs (``dict[str, str]``): a map of dotted paths of functions to stub actions
+
+    Raises:
+        ``ValueError``: if any action is not a key of ``STUB_ACTIONS``
+    """
+    for target, action in stubs.items():
+        if action not in STUB_ACTIONS:
+            raise ValueError(
+                f"Invalid stub action for {target}: {action}; must be one of " + \
+                ", ".join(STUB_ACTIONS))
+
+
+def _make_dispatcher(key, original):
+    """
+    Create a function that calls the stub for ``key`` in threads and tasks where one is active and
+    ``original`` everywhere else.
+    """
+    @functools.wraps(original)
+    def dispatch(*args, **kwargs):
+        stub = _active_stubs.get().get(key)
+        if stub is None:
+            return original(*args, **kwargs)
+        return stub(*args, **kwargs)
+
+    return dispatch
+
+
+def _acquire(obj, attr):
+    """
+    Install the dispatcher for a function, if it isn't already installed, and return the original
+    function.
+    """
+    key = (id(obj), attr)
+    with _lock:
+        if key not in _installed:
+            original = getattr(obj, attr)
+            patcher = mock.patch.object(obj, attr, _make_dispatcher(key, original))
+            patcher.start()
+            _installed[key] = [original, patcher, 0]
+
+        _installed[key][2] += 1
+        return _installed[key][0]
+
+
+def _release(obj, attr):
+    """
+    Restore a function if no other active context stubs it.
+    """
+    key = (id(obj), attr)
+    with _lock:
+        _installed[key][2] -= 1
+        if _installed[key][2] == 0:
+            _installed.pop(key)[1].stop()
+
+
+@contextmanager
+def install_stubs(stubs):
+    """
+    A context manager that replaces functions with stubs for the duration of the context.
+
+    Functions are identified by their dotted paths (e.g. ``time.sleep``, ``requests.get``, or
+    ``input`` for builtins). Functions in modules that aren't installed are ignored.
+
+    The stubs are only called in the thread or task that entered the context; elsewhere, the
+    stubbed functions behave as usual, so submissions graded concurrently with different stubs don't
+    affect each other.
+
+    Args:
+        stubs (``dict[str, str]``): a map of dotted paths of functions to stub actions; see
+            ``STUB_ACTIONS`` for the available actions
+
+    Yields:
+        ``collections.Counter``: a counter of the number of times each stub is called
+    """
+    validate_stubs(stubs)
+
+    counts = Counter()
+    active, acquired = dict(_active_stubs.get()), []
+    try:
+        for target, action in stubs.items():
+            resolved = _resolve_target(target)
+            if resolved is None:
+                continue
+
+            obj, attr = resolved
+            original = _acquire(obj, attr)
+            acquired.append(resolved)
+            active[id(obj), attr] = _make_stub(target, action, original, counts)
+
+        token = _active_stubs.set(active)
+        try:
+            yield counts
+
+        finally:
+            _active_stubs.reset(token)
+
+    finally:
+        for obj, attr in acquired:
+            _release(obj, attr)
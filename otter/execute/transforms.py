@@ -1,12 +1,19 @@
 """Transformations to apply to a submission before execution"""
 
 import copy
+import json
 import nbformat
 
+from ..utils import NBFORMAT_VERSION
+
 
 IGNORE_CELL_TAG = "otter_ignore"
 CELL_METADATA_KEY = "otter"
 
+# the key of the cell metadata in which the index of each cell in the notebook before any cells were
+# removed is stored
+CELL_INDEX_METADATA_KEY = "otter_cell_index"
+
 
 def script_to_notebook(script):
     """
@@ -23,31 +30,111 @@ def script_to_notebook(script):
     return nb
 
 
-def filter_ignored_cells(nb):
+def load_notebook_code(path):
     """
-    Filter out all cells in the notebook ``nb`` that are tagged with ``otter_ignore`` or have the
-    ``ignore`` key of their Otter cell metadata set to true.
+    Load the parts of a notebook needed to grade it: the source and metadata of its code cells and
+    the notebook metadata.
+
+    The notebook JSON is parsed once without validation. Cell outputs and attachments are
+    discarded, and the sources of non-code cells are replaced with empty strings, so that large
+    outputs aren't kept in memory or copied during grading. Cells are kept in place so that cell
+    indices match the original notebook. Notebooks that aren't in nbformat 4 are read with
+    ``nbformat`` and converted.
 
     Args:
-        nb (``nbformat.NotebookNode``): the notebook
+        path (``str``): the path to the notebook
 
     Returns:
-        ``nbformat.NotebookNode``: the notebook with ignored cells removed
+        ``nbformat.NotebookNode``: the notebook
     """
-    nb = copy.deepcopy(nb)
+    with open(path, encoding="utf-8") as f:
+        nb = json.load(f)
+
+    if nb.get("nbformat") != NBFORMAT_VERSION:
+        return nbformat.read(path, as_version=NBFORMAT_VERSION)
+
+    cells = []
+    for cell in nb.get("cells", []):
+        new_cell = {
+            "cell_type": cell["cell_type"],
+            "metadata": cell.get("metadata", {}),
+            "source": "",
+        }
+
+        if cell["cell_type"] == "code":
+            source = cell.get("source", "")
+            new_cell["source"] = "".join(source) if isinstance(source, list) else source
+            new_cell["outputs"] = []
+            new_cell["execution_count"] = None
+
+        cells.append(new_cell)
 
-    to_delete = []
+    return nbformat.from_dict({
+        "cells": cells,
+        "metadata": nb.get("metadata", {}),
+        "nbformat": nb["nbformat"],
+        "nbformat_minor": nb.get("nbformat_minor", 0),
+    })
+
+
+def number_cells(nb):
+    """
+    Store the index of each cell of a notebook in its metadata, so that cells can be identified by
+    their positions in this notebook after cells are removed from it (e.g. by
+    ``filter_ignored_cells``). The cells are modified in place.
+
+    Args:
+        nb (``nbformat.NotebookNode``): the notebook
+    """
     for i, cell in enumerate(nb["cells"]):
-        metadata = cell.get("metadata", {})
-        tags = metadata.get("tags", [])
+        cell.setdefault("metadata", {})[CELL_INDEX_METADATA_KEY] = i
 
-        if IGNORE_CELL_TAG in tags or metadata.get(CELL_METADATA_KEY, {}).get("ignore", False):
-            to_delete.append(i)
 
-    to_delete.reverse()
-    for i in to_delete:
-        del nb["cells"][i]
+def get_cell_index(cell, default):
+    """
+    Get the index of a cell stored by ``number_cells``.
 
+    Args:
+        cell (``nbformat.NotebookNode``): the cell
+        default (``int``): the index to return if the cell wasn't numbered
+
+    Returns:
+        ``int``: the index
+    """
+    return cell.get("metadata", {}).get(CELL_INDEX_METADATA_KEY, default)
+
+
+def is_ignored_cell(cell):
+    """
+    Determine whether a cell is tagged with ``otter_ignore`` or has the ``ignore`` key of its Otter
+    cell metadata set to true.
+
+    Args:
+        cell (``nbformat.NotebookNode``): the cell
+
+    Returns:
+        ``bool``: whether the cell should be ignored
+    """
+    metadata = cell.get("metadata", {})
+    tags = metadata.get("tags", [])
+    return IGNORE_CELL_TAG in tags or metadata.get(CELL_METADATA_KEY, {}).get("ignore", False)
+
+
+def filter_ignored_cells(nb):
+    """
+    Filter out all cells in the notebook ``nb`` that are tagged with ``otter_ignore`` or have the
+    ``ignore`` key of their Otter cell metadata set to true.
+
+    Args:
+        nb (``nbformat.NotebookNode``): the notebook
+
+    Returns:
+        ``nbformat.NotebookNode``: the notebook with ignored cells removed
+    """
+    # the cells are not modified during grading, so only the notebook and the list of cells need to
+    # be copied
+    nb = copy.copy(nb)
+    nb["cells"] = [c for c in nb["cells"] if not is_ignored_cell(c)]
     return nb
 
 
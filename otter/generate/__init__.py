@@ -16,6 +16,7 @@ from .utils import zip_folder
 
 from ..plugins import PluginCollection
 from ..run.run_autograder.autograder_config import AutograderConfig
+from ..test_files.bundle import BUNDLE_FILENAME, create_test_bundle
 from ..utils import load_default_file
 
 
@@ -180,9 +181,14 @@ def main(*, tests_dir="./tests", output_path="autograder.zip", config=None, no_c
 
         arc_test_dir = "tests"
         pattern = lang_config["test_file_pattern"]
-        for file in glob(os.path.join(tests_dir, pattern)):
+        test_files = glob(os.path.join(tests_dir, pattern))
+        for file in test_files:
             zf.write(file, arcname=os.path.join(arc_test_dir, os.path.basename(file)))
 
+        if ag_config.bundle_tests and ag_config.lang == "python":
+            zf.writestr(
+                os.path.join(arc_test_dir, BUNDLE_FILENAME), create_test_bundle(test_files))
+
         zf.writestr("otter_config.json", json.dumps(otter_config, indent=2))
 
         # copy files into tmp
@@ -11,7 +11,8 @@ from .run_autograder import main as run_autograder_main
 from ..utils import import_or_raise
 
 
-def main(submission, *, autograder="./autograder.zip", output_dir="./", no_logo=False, debug=False):
+def main(submission, *, autograder="./autograder.zip", output_dir="./", no_logo=False, debug=False,
+         checkpoint_dir=None, tests_only=False, timings_csv=None):
     """
     Grades a single submission using the autograder configuration ``autograder`` without
     containerization.
@@ -26,6 +27,12 @@ def main(submission, *, autograder="./autograder.zip", output_dir="./", no_logo=
         output_dir (``str``): directory at which to copy the results JSON file
         no_logo (``bool``): whether to suppress the Otter logo from being printed to stdout
         debug (``bool``); whether to run in debug mode (without ignoring errors)
+        checkpoint_dir (``str``): a directory in which to store a snapshot of the environment
+            resulting from executing the submission
+        tests_only (``bool``): whether to restore the environment from the submission's checkpoint
+            in ``checkpoint_dir`` and only rerun new or changed tests
+        timings_csv (``str``): a path at which to write a CSV file of the resources used by each
+            code cell and test case; enables profiling if specified
 
     Returns:
         ``otter.test_files.GradingResults``: the grading results object
@@ -56,7 +63,15 @@ def main(submission, *, autograder="./autograder.zip", output_dir="./", no_logo=
             shutil.copy(submission, os.path.join(ag_dir, "submission"))
 
         logo = not no_logo
-        run_autograder_main(ag_dir, logo=logo, debug=debug)
+        kwargs = {}
+        if checkpoint_dir is not None:
+            kwargs["checkpoint_dir"] = os.path.abspath(checkpoint_dir)
+        if tests_only:
+            kwargs["tests_only"] = True
+        if timings_csv is not None:
+            kwargs["profile"] = True
+
+        run_autograder_main(ag_dir, logo=logo, debug=debug, **kwargs)
 
         results_path = os.path.join(ag_dir, "results", "results.json")
         shutil.copy(results_path, output_dir)
@@ -65,6 +80,9 @@ def main(submission, *, autograder="./autograder.zip", output_dir="./", no_logo=
         with open(results_pkl_path, "rb") as f:
             results = dill.load(f)
 
+        if timings_csv is not None:
+            results.write_timings_csv(timings_csv)
+
     finally:
         shutil.rmtree(dp)
 
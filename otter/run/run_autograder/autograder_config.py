@@ -56,6 +56,85 @@ class AutograderConfig(fica.Config):
         default=None,
     )
 
+    skip_unused_cells = fica.Key(
+        description="whether to skip executing notebook cells that no test depends on, as " \
+            "determined by static analysis of the cells and test files",
+        default=False,
+    )
+
+    checkpoint_dir = fica.Key(
+        description="a directory in which to store snapshots of the environments resulting from " \
+            "executing each submission, for use with tests_only",
+        default=None,
+    )
+
+    tests_only = fica.Key(
+        description="whether to restore the environment from the submission's checkpoint in " \
+            "checkpoint_dir and only rerun new or changed tests instead of re-executing the " \
+            "submission",
+        default=False,
+    )
+
+    test_workers = fica.Key(
+        description="the maximum number of test files to run at once after executing the " \
+            "submission; if greater than 1, each test file is run in a forked process",
+        default=1,
+    )
+
+    profile = fica.Key(
+        description="whether to record the resources used by each code cell and test case and " \
+            "include them in a hidden test in the results",
+        default=False,
+    )
+
+    headless = fica.Key(
+        description="whether to stub out rendering plots, displays, and widgets while executing " \
+            "the submission and running tests",
+        default=False,
+    )
+
+    savefig_allowlist = fica.Key(
+        description="a list of glob patterns of paths to which figures can still be saved in " \
+            "headless mode",
+        default=[],
+    )
+
+    stubs = fica.Key(
+        description="a mapping of dotted paths of functions (e.g. time.sleep) to the actions to " \
+            "take in place of calling them during grading: noop, identity, raise, offline, or " \
+            "passthrough",
+        default=None,
+    )
+
+    capture_output = fica.Key(
+        description="whether to capture the output of each code cell in the results; output is " \
+            "always captured and printed in debug mode",
+        default=False,
+    )
+
+    cell_output_limit = fica.Key(
+        description="the maximum number of characters of output to capture per cell",
+        default=64 * 1024,
+    )
+
+    output_limit = fica.Key(
+        description="the maximum number of characters of output to capture per submission",
+        default=1024 * 1024,
+    )
+
+    skip_failed_prerequisites = fica.Key(
+        description="whether to skip running tests whose prerequisites (declared in the test " \
+            "files with depends_on) have failed, scoring them as zero",
+        default=False,
+    )
+
+    bundle_tests = fica.Key(
+        description="whether Otter Generate should precompile the tests into a bundle that is " \
+            "loaded instead of parsing the test files when the autograder is run with the same " \
+            "Python version",
+        default=False,
+    )
+
     pdf = fica.Key(
         description="whether to generate a PDF of the notebook when not using Gradescope " \
             "auto-upload",
@@ -1,7 +1,6 @@
 """Autograder runner for Python assignments"""
 
 import json
-import nbformat as nbf
 import os
 
 from glob import glob
@@ -13,9 +12,12 @@ from ..utils import OtterRuntimeError
 from ....check.logs import Log
 from ....check.notebook import _OTTER_LOG_FILENAME
 from ....execute import grade_notebook
+from ....execute.capture import OutputCapture
+from ....execute.transforms import load_notebook_code
 from ....export import export_notebook
 from ....generate.token import APIClient
 from ....plugins import PluginCollection
+from ....test_files.bundle import load_test_bundle
 from ....utils import chdir, print_full_width
 
 
@@ -35,7 +37,7 @@ class PythonRunner(AbstractLanguageRunner):
 
     def validate_submission(self, submission_path):
         if os.path.splitext(submission_path)[1] == ".ipynb":
-            nb = nbf.read(submission_path, as_version=nbf.NO_CONVERT)
+            nb = load_notebook_code(submission_path)
             assignment_name = self.get_notebook_assignment_name(nb)
             self.validate_assignment_name(assignment_name)
 
@@ -122,20 +124,46 @@ class PythonRunner(AbstractLanguageRunner):
 
                 log = None
 
-            scores = grade_notebook(
-                subm_path, 
-                tests_glob = glob("./tests/*.py"), 
-                name = "submission", 
-                cwd = os.getcwd(), 
-                test_dir = "./tests",
-                ignore_errors = not self.ag_config.debug, 
-                seed = self.ag_config.seed,
-                seed_variable = self.ag_config.seed_variable,
-                log = log if self.ag_config.grade_from_log else None,
-                variables = self.ag_config.serialized_variables,
-                plugin_collection = plugin_collection,
-                script = os.path.splitext(subm_path)[1] == ".py",
-            )
+            output_capture = None
+            if self.ag_config.capture_output or self.ag_config.debug:
+                output_capture = OutputCapture(
+                    self.ag_config.cell_output_limit, self.ag_config.output_limit)
+
+            # use the precompiled tests from Otter Generate, if any
+            load_test_bundle("./tests")
+
+            try:
+                scores = grade_notebook(
+                    subm_path, 
+                    tests_glob = glob("./tests/*.py"), 
+                    name = "submission", 
+                    cwd = os.getcwd(), 
+                    test_dir = "./tests",
+                    ignore_errors = not self.ag_config.debug, 
+                    seed = self.ag_config.seed,
+                    seed_variable = self.ag_config.seed_variable,
+                    log = log if self.ag_config.grade_from_log else None,
+                    variables = self.ag_config.serialized_variables,
+                    plugin_collection = plugin_collection,
+                    script = os.path.splitext(subm_path)[1] == ".py",
+                    skip_unused_cells = self.ag_config.skip_unused_cells,
+                    checkpoint_dir = self.ag_config.checkpoint_dir,
+                    tests_only = self.ag_config.tests_only,
+                    test_workers = self.ag_config.test_workers,
+                    profile = self.ag_config.profile,
+                    headless = self.ag_config.headless,
+                    savefig_allowlist = self.ag_config.savefig_allowlist,
+                    stubs = self.ag_config.stubs,
+                    output_capture = output_capture,
+                    skip_failed_prerequisites = self.ag_config.skip_failed_prerequisites,
+                )
+
+            finally:
+                # print the captured output even if grading failed, since debug mode doesn't ignore
+                # errors
+                if self.ag_config.debug and output_capture is not None:
+                    print_full_width("-", mid_text="CAPTURED OUTPUT")
+                    print(output_capture.summary())
 
             # verify the scores against the log
             if self.ag_config.print_summary:
@@ -154,6 +182,22 @@ class PythonRunner(AbstractLanguageRunner):
                 else:
                     print("No log found with which to verify student scores.")
 
+                if scores.skipped_cells:
+                    print("Skipped cells that no test depends on: " + \
+                        ", ".join(str(i) for i in scores.skipped_cells))
+
+                if scores.from_checkpoint:
+                    print("Restored the submission environment from a checkpoint; only new or " \
+                        "changed tests were run.")
+
+                if scores.stub_calls:
+                    print("Stubbed calls: " + ", ".join(
+                        f"{target} ({count})" for target, count in scores.stub_calls.items()))
+
+                if scores.unshelved_variables:
+                    print("Variables that could not be stored in the checkpoint: " + \
+                        ", ".join(scores.unshelved_variables))
+
             if generate_pdf:
                 self.write_and_maybe_submit_pdf(client, subm_path, has_token, scores)
 
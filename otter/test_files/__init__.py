@@ -1,21 +1,21 @@
 """Classes for working with test files and test results"""
 
+import csv
 import json
 import math
-import nbformat
 import os
 import pickle
 
 from collections import namedtuple
 
 from .abstract_test import OK_FORMAT_VARNAME, TestCase, TestCaseResult, TestFile
+from .cache import clear_test_file_cache, load_notebook_test_file, load_test_file
 from .exception_test import ExceptionTestFile, test_case
 from .metadata_test import NotebookMetadataExceptionTestFile, NotebookMetadataOKTestFile
 from .ok_test import OKTestFile
 from .ottr_test import OttrTestFile
 
 from ..check.logs import QuestionNotInLogException
-from ..utils import NBFORMAT_VERSION, NOTEBOOK_METADATA_KEY
 
 
 def create_test_file(path, test_name=None):
@@ -23,7 +23,9 @@ def create_test_file(path, test_name=None):
     Read a test file or a notebook file and determine the correct ``TestFile`` subclass for this test.
 
     If ``path`` is not a notebook, the file is executed as a Python script and a global variable is
-    used to determine whether the test is OK-formatted or not.
+    used to determine whether the test is OK-formatted or not. Python test files and the tests in
+    notebooks are parsed once per process and cached until they change; see
+    ``otter.test_files.cache.load_test_file`` and ``otter.test_files.cache.load_notebook_test_file``.
 
     Args:
         path (``str``): the path to the test file or notebook
@@ -37,25 +39,9 @@ def create_test_file(path, test_name=None):
         if test_name is None:
             raise ValueError("You must specify a test name when using notebook metadata tests")
 
-        nb = nbformat.read(path, as_version=NBFORMAT_VERSION)
-        if nb["metadata"][NOTEBOOK_METADATA_KEY][OK_FORMAT_VARNAME]:
-            return NotebookMetadataOKTestFile.from_file(path, test_name)
+        return load_notebook_test_file(path, test_name)
 
-        else:
-            return NotebookMetadataExceptionTestFile.from_file(path, test_name)
-
-    env = {}
-    with open(path) as f:
-        exec(f.read(), env)
-
-    if OK_FORMAT_VARNAME not in env:
-        raise RuntimeError(f"Malformed test file: does not define the global variable '{OK_FORMAT_VARNAME}'")
-
-    if env[OK_FORMAT_VARNAME]:
-        return OKTestFile.from_file(path)
-
-    else:
-        return ExceptionTestFile.from_file(path)
+    return load_test_file(path)
 
 
 GradingTestCaseResult = namedtuple(
@@ -82,6 +68,19 @@ class GradingResults:
         output (``str``): a string to include in the output field for Gradescope
         all_hidden (``bool``): whether all results should be hidden from the student on Gradescope
         tests (``list`` of ``str``): list of test names according to the keys of ``results``
+        skipped_cells (``list`` of ``int``): indices of the notebook cells that were not executed
+            because no test depended on them
+        skipped_tests (``list`` of ``str``): names of the tests that were skipped because one of
+            their prerequisites failed
+        from_checkpoint (``bool``): whether the environment was restored from a checkpoint instead
+            of by executing the submission
+        unshelved_variables (``list`` of ``str``): names of variables that could not be stored in
+            the submission's checkpoint
+        timings (``list`` of ``otter.execute.profiling.ExecutionTiming``): the resources used to
+            execute each code cell and run each test case, if profiling was enabled
+        stub_calls (``dict[str, int]``): the number of times each stubbed function was called
+        cell_outputs (``dict[str, str]``): the captured output of each code cell keyed by its index
+            in the notebook, if output capture was enabled
     """
     def __init__(self, test_files):
         self._plugin_data = {}
@@ -90,6 +89,13 @@ class GradingResults:
         self.output = None
         self.all_hidden = False
         self.pdf_error = None
+        self.skipped_cells = []
+        self.skipped_tests = []
+        self.from_checkpoint = False
+        self.unshelved_variables = []
+        self.timings = []
+        self.stub_calls = {}
+        self.cell_outputs = {}
 
     def __repr__(self):
         return self.summary()
@@ -320,6 +326,38 @@ class GradingResults:
         """
         return "\n".join(repr(test_file) for test_file in self.test_files)
 
+    def timings_summary(self):
+        """
+        Generate a table of the timings in these results, sorted by wall time in descending order.
+
+        Returns:
+            ``str``: the table
+        """
+        def fmt(v, spec):
+            return "" if v is None else format(v, spec)
+
+        rows = [("kind", "name", "wall time (s)", "cpu time (s)", "peak memory (B)")]
+        for t in sorted(self.timings, key=lambda t: t.wall_time, reverse=True):
+            rows.append((
+                t.kind, t.name, fmt(t.wall_time, ".4f"), fmt(t.cpu_time, ".4f"),
+                fmt(t.peak_memory, "d")))
+
+        widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+        return "\n".join(
+            "  ".join(v.ljust(w) for v, w in zip(r, widths)).rstrip() for r in rows)
+
+    def write_timings_csv(self, path):
+        """
+        Write the timings in these results to a CSV file.
+
+        Args:
+            path (``str``): the path to the CSV file
+        """
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["kind", "name", "wall_time", "cpu_time", "peak_memory"])
+            writer.writerows(self.timings)
+
     def to_dict(self):
         """
         Converts these results into a dictinary, extending the fields of the named tuples in ``results``
@@ -397,6 +435,14 @@ class GradingResults:
                 "output": test_file.summary(),
             })
 
+        # add the timings as a test that is only visible to instructors
+        if ag_config.profile and self.timings:
+            output["tests"].append({
+                "name": "Execution Profile",
+                "visibility": "hidden",
+                "output": self.timings_summary(),
+            })
+
         if ag_config.show_stdout:
             output["stdout_visibility"] = "after_published"
 
@@ -41,6 +41,8 @@ class TestCaseResult:
 
     passed: bool
 
+    run_time: Optional[float] = None
+
 # # class for storing the results of a single test _case_ (within a test file)
 # #   - message should be a string to print out to the student (ignored if passed is True)
 # #   - passed is whether the test case passed
@@ -60,6 +62,11 @@ class TestFile(ABC):
         test_cases (``list`` of ``TestCase``): a list of parsed tests to be run
         all_or_nothing (``bool``, optional): whether the test should be graded all-or-nothing across
             cases
+        depends_on (``str`` or ``list`` of ``str``, optional): the name or names of the tests that
+            must pass for this test to be run when prerequisites are enforced
+
+    Raises:
+        ``TypeError``: if ``depends_on`` is not a string or a list of strings
 
     Attributes:
         name (``str``): the name of test file
@@ -67,22 +74,31 @@ class TestFile(ABC):
         test_cases (``list`` of ``TestCase``): a list of parsed tests to be run
         all_or_nothing (``bool``): whether the test should be graded all-or-nothing across
             cases
+        depends_on (``list`` of ``str``): the names of the tests that must pass for this test to be
+            run when prerequisites are enforced
         test_case_results (``list`` of ``TestCaseResult``): a list of results for the test cases in
             ``test_cases``
+        skipped (``bool``): whether the test was skipped instead of run because a prerequisite
+            failed
+        cached (``bool``): whether these results were reused from an earlier run because the
+            test's inputs hadn't changed
     """
 
+    # the default for test files pickled by older versions of Otter
+    cached = False
+
     def _repr_html_(self):
         if self.passed_all:
             all_passed_emoji = random.choice(['🍀', '🎉', '🌈', '🙌', '🚀', '🌟', '✨', '💯'])
             if any(tcr.test_case.success_message is not None for tcr in self.test_case_results):
-                ret = f"<p><strong><pre style='display: inline;'>{self.name}</pre></strong> passed! {all_passed_emoji}</p>"
+                ret = f"<p><strong><pre style='display: inline;'>{self.name}</pre></strong> passed!{self._cached_marker} {all_passed_emoji}</p>"
                 for tcr in self.test_case_results:
                     if tcr.test_case.success_message is not None:
                         ret += f"<p><strong><pre style='display: inline;'>{tcr.test_case.name}</pre> message:</strong> {tcr.test_case.success_message}</p>"
                 return ret
-            return f"<p><strong><pre style='display: inline;'>{self.name}</pre></strong> passed! {all_passed_emoji}</p>"
+            return f"<p><strong><pre style='display: inline;'>{self.name}</pre></strong> passed!{self._cached_marker} {all_passed_emoji}</p>"
         else:
-            ret = f"<p><strong style='color: red;'><pre style='display: inline;'>{self.name}</pre> results:</strong></p>"
+            ret = f"<p><strong style='color: red;'><pre style='display: inline;'>{self.name}</pre> results{self._cached_marker}:</strong></p>"
             for tcr in self.test_case_results:
                 if tcr.passed and tcr.test_case.success_message is not None:
                     ret += f"<p><strong><pre style='display: inline;'>{tcr.test_case.name}</pre> message:</strong> {tcr.test_case.success_message}</p>"
@@ -96,15 +112,40 @@ class TestFile(ABC):
     def __repr__(self):
         return self.summary()
 
+    @staticmethod
+    def _normalize_depends_on(depends_on):
+        """
+        Convert a ``depends_on`` specification into a list of test names.
+        """
+        if depends_on is None:
+            return []
+
+        if isinstance(depends_on, str):
+            return [depends_on]
+
+        if not isinstance(depends_on, (list, tuple)) or \
+                not all(isinstance(n, str) for n in depends_on):
+            raise TypeError(
+                f"depends_on must be a string or a list of strings, not {depends_on!r}")
+
+        return list(depends_on)
+
     # @abstractmethod
-    def __init__(self, name, path, test_cases, all_or_nothing=True):
+    def __init__(self, name, path, test_cases, all_or_nothing=True, depends_on=None):
         self.name = name
         self.path = path
         self.test_cases = test_cases
         self.all_or_nothing = all_or_nothing
+        self.depends_on = self._normalize_depends_on(depends_on)
         self.test_case_results = []
+        self.skipped = False
+        self.cached = False
         self._score = None
 
+    @property
+    def _cached_marker(self):
+        return " (cached)" if self.cached else ""
+
     @staticmethod
     def resolve_test_file_points(total_points, test_cases):
         if isinstance(total_points, list):
@@ -189,6 +230,18 @@ class TestFile(ABC):
     def update_score(self, new_score):
         self._score = new_score
 
+    def skip(self, message):
+        """
+        Mark this test as skipped, failing each of its test cases with the same message instead of
+        running them.
+
+        Args:
+            message (``str``): the message to show for each test case
+        """
+        self.test_case_results = [
+            TestCaseResult(test_case=tc, message=message, passed=False) for tc in self.test_cases]
+        self.skipped = True
+
     def to_dict(self):
         return {
             "score": self.score,
@@ -202,7 +255,7 @@ class TestFile(ABC):
 
     def summary(self, public_only=False):
         if (not public_only and self.passed_all) or (public_only and self.passed_all_public):
-            ret = f"{self.name} results: All test cases passed!"
+            ret = f"{self.name} results{self._cached_marker}: All test cases passed!"
             if (not public_only and self.passed_all) and \
                     any(tcr.test_case.success_message is not None for tcr in self.test_case_results):
                 for tcr in self.test_case_results:
@@ -226,7 +279,7 @@ class TestFile(ABC):
 
             tcr_summaries.append(smry.strip())
 
-        return f"{self.name} results:\n" + indent("\n\n".join(tcr_summaries), "    ")
+        return f"{self.name} results{self._cached_marker}:\n" + indent("\n\n".join(tcr_summaries), "    ")
 
     @classmethod
     @abstractmethod
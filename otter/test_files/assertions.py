@@ -0,0 +1,215 @@
+"""Assertion helpers for comparing arrays and data frames in test files"""
+
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+__all__ = [
+    "assert_close",
+    "assert_fingerprint",
+    "assert_frame_equal_subset",
+    "assert_shape",
+    "fingerprint",
+]
+
+# the number of elements compared at once, so that comparisons of large arrays can stop early
+_CHUNK_SIZE = 1 << 16
+
+
+def _get_shape(obj):
+    """
+    Get the shape of an object without converting it to an array if it has a ``shape`` attribute.
+
+    Args:
+        obj (``object``): the object
+
+    Returns:
+        ``tuple[int]``: the shape
+    """
+    shape = getattr(obj, "shape", None)
+    if shape is None:
+        shape = np.shape(obj)
+    return tuple(shape)
+
+
+def assert_shape(obj, shape):
+    """
+    Assert that an array, data frame, or other array-like object has the specified shape.
+
+    Args:
+        obj (array-like): the object to check
+        shape (``tuple[int | None]``): the expected shape; dimensions that are ``None`` can have
+            any size
+
+    Raises:
+        ``AssertionError``: if the shapes differ
+    """
+    actual = _get_shape(obj)
+    if len(actual) != len(shape) or \
+            any(e is not None and a != e for a, e in zip(actual, shape)):
+        raise AssertionError(f"Expected shape {tuple(shape)} but got {actual}")
+
+
+def assert_close(actual, expected, rtol=1e-05, atol=1e-08, equal_nan=True):
+    """
+    Assert that two arrays, array-like objects, or numbers have the same shape and elementwise equal
+    values, within a tolerance for numeric values (as in ``numpy.isclose``).
+
+    The values are compared in chunks and the comparison stops at the first chunk that contains a
+    difference, whose index is reported in the error message.
+
+    Args:
+        actual (array-like): the value to check
+        expected (array-like): the expected value
+        rtol (``float``, optional): the relative tolerance
+        atol (``float``, optional): the absolute tolerance
+        equal_nan (``bool``, optional): whether ``NaN`` values in the same position are equal
+
+    Raises:
+        ``AssertionError``: if the shapes or values differ
+    """
+    actual, expected = np.asarray(actual), np.asarray(expected)
+    if actual.shape != expected.shape:
+        raise AssertionError(f"Expected shape {expected.shape} but got {actual.shape}")
+
+    numeric = np.issubdtype(actual.dtype, np.number) and np.issubdtype(expected.dtype, np.number)
+
+    flat_actual, flat_expected = actual.ravel(), expected.ravel()
+    for start in range(0, flat_actual.size, _CHUNK_SIZE):
+        a = flat_actual[start:start + _CHUNK_SIZE]
+        e = flat_expected[start:start + _CHUNK_SIZE]
+        if numeric:
+            equal = np.isclose(a, e, rtol=rtol, atol=atol, equal_nan=equal_nan)
+        else:
+            equal = np.asarray(a == e, dtype=bool)
+
+        if not equal.all():
+            i = start + int(np.argmin(equal))
+            index = np.unravel_index(i, actual.shape) if actual.ndim else ()
+            raise AssertionError(
+                f"Values differ at index {index}: expected {flat_expected[i]!r} but got "
+                f"{flat_actual[i]!r}")
+
+
+def assert_frame_equal_subset(actual, expected, columns=None, check_index=True, rtol=1e-05,
+                              atol=1e-08):
+    """
+    Assert that a data frame contains the columns (and, optionally, the index labels) of an expected
+    data frame with values equal to those in the expected data frame. Numeric columns are compared
+    with ``assert_close``.
+
+    Args:
+        actual (``pandas.DataFrame``): the data frame to check
+        expected (``pandas.DataFrame``): the expected values
+        columns (``list[str]``, optional): the columns to compare; defaults to all of the columns of
+            ``expected``
+        check_index (``bool``, optional): whether to compare the rows with the labels in the index
+            of ``expected``; if false, rows are compared by position
+        rtol (``float``, optional): the relative tolerance for numeric columns
+        atol (``float``, optional): the absolute tolerance for numeric columns
+
+    Raises:
+        ``AssertionError``: if a column or index label is missing or any values differ
+    """
+    if not isinstance(actual, pd.DataFrame):
+        raise AssertionError(f"Expected a DataFrame but got {type(actual).__name__}")
+
+    columns = list(expected.columns) if columns is None else list(columns)
+    missing = [c for c in columns if c not in actual.columns]
+    if missing:
+        raise AssertionError(f"Missing columns: {missing}")
+
+    if check_index:
+        missing = expected.index.difference(actual.index)
+        if len(missing):
+            raise AssertionError(f"Missing index labels: {list(missing[:10])}")
+        actual = actual.loc[expected.index]
+
+    else:
+        assert_shape(actual, (expected.shape[0], None))
+
+    for column in columns:
+        try:
+            assert_close(actual[column].to_numpy(), expected[column].to_numpy(), rtol=rtol, atol=atol)
+        except AssertionError as e:
+            raise AssertionError(f"Column {column!r}: {e}") from None
+
+
+def _normalize_array(arr, decimals):
+    """
+    Normalize an array for hashing: round floats to ``decimals`` decimal places and replace negative
+    zeros with zeros.
+
+    Args:
+        arr (``numpy.ndarray``): the array
+        decimals (``int | None``): the number of decimal places to round to, if any
+
+    Returns:
+        ``numpy.ndarray``: the normalized array
+    """
+    if np.issubdtype(arr.dtype, np.inexact):
+        if decimals is not None:
+            arr = np.round(arr, decimals)
+        arr = arr + 0.0
+    return np.ascontiguousarray(arr)
+
+
+def fingerprint(obj, decimals=None):
+    """
+    Compute a hash of the contents of an array, data frame, series, or other array-like object, so
+    that tests can compare large objects without storing or formatting them.
+
+    Args:
+        obj (array-like or ``pandas.DataFrame`` or ``pandas.Series``): the object to hash
+        decimals (``int``, optional): a number of decimal places to round floats to before hashing,
+            so that the fingerprint is robust to floating point error
+
+    Returns:
+        ``str``: the hex digest of the SHA-256 hash of the object
+    """
+    h = hashlib.sha256()
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        if isinstance(obj, pd.DataFrame):
+            # columns are keyed by position so that duplicate column names are hashed correctly
+            h.update(repr(list(obj.columns)).encode("utf-8"))
+            obj = pd.DataFrame({
+                i: _normalize_array(obj.iloc[:, i].to_numpy(), decimals)
+                    for i in range(obj.shape[1])
+            }, index=obj.index)
+
+        else:
+            obj = pd.Series(_normalize_array(obj.to_numpy(), decimals), index=obj.index)
+
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+
+    else:
+        arr = _normalize_array(np.asarray(obj), decimals)
+        h.update(repr((arr.shape, arr.dtype.str)).encode("utf-8"))
+        if arr.dtype.hasobject:
+            h.update(repr(arr.tolist()).encode("utf-8"))
+        else:
+            h.update(arr.tobytes())
+
+    return h.hexdigest()
+
+
+def assert_fingerprint(obj, expected, decimals=None):
+    """
+    Assert that the fingerprint of an object is equal to an expected fingerprint computed with
+    ``fingerprint``.
+
+    Args:
+        obj (array-like or ``pandas.DataFrame`` or ``pandas.Series``): the object to check
+        expected (``str``): the expected fingerprint
+        decimals (``int``, optional): the number of decimal places that floats were rounded to when
+            computing ``expected``
+
+    Raises:
+        ``AssertionError``: if the fingerprints differ
+    """
+    actual = fingerprint(obj, decimals=decimals)
+    if actual != expected:
+        raise AssertionError(
+            f"The contents of the {type(obj).__name__} (fingerprint {actual[:12]}) are not the "
+            "expected ones")
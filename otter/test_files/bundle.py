@@ -0,0 +1,117 @@
+"""Precompiled bundles of test files"""
+
+import hashlib
+import marshal
+import os
+import pickle
+import sys
+
+from . import cache
+from ..version import __version__
+
+
+BUNDLE_FILENAME = "tests.bundle"
+BUNDLE_FORMAT_VERSION = 2
+
+
+def _hash_source(source):
+    """
+    Hash the contents of a test file.
+
+    Args:
+        source (``str``): the contents of the test file
+
+    Returns:
+        ``str``: the hex digest of the SHA-256 hash of the contents
+    """
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def create_test_bundle(test_paths):
+    """
+    Parse and compile a list of Python test files into a bundle.
+
+    For each test file, the bundle contains its contents and either its parsed ``OKTestFile`` (with
+    resolved point values and parsed doctest examples) or its marshaled code object. Because code
+    objects and pickled test files are specific to the versions of Python and Otter that created
+    them, the bundle is tagged with both.
+
+    Files that can't be parsed as test files are left out of the bundle.
+
+    Args:
+        test_paths (``list`` of ``str``): the paths to the test files
+
+    Returns:
+        ``bytes``: the bundle
+    """
+    tests = {}
+    for path in test_paths:
+        try:
+            entry = cache.parse_test_file(path)
+        except Exception:
+            continue
+
+        tests[os.path.basename(path)] = {
+            "sha256": _hash_source(entry.source),
+            "source": entry.source,
+            "template": entry.template,
+            "code": marshal.dumps(entry.code) if entry.template is None else None,
+        }
+
+    return pickle.dumps({
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "otter_version": __version__,
+        "cache_tag": sys.implementation.cache_tag,
+        "tests": tests,
+    })
+
+
+def load_test_bundle(tests_dir):
+    """
+    Load the bundle in ``tests_dir`` (if present) into the test file cache, so that test files are
+    not parsed when they are loaded.
+
+    The bundle is ignored if it was created by a different version of Python or Otter, and each test
+    file is only loaded from the bundle if the file in ``tests_dir`` has the same contents as the one
+    that was bundled; all other test files are parsed from their ``.py`` files as usual.
+
+    Args:
+        tests_dir (``str``): the path to the tests directory
+
+    Returns:
+        ``list`` of ``str``: the paths of the test files that were loaded from the bundle
+    """
+    bundle_path = os.path.join(tests_dir, BUNDLE_FILENAME)
+    if not os.path.isfile(bundle_path):
+        return []
+
+    try:
+        with open(bundle_path, "rb") as f:
+            bundle = pickle.load(f)
+
+    except Exception:
+        return []
+
+    if not isinstance(bundle, dict) or \
+            bundle.get("format_version") != BUNDLE_FORMAT_VERSION or \
+            bundle.get("otter_version") != __version__ or \
+            bundle.get("cache_tag") != sys.implementation.cache_tag:
+        return []
+
+    loaded = []
+    for filename, data in bundle["tests"].items():
+        path = os.path.join(tests_dir, filename)
+        try:
+            key = cache.get_file_key(path)
+            with open(path) as f:
+                if _hash_source(f.read()) != data["sha256"]:
+                    continue
+
+        except OSError:
+            continue
+
+        code = marshal.loads(data["code"]) if data["code"] is not None else None
+        cache.add_test_file(path, cache.CachedTestFile(key, data["source"], code, data["template"]))
+        loaded.append(path)
+
+    return loaded
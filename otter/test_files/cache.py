@@ -0,0 +1,281 @@
+"""A process-wide cache of parsed test files"""
+
+import copy
+import json
+import os
+import pathlib
+import threading
+
+from .abstract_test import OK_FORMAT_VARNAME
+from .exception_test import ExceptionTestFile
+from .metadata_test import NotebookMetadataExceptionTestFile, NotebookMetadataOKTestFile
+from .ok_test import OKTestFile
+
+from ..utils import NOTEBOOK_METADATA_KEY
+
+
+_cache = {}
+_notebook_cache = {}
+_cache_lock = threading.Lock()
+
+
+class CachedTestFile:
+    """
+    A parsed test file stored in the cache. Entries can be created with ``parse_test_file`` and
+    added to the cache with ``add_test_file``.
+
+    For OK-formatted tests, ``template`` is an ``OKTestFile`` with its doctest examples already
+    parsed. For exception-based tests, ``template`` is ``None`` and ``code`` is the compiled test
+    file, which is executed for each copy so that the test case functions get fresh globals.
+
+    Args:
+        key (``tuple[int, int]``): the modification time and size of the file when it was parsed
+        source (``str``): the contents of the file
+        code (``code``): the compiled file
+        template (``otter.test_files.ok_test.OKTestFile | None``): the parsed test file
+        exception_class (``type``, optional): the class of the exception-based test files created
+            from this entry
+    """
+
+    def __init__(self, key, source, code, template, exception_class=ExceptionTestFile):
+        self.key = key
+        self.source = source
+        self.code = code
+        self.template = template
+        self.exception_class = exception_class
+
+    def new_test_file(self, path):
+        """
+        Create a test file with fresh result state from this entry.
+
+        Args:
+            path (``str``): the path to the test file
+
+        Returns:
+            ``otter.test_files.abstract_test.TestFile``: the test file
+        """
+        if self.template is None:
+            test_file = self.exception_class._from_compiled_code(self.code, path=path)
+            test_file.source = self.source
+            return test_file
+
+        test_file = copy.copy(self.template)
+        test_file.path = str(pathlib.Path(path).as_posix())
+        test_file.test_cases = list(self.template.test_cases)
+        test_file.test_case_results = []
+        test_file._score = None
+        return test_file
+
+
+def get_file_key(path):
+    """
+    Get the values used to determine whether a file has changed since it was cached.
+
+    Args:
+        path (``str``): the path to the file
+
+    Returns:
+        ``tuple[int, int]``: the modification time in nanoseconds and size of the file
+    """
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _parse_test_file(path, key):
+    """
+    Read, compile, and execute a test file once and create a cache entry for it.
+
+    Args:
+        path (``str``): the path to the test file
+        key (``tuple[int, int]``): the modification time and size of the file
+
+    Returns:
+        ``CachedTestFile``: the cache entry
+    """
+    with open(path) as f:
+        source = f.read()
+
+    code = compile(source, path, "exec")
+    env = {}
+    exec(code, env)
+
+    if OK_FORMAT_VARNAME not in env:
+        raise RuntimeError(f"Malformed test file: does not define the global variable '{OK_FORMAT_VARNAME}'")
+
+    if env[OK_FORMAT_VARNAME]:
+        template = OKTestFile.from_spec(env["test"], path=path)
+        template.get_examples()
+
+    else:
+        # parse the test file to validate it, but keep only the code so each copy gets new globals
+        ExceptionTestFile._from_env(env, path=path)
+        template = None
+
+    return CachedTestFile(key, source, code, template)
+
+
+def parse_test_file(path):
+    """
+    Read, compile, and parse a Python test file without adding it to the cache.
+
+    Args:
+        path (``str``): the path to the test file
+
+    Returns:
+        ``CachedTestFile``: the parsed test file, keyed by the file's current modification time and
+        size
+    """
+    return _parse_test_file(path, get_file_key(path))
+
+
+def load_test_file(path):
+    """
+    Load a Python test file, reading and parsing it only if it isn't in the cache or has changed
+    (by modification time or size) since it was cached.
+
+    Each call returns a new ``TestFile`` with its own result state, so the returned test files can
+    be run and graded independently of each other.
+
+    Args:
+        path (``str``): the path to the test file
+
+    Returns:
+        ``otter.test_files.abstract_test.TestFile``: the test file
+    """
+    abspath = os.path.abspath(path)
+    key = get_file_key(abspath)
+
+    with _cache_lock:
+        entry = _cache.get(abspath)
+
+    if entry is None or entry.key != key:
+        entry = _parse_test_file(path, key)
+        add_test_file(path, entry)
+
+    return entry.new_test_file(path)
+
+
+def add_test_file(path, entry):
+    """
+    Add a parsed test file to the cache, replacing any entry for the same path. The entry is used
+    by ``load_test_file`` as long as its key matches the file's current key (see
+    ``get_file_key``).
+
+    Args:
+        path (``str``): the path to the test file
+        entry (``CachedTestFile``): the parsed test file
+    """
+    with _cache_lock:
+        _cache[os.path.abspath(path)] = entry
+
+
+class _NotebookTestIndex:
+    """
+    The tests in the metadata of a notebook, each of which is parsed into a cache entry the first
+    time it is loaded.
+
+    Args:
+        key (``tuple[int, int]``): the modification time and size of the notebook when it was read
+        ok_format (``bool``): whether the tests are OK-formatted
+        specs (``dict[str, object]``): the unparsed tests, keyed by name
+    """
+
+    def __init__(self, key, ok_format, specs):
+        self.key = key
+        self.ok_format = ok_format
+        self.specs = specs
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get_entry(self, path, test_name):
+        """
+        Get the cache entry for a test, parsing it if it hasn't been parsed yet.
+
+        Args:
+            path (``str``): the path to the notebook
+            test_name (``str``): the name of the test
+
+        Returns:
+            ``CachedTestFile``: the cache entry
+
+        Raises:
+            ``ValueError``: if the notebook has no test named ``test_name``
+        """
+        with self.lock:
+            entry = self.entries.get(test_name)
+            if entry is not None:
+                return entry
+
+            if test_name not in self.specs:
+                raise ValueError(f"Test {test_name} not found")
+
+            spec = self.specs[test_name]
+            if self.ok_format:
+                template = NotebookMetadataOKTestFile.from_spec(spec, path=path)
+                template.get_examples()
+                entry = CachedTestFile(self.key, None, None, template)
+
+            else:
+                code = NotebookMetadataExceptionTestFile._compile_string(spec, path=path)
+                NotebookMetadataExceptionTestFile._from_compiled_code(code, path=path)
+                entry = CachedTestFile(
+                    self.key, spec, code, None, exception_class=NotebookMetadataExceptionTestFile)
+
+            self.entries[test_name] = entry
+            return entry
+
+
+def _read_notebook_tests(path, key):
+    """
+    Read the tests in the metadata of a notebook.
+
+    Args:
+        path (``str``): the path to the notebook
+        key (``tuple[int, int]``): the modification time and size of the notebook
+
+    Returns:
+        ``_NotebookTestIndex``: the index of the tests
+    """
+    with open(path, encoding="utf-8") as f:
+        nb = json.load(f)
+
+    metadata = nb["metadata"][NOTEBOOK_METADATA_KEY]
+    return _NotebookTestIndex(key, metadata[OK_FORMAT_VARNAME], metadata.get("tests", {}))
+
+
+def load_notebook_test_file(path, test_name):
+    """
+    Load a test from the metadata of a notebook.
+
+    The notebook is only read if it isn't in the cache or has changed (by modification time or
+    size) since it was cached, and each test is only parsed the first time it is loaded, so checking
+    all of the questions in a notebook reads it once.
+
+    Args:
+        path (``str``): the path to the notebook
+        test_name (``str``): the name of the test
+
+    Returns:
+        ``otter.test_files.abstract_test.TestFile``: the test file
+    """
+    abspath = os.path.abspath(path)
+    key = get_file_key(abspath)
+
+    with _cache_lock:
+        index = _notebook_cache.get(abspath)
+
+    if index is None or index.key != key:
+        index = _read_notebook_tests(path, key)
+        with _cache_lock:
+            _notebook_cache[abspath] = index
+
+    return index.get_entry(path, test_name).new_test_file(path)
+
+
+def clear_test_file_cache():
+    """
+    Remove all test files and notebook tests from the cache.
+    """
+    with _cache_lock:
+        _cache.clear()
+        _notebook_cache.clear()
@@ -2,6 +2,7 @@
 
 import inspect
 import pathlib
+import time
 
 from dataclasses import replace
 from functools import lru_cache
@@ -165,12 +166,14 @@ class ExceptionTestFile(TestFile):
         for tc in self.test_cases:
             test_case = tc.body
             passed, message = True, "✅ Test case passed"
+            start = time.perf_counter()
             try:
                 test_case.call_func(global_environment)
             except Exception as e:
                 passed, message = False, "❌ Test case failed\n" + self._generate_error_message(e)
 
-            test_case_results.append(TestCaseResult(test_case=tc, message=message, passed=passed))
+            test_case_results.append(TestCaseResult(
+                test_case=tc, message=message, passed=passed, run_time=time.perf_counter() - start))
 
         self.test_case_results = test_case_results
 
@@ -202,7 +205,21 @@ class ExceptionTestFile(TestFile):
         """
         env = {}
         exec(code, env)
+        return cls._from_env(env, path=path)
 
+    @classmethod
+    def _from_env(cls, env, path=""):
+        """
+        Parse the global environment of an executed exception-based test file and return an
+        ``ExceptionTestFile``.
+
+        Args:
+            env (``dict``): the global environment of the executed test file
+            path (``str``): the path to the test file
+
+        Returns:
+            ``ExceptionTestFile``: the new ``ExceptionTestFile`` object created from the given file
+        """
         if "name" not in env:
             raise ValueError(f"Test file {path} does not define 'name'")
 
@@ -219,7 +236,8 @@ class ExceptionTestFile(TestFile):
         test_cases = cls.resolve_test_file_points(points, test_cases)
 
         path = str(pathlib.Path(path).as_posix())
-        return cls(name, path, test_cases, all_or_nothing=False)
+        return cls(
+            name, path, test_cases, all_or_nothing=False, depends_on=env.get("depends_on"))
 
     @classmethod
     def from_string(cls, s, path="<string>"):
@@ -234,7 +252,7 @@ class ExceptionTestFile(TestFile):
             ``ExceptionTestFile``: the new ``ExceptionTestFile`` object created from the given file
         """
         code = cls._compile_string(s, path=path)
-        instc = cls._from_compiled_code(s, path=path)
+        instc = cls._from_compiled_code(code, path=path)
         instc.source = s
         return instc
 
@@ -3,55 +3,154 @@
 import os
 import io
 import doctest
+import threading
+import time
 import warnings
 import pathlib
 
-from contextlib import redirect_stderr, redirect_stdout
 from textwrap import dedent
 
 from .abstract_test import TestFile, TestCase, TestCaseResult
 from ..utils import hide_outputs
 
 
-def run_doctest(name, doctest_string, global_environment):
+_PARSER = doctest.DocTestParser()
+
+# doctest.DocTestRunner.run replaces sys.stdout and sys.displayhook for the whole process, so
+# doctests are run one at a time to make sure that each run restores the objects it replaced
+_RUN_LOCK = threading.RLock()
+
+
+def parse_doctest_examples(name, doctest_string):
     """
-    Run a single test with given ``global_environment``. Returns ``(True, '')`` if the doctest passes. 
-    Returns ``(False, failure_message)`` if the doctest fails.
+    Parse the examples in a doctest.
 
     Args:
         name (``str``): name of doctest
         doctest_string (``str``): doctest in string form
-        global_environment (``dict``): global environment resulting from the execution of a python 
-            script/notebook
 
     Returns:
-        ``tuple`` of (``bool``, ``str``): results from running the test
+        ``list`` of ``doctest.Example``: the examples in the doctest
     """
-    examples = doctest.DocTestParser().parse(
+    examples = _PARSER.parse(
         doctest_string,
         name
     )
-    test = doctest.DocTest(
-        [e for e in examples if isinstance(e, doctest.Example)],
-        global_environment,
-        name,
-        None,
-        None,
-        doctest_string
-    )
+    return [e for e in examples if isinstance(e, doctest.Example)]
+
+
+class _DeferredReport:
+    """
+    A stream that collects the verbose report of a doctest run, deferring the formatting of the
+    parts of the report that are only needed if the test fails.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, s):
+        self.parts.append(s)
+
+    def flush(self):
+        pass
+
+    def defer(self, report, *args):
+        """
+        Add a part of the report that is written by calling ``report`` with a write function
+        followed by ``args``.
+        """
+        self.parts.append((report, args))
+
+    def getvalue(self):
+        """
+        Format the report.
+
+        Returns:
+            ``str``: the report
+        """
+        out = io.StringIO()
+        for part in self.parts:
+            if isinstance(part, str):
+                out.write(part)
+            else:
+                report, args = part
+                report(out.write, *args)
+
+        return out.getvalue()
+
+
+class _DeferredReportRunner(doctest.DocTestRunner):
+    """
+    A verbose ``doctest.DocTestRunner`` that defers the reports of examples that are started or
+    succeed to a ``_DeferredReport``, so that the report of a test that passes is never formatted.
+    The report is otherwise identical to that of ``doctest.DocTestRunner``.
+
+    Attributes:
+        report (``_DeferredReport``): the report of the current run
+    """
+
+    def __init__(self):
+        super().__init__(verbose=True)
+        self.report = _DeferredReport()
+
+    def report_start(self, out, test, example):
+        self.report.defer(super().report_start, test, example)
+
+    def report_success(self, out, test, example, got):
+        self.report.defer(super().report_success, test, example, got)
+
 
-    doctestrunner = doctest.DocTestRunner(verbose=True)
+def _run_examples(runner, name, doctest_string, global_environment, examples):
+    """
+    Run the examples of a doctest with a ``_DeferredReportRunner``.
+
+    Args:
+        runner (``_DeferredReportRunner``): the runner
+        name (``str``): name of doctest
+        doctest_string (``str``): doctest in string form
+        global_environment (``dict``): the environment to run the examples in
+        examples (``list`` of ``doctest.Example``): the examples
+
+    Returns:
+        ``tuple`` of (``bool``, ``str``): results from running the test
+    """
+    from ..execute.context import redirect_output
+
+    test = doctest.DocTest(examples, global_environment, name, None, None, doctest_string)
+
+    runner.report = _DeferredReport()
+    with _RUN_LOCK, redirect_output(runner.report):
+        result = runner.run(test, out=runner.report.write, clear_globs=False)
 
-    runresults = io.StringIO()
-    with redirect_stdout(runresults), redirect_stderr(runresults), hide_outputs():
-        doctestrunner.run(test, clear_globs=False)
-    with open(os.devnull, 'w') as f, redirect_stderr(f), redirect_stdout(f):
-        result = doctestrunner.summarize(verbose=True)
     # An individual test can only pass or fail
     if result.failed == 0:
         return (True, '')
     else:
-        return False, runresults.getvalue()
+        return False, runner.report.getvalue()
+
+
+def run_doctest(name, doctest_string, global_environment, examples=None):
+    """
+    Run a single test with given ``global_environment``. Returns ``(True, '')`` if the doctest passes. 
+    Returns ``(False, failure_message)`` if the doctest fails.
+
+    Args:
+        name (``str``): name of doctest
+        doctest_string (``str``): doctest in string form
+        global_environment (``dict``): global environment resulting from the execution of a python 
+            script/notebook
+        examples (``list`` of ``doctest.Example``, optional): the examples in ``doctest_string``, if
+            already parsed
+
+    Returns:
+        ``tuple`` of (``bool``, ``str``): results from running the test
+    """
+    if examples is None:
+        examples = parse_doctest_examples(name, doctest_string)
+
+    with hide_outputs():
+        return _run_examples(
+            _DeferredReportRunner(), name, doctest_string, global_environment, examples)
 
 
 class OKTestFile(TestFile):
@@ -79,6 +178,24 @@ class OKTestFile(TestFile):
         grade (``float``): the percentage of ``points`` earned for this test file as a decimal
     """
 
+    _examples = None
+
+    def get_examples(self):
+        """
+        Get the parsed doctest examples of each test case, parsing them the first time this method
+        is called.
+
+        Returns:
+            ``list`` of ``list`` of ``doctest.Example``: the examples of each test case in
+            ``self.test_cases``
+        """
+        if self._examples is None:
+            self._examples = [
+                parse_doctest_examples(self.name + ' ' + str(i), tc.body)
+                    for i, tc in enumerate(self.test_cases)
+            ]
+        return self._examples
+
     def run(self, global_environment):
         """
         Run the test cases on ``global_environment``, saving the results in 
@@ -87,18 +204,26 @@ class OKTestFile(TestFile):
         Arguments:
             ``global_environment`` (``dict``): result of executing a Python notebook/script
         """
-        for i, test_case in enumerate(self.test_cases):
-            passed, result = run_doctest(self.name + ' ' + str(i), test_case.body, global_environment)
-            if passed:
-                result = '✅ Test case passed'
-            else:
-                result = '❌ Test case failed\n' + result
-
-            self.test_case_results.append(TestCaseResult(
-                test_case = test_case,
-                message = result,
-                passed = passed,
-            ))
+        examples = self.get_examples()
+        runner = _DeferredReportRunner()
+        with hide_outputs():
+            for i, test_case in enumerate(self.test_cases):
+                start = time.perf_counter()
+                passed, result = _run_examples(
+                    runner, self.name + ' ' + str(i), test_case.body, global_environment,
+                    examples[i])
+                run_time = time.perf_counter() - start
+                if passed:
+                    result = '✅ Test case passed'
+                else:
+                    result = '❌ Test case failed\n' + result
+
+                self.test_case_results.append(TestCaseResult(
+                    test_case = test_case,
+                    message = result,
+                    passed = passed,
+                    run_time = run_time,
+                ))
 
     @classmethod
     def from_spec(cls, test_spec, path=""):
@@ -148,7 +273,9 @@ class OKTestFile(TestFile):
         # grab whether the tests are all-or-nothing
         all_or_nothing = test_spec.get('all_or_nothing', True)
 
-        return cls(test_spec['name'], path, test_cases, all_or_nothing)
+        return cls(
+            test_spec['name'], path, test_cases, all_or_nothing,
+            depends_on=test_spec.get('depends_on'))
 
     @classmethod
     def from_file(cls, path):
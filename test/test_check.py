@@ -3,6 +3,7 @@
 import contextlib
 import os
 import pytest
+import shutil
 
 from glob import glob
 from io import StringIO
@@ -10,6 +11,7 @@ from textwrap import dedent
 from unittest import mock
 
 from otter.check import main as check
+from otter.check.logs import Log
 
 from .utils import TestFileManager
 
@@ -139,3 +141,34 @@ def test_otter_check_notebook():
                     q4 results: All test cases passed!
                     q5 results: All test cases passed!"""), \
                 "Did not pass correct tests"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_otter_check_many_files(jobs, tmp_path):
+    """
+    Checks that many files can be checked at once, with each file's checks in its own log
+    """
+    for file in ["file0.py", "test-nb.ipynb"]:
+        shutil.copy(FILE_MANAGER.get_path(file), tmp_path)
+    with open(tmp_path / "notes.txt", "w") as f:
+        f.write("not a submission")
+
+    output = StringIO()
+    with contextlib.redirect_stdout(output):
+        # files included more than once are only checked once
+        check(
+            str(tmp_path), str(tmp_path / "file0.py"), tests_path=FILE_MANAGER.get_path("tests"),
+            jobs=jobs)
+
+    file0, test_nb = str(tmp_path / "file0.py"), str(tmp_path / "test-nb.ipynb")
+    width = len(test_nb)
+    assert output.getvalue() == dedent(f"""\
+        {"File":<{width}}  Score  Percent
+        {file0:<{width}}  4.5/5  90.00%
+        {test_nb:<{width}}  4.5/5  90.00%
+        """)
+
+    assert not os.path.exists(".OTTER_LOG")
+    for stem in ["file0", "test-nb"]:
+        log = Log.from_file(str(tmp_path / f"{stem}.OTTER_LOG"))
+        assert len(log.entries) == 1 and log.entries[0].success
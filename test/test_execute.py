@@ -0,0 +1,613 @@
+"""Tests for ``otter.execute``"""
+
+import csv
+import nbformat as nbf
+import os
+import pytest
+import shutil
+import socket
+import sys
+import threading
+import time
+import types
+
+from glob import glob
+from io import StringIO
+from textwrap import dedent
+from unittest import mock
+
+from otter.execute import grade_notebook
+from otter.check.notebook import Notebook
+from otter.execute import Checker
+from otter.execute.capture import BoundedBuffer, OutputCapture
+from otter.execute.context import (
+    get_grading_context, GradingContext, redirect_output, use_grading_context)
+from otter.check.logs import EventType, Log, LogEntry
+from otter.check.shelf import decompress_blob
+from otter.execute.execute_log import execute_log
+from otter.execute.execute_notebook import execute_notebook
+from otter.execute.headless import headless_mode
+from otter.execute.parallel import can_fork, run_test_files
+from otter.execute.stubs import install_stubs, StubbedCallError
+from otter.execute.transforms import filter_ignored_cells, load_notebook_code
+from otter.execute.dependencies import filter_unused_cells
+from otter.run.run_autograder.autograder_config import AutograderConfig
+from otter.test_files import create_test_file, OKTestFile
+
+from .utils import TestFileManager
+
+
+FILE_MANAGER = TestFileManager("test/test-check")
+TESTS_DIR = FILE_MANAGER.get_path("tests")
+TESTS_GLOB = glob(FILE_MANAGER.get_path("tests/*.py"))
+
+
+@pytest.fixture
+def unused_cells_nb():
+    nb = nbf.v4.new_notebook()
+    nb.cells = [
+        nbf.v4.new_code_cell("import numpy as np"),
+        nbf.v4.new_code_cell("def helper(x):\n    return x ** 2"),
+        nbf.v4.new_code_cell("def square(x):\n    return helper(x)"),
+        nbf.v4.new_code_cell("x = np.arange(10)\nbig = x.sum()"),
+        nbf.v4.new_markdown_cell("# Negation"),
+        nbf.v4.new_code_cell("%matplotlib inline\ndef negate(x):\n    return not x"),
+        nbf.v4.new_code_cell("print(square(3))"),
+    ]
+    return nb
+
+
+def test_filter_unused_cells(unused_cells_nb):
+    nb, skipped = filter_unused_cells(unused_cells_nb, TESTS_GLOB, TESTS_DIR)
+    assert skipped == [0, 3, 6]
+    assert [c.source for c in nb.cells] == [unused_cells_nb.cells[i].source for i in (1, 2, 4, 5)]
+
+    # a check in the notebook keeps the cells its test depends on
+    unused_cells_nb.cells.append(nbf.v4.new_code_cell("grader.check('q1')"))
+    unused_cells_nb.cells.insert(0, nbf.v4.new_code_cell("import otter\ngrader = otter.Notebook()"))
+    _, skipped = filter_unused_cells(unused_cells_nb, TESTS_GLOB, TESTS_DIR)
+    assert skipped == [1, 4, 7]
+
+    # cells that modify a needed name and cells whose effects can't be determined are kept
+    unused_cells_nb.cells.append(nbf.v4.new_code_cell("import random\nrandom.shuffle(negate)"))
+    unused_cells_nb.cells.append(nbf.v4.new_code_cell("exec('y = 1')"))
+    unused_cells_nb.cells.append(nbf.v4.new_code_cell("from foo import *"))
+    unused_cells_nb.cells.append(nbf.v4.new_code_cell("z = 2"))
+    _, skipped = filter_unused_cells(unused_cells_nb, TESTS_GLOB, TESTS_DIR)
+    assert skipped == [1, 4, 7, 12]
+
+
+def test_grade_notebook_skip_unused_cells(unused_cells_nb, tmp_path):
+    nb_path = tmp_path / "nb.ipynb"
+    nbf.write(unused_cells_nb, str(nb_path))
+
+    results = grade_notebook(
+        str(nb_path), tests_glob=TESTS_GLOB, test_dir=TESTS_DIR, skip_unused_cells=True)
+
+    assert results.skipped_cells == [0, 3, 6]
+    assert results.get_score("q4") == results.get_result("q4").possible
+    assert results.get_score("q5") == results.get_result("q5").possible
+
+
+def test_skip_unused_cells_aliases(tmp_path):
+    test_path = tmp_path / "q1.py"
+    test_path.write_text(dedent("""\
+        OK_FORMAT = True
+
+        test = {
+            "name": "q1",
+            "points": 1,
+            "suites": [{"cases": [{"code": ">>> list(df.columns)\\n['a', 'b']\\n>>> x\\n[1]"}]}],
+        }
+    """))
+
+    nb = nbf.v4.new_notebook()
+    nb.cells = [
+        nbf.v4.new_code_cell("import pandas as pd\ndf = pd.DataFrame({'a': [1]})"),
+        nbf.v4.new_code_cell("tmp = df"),
+        nbf.v4.new_code_cell("tmp['b'] = 2"),
+        nbf.v4.new_code_cell("x = []"),
+        nbf.v4.new_code_cell("a = b = x\nc, d = a, 1"),
+        nbf.v4.new_code_cell("c.append(1)"),
+        nbf.v4.new_code_cell("unused = df.copy()\nunused['c'] = 3"),
+    ]
+
+    # cells that modify an alias of a needed name are kept, with the cells defining the alias
+    _, skipped = filter_unused_cells(nb, [str(test_path)], str(tmp_path))
+    assert skipped == [6]
+
+    nb_path = tmp_path / "nb.ipynb"
+    nbf.write(nb, str(nb_path))
+
+    results = grade_notebook(
+        str(nb_path), tests_glob=[str(test_path)], test_dir=str(tmp_path), skip_unused_cells=True)
+
+    assert results.skipped_cells == [6]
+    assert results.get_score("q1") == 1
+
+def test_grade_notebook_removed_cells_keep_indices(unused_cells_nb, tmp_path):
+    unused_cells_nb.cells[2].source += "\nprint('square')"
+    unused_cells_nb.cells.insert(0, nbf.v4.new_code_cell(
+        "print('ignored')", metadata={"tags": ["otter_ignore"]}))
+    nb_path = tmp_path / "nb.ipynb"
+    nbf.write(unused_cells_nb, str(nb_path))
+
+    results = grade_notebook(
+        str(nb_path), tests_glob=TESTS_GLOB, test_dir=TESTS_DIR, skip_unused_cells=True,
+        profile=True, output_capture=OutputCapture())
+
+    # captured outputs and timings are labeled by the cells' indices in the original notebook
+    assert results.skipped_cells == [1, 4, 7]
+    assert [t.name for t in results.timings if t.kind == "cell"] == ["2", "3", "6"]
+    assert results.cell_outputs == {"3": "square\n"}
+
+def test_grade_notebook_checkpoints(unused_cells_nb, tmp_path):
+    nb_path, tests_dir, checkpoint_dir = tmp_path / "nb.ipynb", tmp_path / "tests", tmp_path / "ckpts"
+    nbf.write(unused_cells_nb, str(nb_path))
+    shutil.copytree(TESTS_DIR, str(tests_dir))
+    tests_glob = sorted(glob(str(tests_dir / "*.py")))
+
+    results = grade_notebook(
+        str(nb_path), tests_glob=tests_glob, test_dir=str(tests_dir),
+        checkpoint_dir=str(checkpoint_dir), tests_only=True)
+
+    assert not results.from_checkpoint
+    assert results.unshelved_variables == []
+    assert len(os.listdir(checkpoint_dir)) == 1
+
+    # make q4 fail and check that only q4 is rerun against the restored environment
+    q4_path = tests_dir / "q4.py"
+    q4_path.write_text(q4_path.read_text().replace("25", "26"))
+
+    with mock.patch("otter.execute.execute_notebook") as mocked_execute, \
+            mock.patch("otter.execute.create_test_file", wraps=create_test_file) as mocked_create:
+        results = grade_notebook(
+            str(nb_path), tests_glob=tests_glob, test_dir=str(tests_dir),
+            checkpoint_dir=str(checkpoint_dir), tests_only=True)
+
+        mocked_execute.assert_not_called()
+        mocked_create.assert_called_once_with(str(q4_path))
+
+    assert results.from_checkpoint
+    assert results.get_score("q4") == 0
+    assert results.get_score("q5") == results.get_result("q5").possible
+
+    # without tests_only, the submission is re-executed
+    with mock.patch("otter.execute.execute_notebook", wraps=execute_notebook) as mocked_execute:
+        results = grade_notebook(
+            str(nb_path), tests_glob=tests_glob, test_dir=str(tests_dir),
+            checkpoint_dir=str(checkpoint_dir))
+
+        mocked_execute.assert_called_once()
+
+    assert not results.from_checkpoint
+    assert results.get_score("q4") == 0
+
+
+@pytest.mark.skipif(not can_fork(), reason="os.fork is not available")
+def test_run_test_files_forked(tmp_path):
+    test_template = dedent("""\
+        OK_FORMAT = True
+
+        test = {{
+            "name": "{name}",
+            "points": 1,
+            "suites": [{{"cases": [{{"code": {code!r}, "hidden": False, "locked": False}}]}}],
+        }}
+        """)
+
+    # each test modifies the shared environment, so the second test run in the same environment
+    # would fail
+    paths = []
+    for name in ["qa", "qb"]:
+        paths.append(str(tmp_path / f"{name}.py"))
+        code = ">>> x.append(1)\n>>> len(x)\n1\n"
+        with open(paths[-1], "w") as f:
+            f.write(test_template.format(name=name, code=code))
+
+    env = {"x": []}
+    test_files = [create_test_file(p) for p in paths]
+    run_test_files(test_files, env, workers=2)
+
+    assert all(tf.passed_all for tf in test_files)
+    assert env["x"] == []
+
+    test_files = [create_test_file(p) for p in paths]
+    run_test_files(test_files, env, workers=1)
+
+    assert [tf.passed_all for tf in test_files] == [True, False]
+    assert env["x"] == [1, 1]
+
+
+def test_grade_notebook_prerequisites(tmp_path):
+    test_template = dedent("""\
+        OK_FORMAT = True
+
+        test = {{
+            "name": "{name}",
+            "depends_on": {depends_on!r},
+            "suites": [{{"cases": [{{"code": ">>> x == {value}\\nTrue", "hidden": False}}]}}],
+        }}
+        """)
+
+    # qa fails, so qb (which names its prerequisite with a string) and qc (which depends on qb) are
+    # skipped; qe runs after its prerequisite qd
+    paths = []
+    for name, depends_on, value in [
+            ("qc", ["qb"], 1), ("qb", "qa", 1), ("qa", [], 2), ("qe", ["qd"], 1), ("qd", [], 1)]:
+        paths.append(str(tmp_path / f"{name}.py"))
+        with open(paths[-1], "w") as f:
+            f.write(test_template.format(name=name, depends_on=depends_on, value=value))
+
+    nb = nbf.v4.new_notebook()
+    nb.cells = [nbf.v4.new_code_cell("x = 1")]
+    nb_path = tmp_path / "nb.ipynb"
+    nbf.write(nb, str(nb_path))
+
+    with mock.patch.object(OKTestFile, "run", autospec=True, side_effect=OKTestFile.run) as mocked_run:
+        results = grade_notebook(str(nb_path), tests_glob=paths, skip_failed_prerequisites=True)
+        assert [c.args[0].name for c in mocked_run.call_args_list] == ["qa", "qd", "qe"]
+
+    assert results.skipped_tests == ["qb", "qc"]
+    assert [results.get_score(n) for n in ["qa", "qb", "qc", "qd", "qe"]] == [0, 0, 0, 1, 1]
+    assert "prerequisite test(s) qb did not pass" in results.get_result("qc").summary()
+
+    results = grade_notebook(str(nb_path), tests_glob=paths)
+    assert results.skipped_tests == [] and results.get_score("qc") == 1
+
+    # checks in the notebook are skipped too
+    context = GradingContext(skip_failed_prerequisites=True)
+    with use_grading_context(context):
+        tests = [Checker.check(str(tmp_path / f"{n}.py"), global_env={"x": 1}) for n in ["qa", "qb"]]
+    assert [t.skipped for t in tests] == [False, True] and context.results == tests
+
+
+def test_execute_log_unshelves_tested_variables(tmp_path):
+    tests_dir = tmp_path / "tests"
+    tests_dir.mkdir()
+    for name, code in [("q1", "f(2)"), ("q2", "y")]:
+        with open(tests_dir / f"{name}.py", "w") as f:
+            f.write(dedent(f"""\
+                OK_FORMAT = True
+
+                test = {{
+                    "name": "{name}",
+                    "suites": [{{"cases": [{{"code": ">>> {code}\\n4", "hidden": False}}]}}],
+                }}
+                """))
+
+    def f(x):
+        return x * base
+
+    log_path = str(tmp_path / ".OTTER_LOG")
+    for question in ["q1", "q2"]:
+        LogEntry(event_type=EventType.CHECK, question=question) \
+            .shelve({"base": 2, "f": f, "y": 4, "big": list(range(1000))}, filename=log_path) \
+            .flush_to_file(log_path)
+
+    # only the variables read by the tests (and by the functions they call) are unpickled, once
+    with mock.patch("otter.check.logs.decompress_blob", wraps=decompress_blob) as mocked_read:
+        env = execute_log(
+            nbf.v4.new_notebook(), Log.from_file(log_path), "check_results",
+            {"check_results": []}, test_dir=str(tests_dir))
+        assert mocked_read.call_count == 3
+
+    assert "big" not in env and env["base"] == 2
+    assert [t.passed_all for t in env["check_results"]] == [True, True]
+
+    env = execute_log(
+        nbf.v4.new_notebook(), Log.from_file(log_path), "check_results",
+        {"check_results": []}, test_dir=str(tests_dir), variables={"y": "builtins.int"})
+    assert "f" not in env and "base" not in env and env["y"] == 4
+    assert [t.passed_all for t in env["check_results"]] == [False, True]
+
+
+def test_grade_notebook_profile(unused_cells_nb, tmp_path):
+    nb_path = tmp_path / "nb.ipynb"
+    nbf.write(unused_cells_nb, str(nb_path))
+
+    results = grade_notebook(str(nb_path), tests_glob=TESTS_GLOB, test_dir=TESTS_DIR, profile=True)
+
+    cell_timings = [t for t in results.timings if t.kind == "cell"]
+    assert [t.name for t in cell_timings] == ["0", "1", "2", "3", "5", "6"]
+    assert all(t.wall_time >= 0 and t.peak_memory is not None for t in cell_timings)
+
+    test_case_timings = [t for t in results.timings if t.kind == "test_case"]
+    assert len(test_case_timings) == sum(len(tf.test_cases) for tf in results.results.values())
+
+    csv_path = tmp_path / "timings.csv"
+    results.write_timings_csv(str(csv_path))
+    with open(csv_path) as f:
+        rows = list(csv.reader(f))
+
+    assert rows[0] == ["kind", "name", "wall_time", "cpu_time", "peak_memory"]
+    assert len(rows) == len(results.timings) + 1
+
+    # timings are only included in the Gradescope results if profiling is configured
+    output = results.to_gradescope_dict(AutograderConfig())
+    assert "Execution Profile" not in [t["name"] for t in output["tests"]]
+
+    output = results.to_gradescope_dict(AutograderConfig({"profile": True}))
+    profile_test = [t for t in output["tests"] if t["name"] == "Execution Profile"][0]
+    assert profile_test["visibility"] == "hidden"
+    assert profile_test["output"] == results.timings_summary()
+
+    # timings aren't recorded unless profiling is enabled
+    results = grade_notebook(str(nb_path), tests_glob=TESTS_GLOB, test_dir=TESTS_DIR)
+    assert results.timings == []
+
+
+def test_headless_mode(tmp_path):
+    import IPython.display
+    import matplotlib.pyplot as plt
+
+    original_backend = plt.get_backend()
+    plt.switch_backend("pdf")
+
+    show, display = plt.show, IPython.display.display
+    with headless_mode([str(tmp_path / "allowed*")]) as stubs:
+        assert plt.show is not show
+        assert IPython.display.display is not display and IPython.display.display() is None
+        assert plt.get_backend().lower() == "agg"
+
+        plt.plot([1, 2, 3])
+        plt.savefig(str(tmp_path / "fig.png"))
+        plt.savefig(str(tmp_path / "allowed.png"))
+        plt.close("all")
+
+    assert not (tmp_path / "fig.png").exists()
+    assert (tmp_path / "allowed.png").exists()
+    assert plt.show is show and IPython.display.display is display
+
+    # the original backend is restored when the context exits
+    assert plt.get_backend() == "pdf"
+    plt.switch_backend(original_backend)
+
+    nb = nbf.v4.new_notebook()
+    nb.cells = [nbf.v4.new_code_cell(dedent(f"""\
+        import matplotlib.pyplot as plt
+        plt.plot([1, 2, 3])
+        plt.savefig(r"{tmp_path / 'nb.png'}")
+        plt.show()
+        display(plt.gcf())
+        def square(x):
+            return x ** 2
+    """))]
+    nb_path = tmp_path / "nb.ipynb"
+    nbf.write(nb, str(nb_path))
+
+    results = grade_notebook(
+        str(nb_path), tests_glob=[FILE_MANAGER.get_path("tests/q4.py")], headless=True)
+
+    assert results.get_score("q4") == 1
+    assert not (tmp_path / "nb.png").exists()
+
+
+def test_install_stubs():
+    stubs = {
+        "time.sleep": "noop",
+        "input": "raise",
+        "socket.create_connection": "offline",
+        "os.path.basename": "passthrough",
+        "tqdm.tqdm": "identity",
+        "not_a_module.foo": "noop",
+    }
+    with install_stubs(stubs) as counts:
+        assert time.sleep(100) is None
+        assert time.sleep(100) is None
+
+        with pytest.raises(StubbedCallError):
+            input()
+
+        with pytest.raises(ConnectionError):
+            socket.create_connection(("example.com", 80))
+
+        assert os.path.basename("foo/bar") == "bar"
+
+        import tqdm
+        assert tqdm.tqdm([1]) == [1]
+
+    assert counts == {
+        "time.sleep": 2, "input": 1, "socket.create_connection": 1, "os.path.basename": 1,
+        "tqdm.tqdm": 1,
+    }
+    assert time.sleep.__module__ == "time"
+
+    with pytest.raises(ValueError, match="Invalid stub action for time.sleep: foo"):
+        with install_stubs({"time.sleep": "foo"}):
+            pass
+
+
+def test_grade_notebook_stubs(tmp_path):
+    nb = nbf.v4.new_notebook()
+    nb.cells = [
+        nbf.v4.new_code_cell("import time\ntime.sleep(60)\nname = input()"),
+        nbf.v4.new_code_cell("def square(x):\n    return x ** 2"),
+    ]
+    nb_path = tmp_path / "nb.ipynb"
+    nbf.write(nb, str(nb_path))
+
+    results = grade_notebook(
+        str(nb_path), tests_glob=[FILE_MANAGER.get_path("tests/q4.py")],
+        stubs={"time.sleep": "noop", "input": "raise"})
+
+    assert results.get_score("q4") == 1
+    assert results.stub_calls == {"time.sleep": 1, "input": 1}
+
+
+def test_load_notebook_code(unused_cells_nb, tmp_path):
+    unused_cells_nb.cells[1].outputs = [nbf.v4.new_output("stream", text="x" * 10000)]
+    unused_cells_nb.cells[4].attachments = {"img.png": {"image/png": "abc"}}
+    unused_cells_nb.cells[5].metadata = {"tags": ["otter_ignore"], "otter": {"tests": ["q1"]}}
+    nb_path = tmp_path / "nb.ipynb"
+    nbf.write(unused_cells_nb, str(nb_path))
+
+    nb = load_notebook_code(str(nb_path))
+
+    assert len(nb.cells) == len(unused_cells_nb.cells)
+    for cell, orig in zip(nb.cells, unused_cells_nb.cells):
+        assert cell.cell_type == orig.cell_type
+        assert cell.metadata == orig.metadata
+        assert "attachments" not in cell
+        if cell.cell_type == "code":
+            assert cell.source == orig.source
+            assert cell.outputs == []
+        else:
+            assert cell.source == ""
+
+    filtered = filter_ignored_cells(nb)
+    assert len(filtered.cells) == len(nb.cells) - 1
+    assert len(nb.cells) == len(unused_cells_nb.cells)
+
+
+def test_output_capture(tmp_path):
+    buffer = BoundedBuffer(10)
+    for _ in range(5):
+        buffer.write("abcd")
+    assert buffer.getvalue() == "[10 characters truncated]\ncdabcdabcd"
+    buffer.write("x" * 20)
+    assert buffer.getvalue() == "[30 characters truncated]\n" + "x" * 10
+
+    capture = OutputCapture(cell_limit=100, total_limit=150)
+    for i in range(3):
+        with capture.capture_cell(str(i)):
+            print("x" * 60, end="")
+
+    assert capture.outputs == {"1": "x" * 60, "2": "x" * 60}
+    assert capture.dropped_cells == 1
+
+    capture = OutputCapture()
+    with pytest.raises(ValueError):
+        with capture.capture_cell("0"):
+            print("error")
+            raise ValueError()
+
+    assert capture.outputs["0"].startswith("error\nTraceback")
+    assert "ValueError" in capture.outputs["0"]
+
+    nb = nbf.v4.new_notebook()
+    nb.cells = [
+        nbf.v4.new_code_cell("for i in range(20000):\n    print(i)"),
+        nbf.v4.new_code_cell("def square(x):\n    return x ** 2\n1 / 0"),
+    ]
+    nb_path = tmp_path / "nb.ipynb"
+    nbf.write(nb, str(nb_path))
+
+    results = grade_notebook(
+        str(nb_path), tests_glob=[FILE_MANAGER.get_path("tests/q4.py")],
+        output_capture=OutputCapture(cell_limit=1000))
+
+    assert results.get_score("q4") == 1
+    assert results.cell_outputs["0"].endswith("19999\n")
+    assert len(results.cell_outputs["0"]) < 1100
+    assert "ZeroDivisionError" in results.cell_outputs["1"]
+
+
+def test_grading_contexts_are_isolated():
+    barrier = threading.Barrier(2, timeout=10)
+    results, outputs = {}, {}
+
+    def grade(name):
+        output = StringIO()
+        with Notebook.grading_mode(tests_dir=name) as check_results, redirect_output(output):
+            print(name)
+
+            # wait until both threads are in grading mode
+            barrier.wait()
+            grader = Notebook()
+
+            Checker.check(FILE_MANAGER.get_path(f"tests/{name}.py"), global_env={})
+
+            barrier.wait()
+            results[name] = (grader._path, [tf.name for tf in check_results])
+            outputs[name] = output.getvalue()
+
+    threads = [threading.Thread(target=grade, args=(n,)) for n in ("q1", "q3")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {"q1": ("q1", ["q1"]), "q3": ("q3", ["q3"])}
+    assert outputs == {"q1": "q1\n", "q3": "q3\n"}
+    assert get_grading_context() is None
+
+
+def test_checker_without_grading_context():
+    path = FILE_MANAGER.get_path("tests/q1.py")
+
+    # results aren't tracked outside of grading mode unless tracking is enabled
+    Checker.check(path, global_env={})
+    assert Checker.get_results() == []
+
+    Checker.enable_tracking()
+    try:
+        test = Checker.check(path, global_env={})
+        assert Checker.get_results() == [test]
+
+    finally:
+        Checker.disable_tracking()
+        Checker.clear_results()
+
+    assert Checker.get_results() == []
+
+
+def test_concurrent_grading_with_headless_mode_and_stubs(tmp_path, monkeypatch):
+    import matplotlib.pyplot as plt
+
+    # the first submission finishes grading while the second is still being graded, so the
+    # contexts exit in the same order that they were entered
+    sync = types.ModuleType("otter_test_sync")
+    sync.first_started, sync.second_started = threading.Event(), threading.Event()
+    sync.first_done = threading.Event()
+    monkeypatch.setitem(sys.modules, "otter_test_sync", sync)
+
+    sources = {
+        "first": "sync.first_started.set()\nsync.second_started.wait(10)",
+        "second": "sync.second_started.set()\nsync.first_done.wait(10)",
+    }
+    results = {}
+
+    def grade(name):
+        nb = nbf.v4.new_notebook()
+        nb.cells = [
+            nbf.v4.new_code_cell(dedent(f"""\
+                import otter_test_sync as sync
+                import time
+                import matplotlib.pyplot as plt
+                {sources[name]}
+                time.sleep(60)
+                plt.plot([1, 2, 3])
+                plt.savefig(r"{tmp_path / name}.png")
+                plt.show()
+            """)),
+            nbf.v4.new_code_cell("def square(x):\n    return x ** 2"),
+        ]
+        nb_path = tmp_path / f"{name}.ipynb"
+        nbf.write(nb, str(nb_path))
+
+        results[name] = grade_notebook(
+            str(nb_path), tests_glob=[FILE_MANAGER.get_path("tests/q4.py")], headless=True,
+            savefig_allowlist=[str(tmp_path / "second*")], stubs={"time.sleep": "noop"})
+
+    first = threading.Thread(target=grade, args=("first",))
+    second = threading.Thread(target=grade, args=("second",))
+    show, sleep = plt.show, time.sleep
+
+    first.start()
+    assert sync.first_started.wait(10)
+    second.start()
+    first.join()
+    sync.first_done.set()
+    second.join()
+
+    # each stub only counted the calls of its own submission (whose source is run once per cell and
+    # again with the checks)
+    for name in ["first", "second"]:
+        assert results[name].get_score("q4") == 1
+        assert results[name].stub_calls == {"time.sleep": 2}
+
+    # each submission used its own allowlist, and the patches were removed after both finished
+    assert not (tmp_path / "first.png").exists()
+    assert (tmp_path / "second.png").exists()
+    assert plt.show is show and time.sleep is sleep
@@ -1,14 +1,20 @@
 """Tests for ``otter.check.logs``"""
 
+import dill
+import numpy as np
 import os
 import pytest
 import sys
 
 from sklearn.linear_model import LinearRegression
+from unittest import mock
 
+from otter.check.log_format import LOG_MAGIC, read_log_index, RecordType
+from otter.check.log_writer import BackgroundLogWriter
 from otter.check.logs import Log
 from otter.check.notebook import Notebook, _OTTER_LOG_FILENAME
-from otter.check.logs import LogEntry, EventType, Log
+from otter.check.shelf import serialize_variable
+from otter.check.logs import append_to_log, compact_log, LogEntry, EventType, Log
 
 from .utils import TestFileManager
 
@@ -149,3 +155,172 @@ def test_log_iter():
     assert log_iter.questions == ["q1", "q2"]
     assert next(log_iter).question == entry2.question
     assert next(log_iter).question == entry3.question
+
+
+def test_framed_log():
+    for question in ["q1", "q2", "q1"]:
+        LogEntry(event_type=EventType.CHECK, question=question).flush_to_file(_OTTER_LOG_FILENAME)
+
+    with open(_OTTER_LOG_FILENAME, "rb") as f:
+        assert f.read(len(LOG_MAGIC)) == LOG_MAGIC
+        records = read_log_index(f)
+
+    assert [(r.event_type, r.question) for r in records] == [("CHECK", "q1"), ("CHECK", "q2"), ("CHECK", "q1")]
+
+    # only the entries that are accessed are deserialized
+    with mock.patch("dill.loads", wraps=dill.loads) as mocked_loads:
+        log = Log.from_file(_OTTER_LOG_FILENAME)
+        assert log.get_questions() == ["q1", "q2"]
+        assert log.get_question_entry("q1").timestamp == records[2].timestamp
+        assert mocked_loads.call_count == 1
+
+    # a partially-written entry at the end of the log is ignored
+    with open(_OTTER_LOG_FILENAME, "ab") as f:
+        f.write(b"\x01\x00\x00")
+    assert len(Log.from_file(_OTTER_LOG_FILENAME).entries) == 3
+
+
+def test_legacy_log():
+    entries = [LogEntry(event_type=EventType.CHECK, question=q) for q in ["q1", "q2"]]
+    with open(_OTTER_LOG_FILENAME, "wb") as f:
+        dill.dump(entries[0], f)
+
+    # entries are appended to legacy logs in the legacy format
+    entries[1].flush_to_file(_OTTER_LOG_FILENAME)
+
+    log = Log.from_file(_OTTER_LOG_FILENAME, ascending=False)
+    assert [e.question for e in log] == ["q2", "q1"]
+    assert log.get_question_entry("q1").timestamp == entries[0].timestamp
+
+
+def test_superseded_shelves():
+    for num in range(3):
+        entry = LogEntry(event_type=EventType.CHECK, question="q1")
+        entry.shelve({"num": num}, delete=True, filename=_OTTER_LOG_FILENAME)
+        entry.flush_to_file(_OTTER_LOG_FILENAME)
+
+    LogEntry(event_type=EventType.CHECK, question="q2").shelve({"num": 3}, delete=True) \
+        .flush_to_file(_OTTER_LOG_FILENAME)
+
+    # superseded environments are ignored when reading the log
+    log = Log.from_file(_OTTER_LOG_FILENAME)
+    assert [e.shelf is not None for e in log] == [False, False, True, True]
+    assert log.get_question_entry("q1").unshelve() == {"num": 2}
+    assert [e.shelf is not None for e in LogEntry.log_from_file(_OTTER_LOG_FILENAME)] == \
+        [False, False, True, True]
+
+    size = os.path.getsize(_OTTER_LOG_FILENAME)
+    assert compact_log(_OTTER_LOG_FILENAME) == 2
+    assert os.path.getsize(_OTTER_LOG_FILENAME) < size
+    assert compact_log(_OTTER_LOG_FILENAME) == 0
+
+    log = Log.from_file(_OTTER_LOG_FILENAME)
+    assert [e.shelf is not None for e in log] == [False, False, True, True]
+    assert log.get_question_entry("q2").unshelve() == {"num": 3}
+
+    # legacy logs are rewritten in the framed format
+    os.remove(_OTTER_LOG_FILENAME)
+    with open(_OTTER_LOG_FILENAME, "wb") as f:
+        dill.dump(LogEntry(event_type=EventType.CHECK, question="q1").shelve({"num": 0}), f)
+        dill.dump(
+            LogEntry(event_type=EventType.CHECK, question="q1").shelve({"num": 1}, delete=True), f)
+
+    assert compact_log(_OTTER_LOG_FILENAME) == 1
+    with open(_OTTER_LOG_FILENAME, "rb") as f:
+        assert f.read(len(LOG_MAGIC)) == LOG_MAGIC
+    assert Log.from_file(_OTTER_LOG_FILENAME).get_question_entry("q1").unshelve() == {"num": 1}
+
+
+def test_shelved_variables_stored_once():
+    def count_blobs():
+        with open(_OTTER_LOG_FILENAME, "rb") as f:
+            return sum(r.record_type == RecordType.BLOB for r in read_log_index(f))
+
+    arr = np.arange(1000)
+    with mock.patch("dill.dump", wraps=dill.dump) as mocked_dump:
+        for question in ["q1", "q2"]:
+            LogEntry(event_type=EventType.CHECK, question=question) \
+                .shelve({"arr": arr, "num": 1}, delete=True, filename=_OTTER_LOG_FILENAME) \
+                .flush_to_file(_OTTER_LOG_FILENAME)
+
+        # unchanged arrays are only pickled once
+        assert sum(c.args[0] is arr for c in mocked_dump.call_args_list) == 1
+
+    assert count_blobs() == 2
+
+    LogEntry(event_type=EventType.CHECK, question="q1") \
+        .shelve({"arr": arr + 1, "num": 1}, delete=True, filename=_OTTER_LOG_FILENAME) \
+        .flush_to_file(_OTTER_LOG_FILENAME)
+    assert count_blobs() == 3
+
+    # the original array is still shelved for q2
+    assert compact_log(_OTTER_LOG_FILENAME) == 1
+    assert count_blobs() == 3
+
+    LogEntry(event_type=EventType.CHECK, question="q2") \
+        .shelve({"num": 2}, delete=True, filename=_OTTER_LOG_FILENAME) \
+        .flush_to_file(_OTTER_LOG_FILENAME)
+    assert compact_log(_OTTER_LOG_FILENAME) == 1
+    assert count_blobs() == 3
+
+    log = Log.from_file(_OTTER_LOG_FILENAME)
+    env = log.get_question_entry("q1").unshelve()
+    assert (env["arr"] == arr + 1).all() and env["num"] == 1
+    assert log.get_question_entry("q2").unshelve() == {"num": 2}
+
+
+@pytest.mark.parametrize("compression", ["zlib", "lzma", None])
+def test_shelf_size_budgets(compression):
+    env = {"small": np.zeros(100), "large": np.random.default_rng(0).random(10000), "num": 1}
+    entry = LogEntry(event_type=EventType.CHECK, question="q1").shelve(
+        env, compression=compression, max_variable_size=20000)
+    assert entry.unshelved == ["large"]
+    assert "maximum size of 20000 bytes" in entry.unshelved_reasons["large"]
+
+    entry.flush_to_file(_OTTER_LOG_FILENAME)
+    with open(_OTTER_LOG_FILENAME, "rb") as f:
+        records = [r for r in read_log_index(f) if r.record_type == RecordType.BLOB]
+
+    assert {r.metadata["compression"] for r in records} == {compression}
+    if compression is not None:
+        assert min(r.length for r in records) < len(dill.dumps(np.zeros(100)))
+
+    env = Log.from_file(_OTTER_LOG_FILENAME).get_question_entry("q1").unshelve()
+    assert (env["small"] == 0).all() and env["num"] == 1
+
+    max_size = len(serialize_variable(1, compression=compression)[1])
+    entry = LogEntry(event_type=EventType.CHECK, question="q1").shelve(
+        {"num": 1, **env}, compression=compression, max_shelf_size=max_size)
+    assert entry.unshelved == ["small"]
+    assert entry.unshelved_reasons == \
+        {"small": f"the shelf would be larger than the maximum size of {max_size} bytes"}
+
+
+def test_background_log_writer(tmp_path):
+    writer = BackgroundLogWriter(_OTTER_LOG_FILENAME, flush_interval=60)
+    with mock.patch("otter.check.log_writer.append_to_log", wraps=append_to_log) as mocked_append:
+        for question in ["q1", "q2", "q1"]:
+            entry = LogEntry(event_type=EventType.CHECK, question=question)
+            writer.write(entry.shelve({"num": 1}, delete=True, filename=_OTTER_LOG_FILENAME))
+
+        # nothing is written until the writer is flushed
+        assert not os.path.exists(_OTTER_LOG_FILENAME)
+
+        writer.flush()
+        assert mocked_append.call_count == 1
+
+    log = Log.from_file(_OTTER_LOG_FILENAME)
+    assert [e.question for e in log] == ["q1", "q2", "q1"]
+    assert log.get_question_entry("q1").unshelve() == {"num": 1}
+
+    writer.close()
+    assert not writer._thread.is_alive()
+    with pytest.raises(ValueError, match="The log writer is closed"):
+        writer.write(LogEntry(event_type=EventType.AUTH))
+
+    # errors raised while writing are raised by flush
+    writer = BackgroundLogWriter(str(tmp_path / "missing" / ".OTTER_LOG"), flush_interval=60)
+    writer.write(LogEntry(event_type=EventType.AUTH))
+    with pytest.raises(Exception, match="file system is read-only"):
+        writer.flush()
+    writer.close()
@@ -1,8 +1,11 @@
 """Tests for ``otter.Notebook``"""
 
 import datetime as dt
+import json
+import nbformat as nbf
 import os
 import pytest
+import zipfile
 
 from glob import glob
 from textwrap import dedent
@@ -10,6 +13,10 @@ from unittest import mock
 
 from otter import Notebook
 from otter.check.notebook import _OTTER_LOG_FILENAME, _ZIP_NAME_FILENAME
+from otter.check.tests_cache import RemoteTestsCache, URLFetcher, URLResponse
+from otter.check.utils import grade_zip_file
+from otter.check.validate_export.worker import ValidationWorker
+from otter.test_files import OKTestFile
 
 from .utils import TestFileManager
 
@@ -96,6 +103,53 @@ def test_check():
             assert result.grade == 0, "Test {} passed".format(q)
 
 
+def test_check_all_cache(tmp_path, monkeypatch):
+    tests_dir = tmp_path / "tests"
+    tests_dir.mkdir()
+    for name, code, output in [("q1", "x", "1"), ("q2", "f()", "2")]:
+        with open(tests_dir / f"{name}.py", "w") as f:
+            f.write(dedent(f"""\
+                OK_FORMAT = True
+
+                test = {{
+                    "name": "{name}",
+                    "suites": [{{"cases": [{{"code": ">>> {code}\\n{output}", "hidden": False}}]}}],
+                }}
+                """))
+
+    nbf.write(nbf.v4.new_notebook(), tmp_path / "hw.ipynb")
+    with open(tmp_path / "hw.otter", "w") as f:
+        json.dump({"notebook": "hw.ipynb", "cache_checks": True}, f)
+
+    monkeypatch.chdir(tmp_path)
+    env = {"grader": Notebook(tests_dir="tests"), "x": 1, "y": 2}
+    exec("def f():\n    return y", env)
+
+    def check_all(force=False):
+        exec(f"results = grader.check_all(force={force})", env)
+        return env["results"]
+
+    with mock.patch.object(OKTestFile, "run", autospec=True, side_effect=OKTestFile.run) as mocked_run:
+        results = check_all()
+        assert mocked_run.call_count == 2
+        assert repr(results.results["q1"]) == "q1 results: All test cases passed!"
+
+        results = check_all()
+        assert mocked_run.call_count == 2
+        assert repr(results.results["q1"]) == "q1 results (cached): All test cases passed!"
+        assert results.results["q2"].cached
+
+        # changing a global read by a function called by a test invalidates its cached result
+        env["y"] = 3
+        results = check_all()
+        assert mocked_run.call_count == 3
+        assert results.results["q1"].cached and not results.results["q2"].passed_all
+
+        results = check_all(force=True)
+        assert mocked_run.call_count == 5
+        assert not any(tf.cached for tf in results.results.values())
+
+
 def test_to_pdf_with_nb_path():
     """
     Checks for existence of notebook PDF
@@ -172,33 +226,135 @@ def test_colab():
             grader.export()
 
 
-def test_jupyterlite():
+class LocalFetcher(URLFetcher):
     """
-    Checks that the ``Notebook`` class correctly disables methods on Google Colab.
+    A ``URLFetcher`` that serves files from a dictionary, using their hashes as ETags.
+    """
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+        self.offline = False
+
+    def fetch(self, url, headers):
+        self.requests.append((url, headers))
+        if self.offline:
+            raise ConnectionError("The network is down")
+
+        if url not in self.files:
+            return URLResponse(404, "", {})
+
+        etag = f'"{hash(self.files[url])}"'
+        if headers.get("If-None-Match") == etag:
+            return URLResponse(304, "", {"ETag": etag})
+
+        return URLResponse(200, self.files[url], {"ETag": etag})
+
+
+def test_jupyterlite(tmp_path):
+    """
+    Checks that the ``Notebook`` class correctly disables methods on JupyterLite and caches test
+    files downloaded from URLs.
     """
     tests_url_prefix = "https://domain.tld/"
-    grader = Notebook(tests_url_prefix=tests_url_prefix, jupyterlite=True)
+    grader = Notebook(
+        tests_dir=str(tmp_path / "tests"), tests_url_prefix=tests_url_prefix, jupyterlite=True)
 
     # check for appropriate errors
     with mock.patch("otter.check.notebook.LogEntry") as mocked_event:
         grader._log_event()
         mocked_event.assert_not_called()
 
-    with mock.patch("otter.check.utils.import_or_raise") as mocked_import, \
-            mock.patch("otter.check.utils.os") as mocked_os, \
-            mock.patch("otter.check.utils.open", mock.mock_open()) as mocked_open, \
-            mock.patch("otter.check.utils.IPythonInterpreter") as mocked_interp:
-        mocked_interp.PYOLITE.value.running.return_value = True
-        mocked_os.path.join.return_value = FILE_MANAGER.get_path("tests/q1.py")
+    with open(os.path.join(TESTS_DIR, "q1.py")) as f:
+        q1 = f.read()
 
-        grader.check("q1")
+    url = f"{tests_url_prefix}q1.py"
+    fetcher = LocalFetcher({url: q1})
+    grader._tests_url_cache._fetcher = fetcher
 
-        mocked_import.assert_called_with("pyodide")
-        mocked_pyodide = mocked_import.return_value
-        mocked_pyodide.open_url.assert_called_with(f"{tests_url_prefix}q1.py")
-        mocked_os.makedirs.assert_called_with("./tests", exist_ok=True)
-        mocked_open.assert_called_with(mocked_os.path.join.return_value, "w+")
+    grader.check("q1")
+    assert fetcher.requests == [(url, {})]
+    with open(tmp_path / "tests" / "q1.py") as f:
+        assert f.read() == q1
 
+    # the test file isn't requested again until the revalidation interval has passed
+    grader.check("q1")
+    assert len(fetcher.requests) == 1
+
+    grader._tests_url_cache.revalidate_interval = 0
+    grader.check("q1")
+    assert fetcher.requests[-1] == (url, {"If-None-Match": f'"{hash(q1)}"'})
+
+    # the cached copy is used when the network is down
+    fetcher.offline = True
+    grader.check("q1")
+    assert len(fetcher.requests) == 3
+
+    with pytest.raises(ConnectionError):
+        grader.check("q2")
+
+
+def test_jupyterlite_prefetch(tmp_path, monkeypatch):
+    """
+    Checks that the test files of the questions checked in the notebook are downloaded when the
+    ``Notebook`` is created.
+    """
+    tests_url_prefix = "https://domain.tld/tests"
+    files = {}
+    for q in ["q1", "q2", "q3"]:
+        with open(os.path.join(TESTS_DIR, f"{q}.py")) as f:
+            files[f"{tests_url_prefix}/{q}.py"] = f.read()
+
+    nb = nbf.v4.new_notebook()
+    nb.cells = [nbf.v4.new_code_cell(f'grader.check("{q}")') for q in ["q1", "q3"]]
+    nbf.write(nb, tmp_path / "hw.ipynb")
+    monkeypatch.chdir(tmp_path)
+
+    fetcher = LocalFetcher(files)
+    with mock.patch("otter.check.tests_cache.PyodideFetcher", return_value=fetcher):
+        Notebook(tests_url_prefix=tests_url_prefix, jupyterlite=True)
+
+    assert sorted(url for url, _ in fetcher.requests) == \
+        [f"{tests_url_prefix}/q1.py", f"{tests_url_prefix}/q3.py"]
+    assert sorted(os.listdir("tests")) == [".otter_tests_cache.json", "q1.py", "q3.py"]
+
+    # cached test files that are still fresh aren't requested again
+    with mock.patch("otter.check.tests_cache.PyodideFetcher", return_value=fetcher):
+        Notebook(tests_url_prefix=tests_url_prefix, jupyterlite=True)
+
+    assert len(fetcher.requests) == 2
+
+
+class LowercaseHeadersFetcher(LocalFetcher):
+    """
+    A ``LocalFetcher`` whose ``fetch_all`` lowercases response header names, as
+    ``pyodide.http.pyfetch`` does.
+    """
+
+    def fetch_all(self, requests, callback):
+        for url, headers in requests:
+            response = self.fetch(url, headers)
+            callback(url, response._replace(
+                headers={k.lower(): v for k, v in response.headers.items()}), None)
+
+
+def test_jupyterlite_prefetch_lowercase_headers(tmp_path):
+    """
+    Checks that the validators of prefetched test files are stored when the response header names
+    are lowercase, so that the files are revalidated with conditional requests.
+    """
+    url = "https://domain.tld/tests/q1.py"
+    with open(os.path.join(TESTS_DIR, "q1.py")) as f:
+        q1 = f.read()
+
+    fetcher = LowercaseHeadersFetcher({url: q1})
+    cache = RemoteTestsCache(
+        "https://domain.tld/tests", str(tmp_path), fetcher=fetcher, revalidate_interval=0)
+
+    cache.prefetch(["q1"])
+    cache.prefetch(["q1"])
+
+    assert fetcher.requests == [(url, {}), (url, {"If-None-Match": f'"{hash(q1)}"'})]
 
 def test_grading_mode():
     """
@@ -219,3 +375,28 @@ def test_grading_mode():
 # TODO: tests for force_save on export and to_pdf
 # TODO: test _resolve_nb_path
 # TODO: tests for event logging and other things in otter.check.utils
+
+
+def test_grade_zip_file_reuses_worker(tmp_path):
+    zip_path = str(tmp_path / "hw00.zip")
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        zf.write(os.path.join(os.path.dirname(TESTS_DIR), "hw00.ipynb"), "hw00.ipynb")
+
+    worker = ValidationWorker()
+    try:
+        with mock.patch("otter.check.utils._VALIDATION_WORKER", worker):
+            results = grade_zip_file(zip_path, "hw00.ipynb", TESTS_DIR)
+            pid = worker._process.pid
+            assert sorted(results.results) == ["q1", "q2", "q3", "q4", "q5"]
+
+            assert grade_zip_file(zip_path, "hw00.ipynb", TESTS_DIR).summary() == results.summary()
+            assert worker._process.pid == pid
+
+            with pytest.raises(RuntimeError, match="KeyError"):
+                grade_zip_file(zip_path, "missing.ipynb", TESTS_DIR)
+            assert worker._process.pid == pid
+
+    finally:
+        worker.close()
+
+    assert worker._process is None
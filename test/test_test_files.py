@@ -0,0 +1,293 @@
+"""Tests for ``otter.test_files``"""
+
+import doctest
+import io
+import nbformat as nbf
+import numpy as np
+import os
+import pandas as pd
+import pickle
+import pytest
+import sys
+
+from contextlib import redirect_stderr, redirect_stdout
+from textwrap import dedent
+from unittest import mock
+
+from otter.assign.tests_manager import AssignmentTestsManager, TestCase as AssignTestCase
+from otter.test_files import (
+    cache, create_test_file, ExceptionTestFile, NotebookMetadataExceptionTestFile,
+    NotebookMetadataOKTestFile, OKTestFile)
+from otter.test_files.assertions import (
+    assert_close, assert_fingerprint, assert_frame_equal_subset, assert_shape, fingerprint)
+from otter.test_files.bundle import BUNDLE_FILENAME, create_test_bundle, load_test_bundle
+from otter.test_files.ok_test import run_doctest
+from otter.utils import hide_outputs
+
+
+OK_TEST = dedent("""\
+    OK_FORMAT = True
+
+    test = {
+        "name": "q1",
+        "points": 2,
+        "suites": [{"cases": [{"code": ">>> x == 1\\nTrue", "hidden": False}], "type": "doctest"}],
+    }
+    """)
+
+EXCEPTION_TEST = dedent("""\
+    from otter.test_files import test_case
+
+    OK_FORMAT = False
+
+    name = "q2"
+    calls = []
+
+    @test_case(points=1)
+    def test_x(x):
+        calls.append(x)
+        assert len(calls) == 1 and x == 1
+    """)
+
+
+def test_test_file_cache(tmp_path):
+    ok_path, exception_path = str(tmp_path / "q1.py"), str(tmp_path / "q2.py")
+    with open(ok_path, "w") as f:
+        f.write(OK_TEST)
+    with open(exception_path, "w") as f:
+        f.write(EXCEPTION_TEST)
+
+    with mock.patch.object(cache, "_parse_test_file", wraps=cache._parse_test_file) as mocked_parse:
+        tests = [create_test_file(p) for p in (ok_path, exception_path) for _ in range(2)]
+        assert mocked_parse.call_count == 2
+
+    assert [type(t) for t in tests] == [OKTestFile, OKTestFile, ExceptionTestFile, ExceptionTestFile]
+    assert tests[0] is not tests[1] and tests[0].get_examples() is tests[1].get_examples()
+
+    # each copy has its own results and, for exception-based tests, its own globals
+    for t in tests:
+        t.run({"x": 1})
+        assert t.passed_all
+    assert tests[2].source == EXCEPTION_TEST
+
+    tests[0].update_score(0)
+    assert tests[1].score == 2 and create_test_file(ok_path).test_case_results == []
+
+    # changing the file invalidates its cache entry
+    with open(ok_path, "w") as f:
+        f.write(OK_TEST.replace("x == 1", "x == 2"))
+    os.utime(ok_path, ns=(0, 0))
+
+    test = create_test_file(ok_path)
+    test.run({"x": 1})
+    assert not test.passed_all
+
+
+@pytest.mark.parametrize("depends_on, expected", [
+    (None, []), ("q1", ["q1"]), (["q1", "q2"], ["q1", "q2"]), (("q1",), ["q1"]),
+    ({"q1"}, TypeError), (1, TypeError), (["q1", 2], TypeError),
+])
+def test_depends_on(depends_on, expected, tmp_path):
+    path = tmp_path / "q3.py"
+    with open(path, "w") as f:
+        f.write(OK_TEST.replace('"name": "q1",', f'"name": "q3", "depends_on": {depends_on!r},'))
+
+    if expected is TypeError:
+        with pytest.raises(TypeError, match="depends_on must be a string or a list of strings"):
+            create_test_file(str(path))
+
+    else:
+        assert create_test_file(str(path)).depends_on == expected
+
+
+def test_test_bundle(tmp_path):
+    paths = [str(tmp_path / "q1.py"), str(tmp_path / "q2.py"), str(tmp_path / "__init__.py")]
+    for path, source in zip(paths, [OK_TEST, EXCEPTION_TEST, ""]):
+        with open(path, "w") as f:
+            f.write(source)
+
+    bundle = create_test_bundle(paths)
+    with open(tmp_path / BUNDLE_FILENAME, "wb") as f:
+        f.write(bundle)
+
+    cache.clear_test_file_cache()
+    assert load_test_bundle(str(tmp_path)) == paths[:2]
+
+    with mock.patch.object(cache, "_parse_test_file") as mocked_parse:
+        tests = [create_test_file(p) for p in paths[:2]]
+        mocked_parse.assert_not_called()
+
+    for t in tests:
+        t.run({"x": 1})
+        assert t.passed_all
+
+    # changed test files and bundles from other Python versions are ignored
+    with open(paths[0], "w") as f:
+        f.write(OK_TEST.replace("x == 1", "x == 2"))
+    assert load_test_bundle(str(tmp_path)) == paths[1:2]
+
+    with mock.patch.object(sys.implementation, "cache_tag", "other"):
+        assert load_test_bundle(str(tmp_path)) == []
+
+    # pickles that aren't bundles are ignored
+    with open(tmp_path / BUNDLE_FILENAME, "wb") as f:
+        pickle.dump(["not", "a", "bundle"], f)
+    assert load_test_bundle(str(tmp_path)) == []
+
+
+def run_doctest_reference(name, doctest_string, global_environment):
+    """
+    The original implementation of ``otter.test_files.ok_test.run_doctest`` using
+    ``doctest.DocTestRunner``.
+    """
+    examples = doctest.DocTestParser().parse(doctest_string, name)
+    test = doctest.DocTest(
+        [e for e in examples if isinstance(e, doctest.Example)], global_environment, name, None,
+        None, doctest_string)
+
+    doctestrunner = doctest.DocTestRunner(verbose=True)
+
+    runresults = io.StringIO()
+    with redirect_stdout(runresults), redirect_stderr(runresults), hide_outputs():
+        doctestrunner.run(test, clear_globs=False)
+    with open(os.devnull, "w") as f, redirect_stderr(f), redirect_stdout(f):
+        result = doctestrunner.summarize(verbose=True)
+    if result.failed == 0:
+        return (True, "")
+    else:
+        return False, runresults.getvalue()
+
+
+DOCTESTS = [
+    ">>> x + 1\n2",
+    ">>> x + 1\n3\n>>> x\n1",
+    ">>> print(x)\n1\n>>> print('a\\nb')\na\nb\n>>> None\n>>> [x] * 2\n[1, 1]",
+    ">>> 1 / 0\nTraceback (most recent call last):\n...\nZeroDivisionError: division by zero",
+    ">>> 1 / 0\nTraceback (most recent call last):\n...\nZeroDivisionError: oops",
+    ">>> 1 / 0  # doctest: +IGNORE_EXCEPTION_DETAIL\nTraceback (most recent call last):\n"
+        "...\nZeroDivisionError: oops",
+    ">>> y = x\n>>> undefined_name\n>>> y\n1",
+    ">>> 1 +\n>>> x\n1",
+    ">>> list(range(20))  # doctest: +ELLIPSIS\n[0, 1, ..., 19]",
+    ">>> list(range(3))  # doctest: +NORMALIZE_WHITESPACE\n[0,   1,\n 2]",
+    ">>> x  # doctest: +SKIP\n5\n>>> x\n2",
+    ">>> import sys\n>>> print('err', file=sys.stderr)\n>>> x\n2\n>>> x\n3",
+    ">>> x  # doctest: +REPORT_ONLY_FIRST_FAILURE\n2\n>>> x\n3\n>>> print('a')\nb",
+    ">>> x  # doctest: +FAIL_FAST\n2\n>>> x\n3",
+    ">>> print('a\\nb\\nc')  # doctest: +REPORT_NDIFF\na\nx\nc",
+    ">>> def f():\n...     raise ValueError('bad')\n>>> f()",
+]
+
+
+@pytest.mark.parametrize("doctest_string", DOCTESTS)
+def test_run_doctest_parity(doctest_string):
+    results = [run("q1 0", doctest_string, {"x": 1}) for run in (run_doctest_reference, run_doctest)]
+    assert results[0] == results[1]
+
+
+def test_assertion_helpers():
+    arr = np.linspace(0, 1, 200_000).reshape(1000, 200)
+    assert_close(arr, arr + 1e-10)
+    assert_close(["a", "b"], np.array(["a", "b"]))
+
+    other = arr.copy()
+    other[500, 3] = 2
+    with pytest.raises(AssertionError, match=r"Values differ at index \(500, 3\): expected 2\.0"):
+        assert_close(arr, other, atol=0)
+    with pytest.raises(AssertionError, match=r"Expected shape \(2,\) but got \(3,\)"):
+        assert_close([1, 2, 3], [1, 2])
+
+    assert_shape(arr, (1000, None))
+    with pytest.raises(AssertionError, match=r"Expected shape \(1000, 3\) but got \(1000, 200\)"):
+        assert_shape(arr, (1000, 3))
+
+    df = pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": ["x", "y", "z"], "c": [0, 0, 0]})
+    assert_frame_equal_subset(df, df.loc[[2, 0], ["a", "b"]])
+    with pytest.raises(AssertionError, match=r"Missing columns: \['d'\]"):
+        assert_frame_equal_subset(df, df.assign(d=1))
+    with pytest.raises(AssertionError, match=r"Column 'b': Values differ at index \(1,\)"):
+        assert_frame_equal_subset(df, df.assign(b=["x", "w", "z"]), columns=["a", "b"])
+
+    # fingerprints ignore negative zeros and, optionally, floating point error
+    fp = fingerprint(df)
+    assert fp == fingerprint(df.copy()) and fingerprint(df.assign(c=0.0)) == fingerprint(df.assign(c=-0.0))
+    assert fp != fingerprint(df.rename(columns={"c": "d"})) and fp != fingerprint(df.iloc[::-1])
+    assert fingerprint(arr[:, :5] * 0.1, decimals=6) == fingerprint(arr[:, :5] / 10, decimals=6)
+    assert fingerprint(df.a * 0.1) != fingerprint(df.a / 10)
+    assert fingerprint(arr) != fingerprint(arr.T)
+    assert_fingerprint(df["a"], fingerprint(df["a"]))
+    with pytest.raises(AssertionError, match="The contents of the DataFrame"):
+        assert_fingerprint(df, fingerprint(df.head(2)))
+
+    # the helpers can be used in both test formats
+    passed, message = run_doctest("q1 0", dedent("""\
+        >>> from otter.test_files.assertions import assert_close
+        >>> assert_close(x, [1, 2, 4])
+        """), {"x": np.array([1, 2, 3])})
+    assert not passed and "Values differ at index (2,): expected 4 but got 3" in message
+
+    test = ExceptionTestFile.from_string(dedent("""\
+        from otter.test_files import test_case
+        from otter.test_files.assertions import assert_shape
+
+        OK_FORMAT = False
+
+        name = "q1"
+
+        @test_case(points=1)
+        def test_shape(x):
+            assert_shape(x, (3,))
+        """))
+    test.run({"x": np.array([1, 2, 3])})
+    assert test.passed_all
+
+
+def test_assign_assertion_helper_imports():
+    test_case = AssignTestCase(
+        "assert_close(x, [1, 2])\nassert_shape (x, (2,))", "", False, None, None, None)
+    assert AssignmentTestsManager._create_ok_test_case(test_case)["code"].startswith(
+        ">>> from otter.test_files.assertions import assert_close, assert_shape\n"
+        ">>> assert_close(x, [1, 2])\n")
+
+    test_case.input = "from otter.test_files.assertions import assert_close\nassert_close(x, [1, 2])"
+    assert AssignmentTestsManager._get_assertion_helpers(test_case.input) == []
+
+    # methods and module functions with the same names as the helpers aren't imported
+    test_case.input = "obj.fingerprint(x)\nnp.testing.assert_close(x, y)"
+    assert AssignmentTestsManager._get_assertion_helpers(test_case.input) == []
+    assert "import" not in AssignmentTestsManager._create_ok_test_case(test_case)["code"]
+
+
+def test_notebook_test_index(tmp_path):
+    nb_path, nb = str(tmp_path / "nb.ipynb"), nbf.v4.new_notebook()
+    nb.metadata["otter"] = {
+        "OK_FORMAT": True,
+        "tests": {f"q{i}": {
+            "name": f"q{i}",
+            "points": 1,
+            "suites": [{"cases": [{"code": f">>> x == {i}\nTrue", "hidden": False}]}],
+        } for i in range(1, 4)},
+    }
+    nbf.write(nb, nb_path)
+
+    with mock.patch.object(cache, "_read_notebook_tests", wraps=cache._read_notebook_tests) \
+            as mocked_read:
+        tests = [create_test_file(nb_path, test_name=f"q{i}") for i in (1, 2, 3, 1)]
+        assert mocked_read.call_count == 1
+
+    assert all(type(t) is NotebookMetadataOKTestFile for t in tests) and tests[0] is not tests[3]
+    for t in tests:
+        t.run({"x": 1})
+    assert [t.passed_all for t in tests] == [True, False, False, True]
+
+    with pytest.raises(ValueError, match="Test q4 not found"):
+        create_test_file(nb_path, test_name="q4")
+
+    # changing the notebook invalidates its index
+    nb.metadata["otter"] = {"OK_FORMAT": False, "tests": {"q2": EXCEPTION_TEST}}
+    nbf.write(nb, nb_path)
+
+    test = create_test_file(nb_path, test_name="q2")
+    assert type(test) is NotebookMetadataExceptionTestFile and test.source == EXCEPTION_TEST
+    test.run({"x": 1})
+    assert test.passed_all